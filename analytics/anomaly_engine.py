@@ -0,0 +1,277 @@
+"""
+Windowed, incremental machine anomaly detection.
+
+Per machine the engine keeps daily count vectors (alarms, alarms per
+reason_level_2, alarms whose ID the machine never raised before). A
+machine's feature vector is the sum over the last ANOMALY_WINDOW_DAYS,
+turned into log counts per reason, electrical share and new-alarm rate.
+
+An IsolationForest is trained on every machine's daily window snapshots
+over the last ANOMALY_HISTORY_DAYS, so even one or two machines yield a
+usable training set. It is refitted only when ANOMALY_REFIT_HOURS have
+passed or the current features drift from those it was trained on
+(mean shift in training standard deviations above
+ANOMALY_DRIFT_THRESHOLD). Updates rescore only the machines they touched,
+or every machine when the latest day (where all windows end) moves on;
+queries read the cached scores.
+
+Data arrives batch by batch from the AlarmEventStore (when faults
+happened) or, without events, from the catalogue per processed file
+(when alarms were extracted). State and model persist in
+ANOMALY_STATE_PATH.
+"""
+import os
+import time
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from config import (ANOMALY_WINDOW_DAYS, ANOMALY_HISTORY_DAYS, ANOMALY_REFIT_HOURS, ANOMALY_DRIFT_THRESHOLD,
+                    ANOMALY_STATE_PATH)
+
+REASONS = ["Electrical", "Mechanical", "Sensor/Instrumentation", "Software/Control", "Process/Quality"]
+# Daily vector layout: total, one slot per reason, other/unclassified, new alarm IDs
+TOTAL, OTHER, NEW = 0, len(REASONS) + 1, len(REASONS) + 2
+WIDTH = len(REASONS) + 3
+FEATURES = ["log_alarms"] + [f"log_{r}" for r in REASONS] + ["electrical_share", "new_alarm_rate"]
+MIN_TRAINING_ROWS = 8
+
+def _epoch_days(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values), errors="coerce").values.astype("datetime64[D]").astype(np.int64)
+
+def feature_vector(counts: np.ndarray) -> np.ndarray:
+    total = counts[TOTAL]
+    share = counts[1] / total if total else 0.0
+    rate = counts[NEW] / total if total else 0.0
+    return np.concatenate([np.log1p(counts[[TOTAL] + list(range(1, len(REASONS) + 1))]), [share, rate]])
+
+class AnomalyEngine:
+    def __init__(self, window_days: int = ANOMALY_WINDOW_DAYS, history_days: int = ANOMALY_HISTORY_DAYS,
+                 refit_hours: float = ANOMALY_REFIT_HOURS, drift_threshold: float = ANOMALY_DRIFT_THRESHOLD,
+                 contamination: float = 0.1):
+        self.window_days = window_days
+        self.history_days = history_days
+        self.refit_hours = refit_hours
+        self.drift_threshold = drift_threshold
+        self.contamination = contamination
+        self.reset()
+
+    def reset(self, source: str = None):
+        self.source = source
+        self.seen = set()            # event batches / catalogue files already counted
+        self.daily = {}              # machine -> {epoch day: counts vector}
+        self.first_seen = {}         # (machine, alarm_id) -> epoch day
+        self.watermark = None        # latest epoch day seen
+        self.model = None
+        self.fitted_at = 0.0
+        self.reference = None        # (mean, std) of the training features
+        self.scores = {}             # machine -> (score, anomalous, features)
+        self.scored_watermark = None # watermark the cached scores were computed at
+        self.dirty = set()
+        self.fits = 0
+
+    def __setstate__(self, state: dict):
+        # States pickled before scores tracked their watermark: rescore everything on the next refresh
+        state.setdefault("scored_watermark", None)
+        self.__dict__.update(state)
+
+    # ── Updates ─────────────────────────────────────────────────────
+
+    def update(self, df: pd.DataFrame) -> int:
+        """Count alarms (columns machine, alarm_id, reason_level_2, ts) into the daily vectors."""
+        if df.empty: return 0
+        df = pd.DataFrame({
+            "machine": df["machine"].fillna("").astype(str),
+            "alarm_id": df["alarm_id"].astype(str),
+            "reason": df["reason_level_2"].map({r: i + 1 for i, r in enumerate(REASONS)}).fillna(OTHER).astype(int),
+            "day": _epoch_days(df["ts"]),
+        })
+        df = df[df["day"] > np.iinfo(np.int64).min]        # unparseable timestamps
+        if df.empty: return 0
+        for (machine, day, reason), n in df.groupby(["machine", "day", "reason"]).size().items():
+            vec = self._vector(machine, day)
+            vec[TOTAL] += n
+            vec[reason] += n
+        for (machine, aid), day in df.groupby(["machine", "alarm_id"])["day"].min().items():
+            old = self.first_seen.get((machine, aid))
+            if old is not None and old <= day: continue
+            if old is not None and old in self.daily[machine]:
+                self.daily[machine][old][NEW] -= 1       # an earlier occurrence arrived late
+            self.first_seen[(machine, aid)] = day
+            self._vector(machine, day)[NEW] += 1
+        self.dirty.update(df["machine"].unique())
+        self.watermark = max(self.watermark or 0, int(df["day"].max()))
+        self._expire()
+        return len(df)
+
+    def _vector(self, machine: str, day: int) -> np.ndarray:
+        days = self.daily.setdefault(machine, {})
+        if day not in days:
+            days[day] = np.zeros(WIDTH, dtype=np.int64)
+        return days[day]
+
+    def _expire(self):
+        cutoff = self.watermark - self.history_days - self.window_days
+        for machine, days in self.daily.items():
+            for day in [d for d in days if d <= cutoff]:
+                del days[day]
+                self.dirty.add(machine)
+
+    # ── Features ────────────────────────────────────────────────────
+
+    def window_counts(self, machine: str, end_day: int) -> np.ndarray:
+        days = self.daily.get(machine, {})
+        out = np.zeros(WIDTH, dtype=np.int64)
+        for d in range(end_day - self.window_days + 1, end_day + 1):
+            if d in days:
+                out += days[d]
+        return out
+
+    def current_features(self) -> dict:
+        """machine -> feature vector over the window ending at the watermark (machines active in it)."""
+        out = {}
+        for machine in self.daily:
+            counts = self.window_counts(machine, self.watermark)
+            if counts[TOTAL]:
+                out[machine] = feature_vector(counts)
+        return out
+
+    def training_matrix(self) -> np.ndarray:
+        """Every machine's window features at each day of the history."""
+        rows = []
+        for machine in self.daily:
+            for end in range(self.watermark - self.history_days + 1, self.watermark + 1):
+                counts = self.window_counts(machine, end)
+                if counts[TOTAL]:
+                    rows.append(feature_vector(counts))
+        return np.array(rows).reshape(-1, len(FEATURES))
+
+    # ── Model ───────────────────────────────────────────────────────
+
+    def drift(self, features: np.ndarray) -> float:
+        """Mean absolute shift of the feature means, in training standard deviations."""
+        if self.reference is None or not len(features): return 0.0
+        mean, std = self.reference
+        return float(np.mean(np.abs(features.mean(axis=0) - mean) / std))
+
+    def refresh(self, force_refit: bool = False) -> dict:
+        """Refit if due (schedule, drift or forced), then rescore changed machines. Returns what happened."""
+        if self.watermark is None:
+            return {"refit": False, "rescored": 0}
+        current = self.current_features()
+        matrix = np.array(list(current.values())).reshape(-1, len(FEATURES))
+        due = (force_refit or self.model is None
+               or time.time() - self.fitted_at > self.refit_hours * 3600
+               or self.drift(matrix) > self.drift_threshold)
+        refit = False
+        if due:
+            train = self.training_matrix()
+            if len(train) >= MIN_TRAINING_ROWS:
+                self.model = IsolationForest(contamination=self.contamination, random_state=42).fit(train)
+                self.reference = (train.mean(axis=0), train.std(axis=0) + 1e-6)
+                self.fitted_at = time.time()
+                self.fits += 1
+                refit = True
+        if self.model is None:
+            return {"refit": False, "rescored": 0}
+
+        # Every window ends at the watermark: once it moves, idle machines' features change too
+        moved = self.watermark != self.scored_watermark
+        machines = list(current) if refit or moved else [m for m in current if m in self.dirty or m not in self.scores]
+        self.scores = {m: v for m, v in self.scores.items() if m in current}
+        if machines:
+            X = np.array([current[m] for m in machines])
+            score = -self.model.score_samples(X)           # higher = more anomalous
+            flag = self.model.predict(X) == -1
+            for m, s, f, x in zip(machines, score, flag, X):
+                self.scores[m] = (float(s), bool(f), x)
+        self.dirty.clear()
+        self.scored_watermark = self.watermark
+        return {"refit": refit, "rescored": len(machines)}
+
+    # ── Queries (cached scores) ─────────────────────────────────────
+
+    def anomalous_machines(self) -> list:
+        """Machines flagged in the current window, most anomalous first."""
+        return [m for m, (s, flag, _) in sorted(self.scores.items(), key=lambda x: (-x[1][0], x[0])) if flag]
+
+    def machine_scores(self) -> list:
+        """[{machine, score, anomalous, <features>}] for every machine active in the window, most anomalous first."""
+        rows = []
+        for m, (s, flag, x) in sorted(self.scores.items(), key=lambda x: (-x[1][0], x[0])):
+            rows.append(dict({"machine": m, "score": round(s, 4), "anomalous": flag},
+                             **{f: round(float(v), 4) for f, v in zip(FEATURES, x)}))
+        return rows
+
+    def stats(self) -> dict:
+        return {"source": self.source, "machines": len(self.daily), "scored": len(self.scores), "fits": self.fits,
+                "fitted_at": self.fitted_at, "window_days": self.window_days,
+                "watermark": str(np.datetime64(self.watermark, "D")) if self.watermark is not None else None}
+
+    # ── Feeding ─────────────────────────────────────────────────────
+
+    def sync_events(self, store) -> int:
+        """Count event batches ingested since the last sync."""
+        if self.source != "events":
+            self.reset("events")
+        added = 0
+        for batch in store._batches():
+            if batch in self.seen: continue
+            df = store.batch_events(batch, ["machine", "alarm_id", "reason_level_2", "start"])
+            added += self.update(df.rename(columns={"start": "ts"}))
+            self.seen.add(batch)
+        return added
+
+    def sync_catalogue(self, db) -> int:
+        """Count the alarms of files processed since the last sync (a deleted file restarts the count)."""
+        files = {f["md5"] for f in db.get_all_processed_files() if f.get("md5")}
+        if self.source != "catalogue" or self.seen - files:
+            self.reset("catalogue")
+        added = 0
+        projection = {"machine": 1, "alarm_id": 1, "reason_level_2": 1, "extracted_at": 1, "_id": 0}
+        for md5 in sorted(files - self.seen):
+            df = pd.DataFrame(db.get_alarms({"source_md5": md5}, projection),
+                              columns=["machine", "alarm_id", "reason_level_2", "extracted_at"])
+            added += self.update(df.rename(columns={"extracted_at": "ts"}))
+            self.seen.add(md5)
+        return added
+
+    def save(self, path: str = ANOMALY_STATE_PATH):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp, path)
+
+
+_lock = threading.Lock()
+_engine = None
+
+def load_anomaly_engine(db=None, event_store=None, path: str = ANOMALY_STATE_PATH) -> AnomalyEngine:
+    """
+    The process-wide engine, restored from disk on first use, brought up to
+    date (events when any were ingested, else the catalogue) and refreshed.
+    """
+    global _engine
+    with _lock:
+        if _engine is None:
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        _engine = pickle.load(f)
+                except Exception as e:
+                    print(f"Could not load anomaly state from {path}: {e}. Starting fresh.")
+            _engine = _engine or AnomalyEngine()
+        if event_store is None:
+            from analytics.event_store import AlarmEventStore
+            event_store = AlarmEventStore()
+        if event_store.stats()["batches"]:
+            added = _engine.sync_events(event_store)
+        elif db is not None:
+            added = _engine.sync_catalogue(db)
+        else:
+            added = 0
+        result = _engine.refresh()
+        if added or result["refit"]:
+            _engine.save(path)
+        return _engine
@@ -0,0 +1,135 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from config import ANALYTICS_STORE_DIR
+
+# Dictionary-encoded (categorical) columns: a handful of distinct values over many alarms
+CATEGORICAL = ("machine", "reason_level_1", "reason_level_2", "category_type", "month")
+
+SCHEMA = pa.schema(
+    [("alarm_id", pa.string())] + [(c, pa.dictionary(pa.int32(), pa.string())) for c in CATEGORICAL]
+)
+
+_WRITE_LOCK = threading.Lock()
+_frame_lock = threading.Lock()
+_frames = {}     # store_dir -> (signature, DataFrame)
+_synced = {}     # store_dir -> processed-files catalogue the parts were last synced to
+
+def _month(extracted_at):
+    if hasattr(extracted_at, "strftime"):
+        return extracted_at.strftime("%Y-%m")
+    if isinstance(extracted_at, str) and len(extracted_at) >= 7:
+        return extracted_at[:7]
+    return None
+
+def to_table(alarm_records: list) -> pa.Table:
+    """The analytics columns of alarm records (dicts or AlarmRecords) as an Arrow table."""
+    cols = {c: [] for c in SCHEMA.names}
+    for r in alarm_records:
+        r = r if isinstance(r, dict) else r.model_dump()
+        cols["alarm_id"].append(r.get("alarm_id"))
+        for c in CATEGORICAL[:-1]:
+            cols[c].append(r.get(c))
+        cols["month"].append(_month(r.get("extracted_at")))
+    arrays = [pa.array(cols["alarm_id"], pa.string())]
+    arrays += [pa.array(cols[c], pa.string()).dictionary_encode() for c in CATEGORICAL]
+    return pa.Table.from_arrays(arrays, schema=SCHEMA)
+
+class ColumnarAlarmStore:
+    """
+    Columnar analytics snapshot of the alarms collection.
+
+    One uncompressed Arrow IPC (Feather v2) part per source file under
+    store_dir, replaced atomically when that file is (re)processed and
+    deleted with it, so an upload never rewrites the rest of the fleet.
+    Parts are memory-mapped on load (no parse or copy of the Arrow buffers)
+    and the repeated strings are dictionary-encoded, becoming pandas
+    categoricals. The assembled DataFrame is cached per process until a
+    part changes.
+    """
+    SUFFIX = ".arrow"
+
+    def __init__(self, store_dir: str = ANALYTICS_STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, source_md5: str) -> str:
+        return os.path.join(self.store_dir, source_md5 + self.SUFFIX)
+
+    def md5s(self) -> set:
+        return {f[:-len(self.SUFFIX)] for f in os.listdir(self.store_dir) if f.endswith(self.SUFFIX)}
+
+    # ── Writing ─────────────────────────────────────────────────────
+
+    def write_file(self, source_md5: str, alarm_records: list):
+        """Replace the part for one source file with these alarms."""
+        path = self._path(source_md5)
+        with _WRITE_LOCK:
+            tmp = path + ".tmp"
+            feather.write_feather(to_table(alarm_records), tmp, compression="uncompressed")
+            os.replace(tmp, path)
+
+    def remove(self, source_md5: str):
+        with _WRITE_LOCK:
+            if os.path.exists(self._path(source_md5)):
+                os.remove(self._path(source_md5))
+
+    def sync(self, db) -> bool:
+        """
+        Bring the parts in line with the database's processed files: write
+        missing ones (e.g. the first time this backend is used), drop those
+        whose file was deleted elsewhere. Skipped while the catalogue (md5
+        and processed_at per file) is unchanged since this process last
+        synced, so a render costs one cached catalogue read. Returns whether
+        it ran.
+        """
+        catalogue = tuple(sorted((f["md5"], str(f.get("processed_at")))
+                                 for f in db.get_all_processed_files() if f.get("md5")))
+        if _synced.get(self.store_dir) == catalogue:
+            return False
+        files = {md5 for md5, _ in catalogue}
+        stored = self.md5s()
+        for md5 in files - stored:
+            self.write_file(md5, db.get_alarms({"source_md5": md5}))
+        for md5 in stored - files:
+            self.remove(md5)
+        _synced[self.store_dir] = catalogue
+        return True
+
+    # ── Reading ─────────────────────────────────────────────────────
+
+    def _signature(self) -> tuple:
+        out = []
+        for md5 in sorted(self.md5s()):
+            st = os.stat(self._path(md5))
+            out.append((md5, st.st_mtime_ns, st.st_size))
+        return tuple(out)
+
+    def table(self) -> pa.Table:
+        """Every part, memory-mapped and concatenated without copying."""
+        parts = [feather.read_table(self._path(md5), memory_map=True) for md5 in sorted(self.md5s())]
+        return pa.concat_tables(parts) if parts else SCHEMA.empty_table()
+
+    def frame(self) -> pd.DataFrame:
+        """
+        The snapshot as a DataFrame with categorical dimension columns
+        (categories sorted, so category order is name order) and a "count"
+        weight of 1 per alarm, as FaultAnalytics expects.
+        """
+        signature = self._signature()
+        with _frame_lock:
+            hit = _frames.get(self.store_dir)
+            if hit and hit[0] == signature:
+                return hit[1]
+        df = self.table().to_pandas()
+        for c in CATEGORICAL:
+            if not isinstance(df[c].dtype, pd.CategoricalDtype):
+                df[c] = df[c].astype("category")
+            df[c] = df[c].cat.set_categories(sorted(df[c].cat.categories))
+        df["count"] = np.ones(len(df), dtype=np.int32)
+        with _frame_lock:
+            _frames[self.store_dir] = (signature, df)
+        return df
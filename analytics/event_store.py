@@ -0,0 +1,341 @@
+"""
+Alarm occurrence events: when faults actually happened on the line.
+
+PLC/HMI exports (CSV or JSON Lines with machine, alarm_id, start, end) are
+parsed by Arrow's multithreaded readers, joined against the alarm
+catalogue on (machine, alarm_id) with an Arrow hash join (zero-padding and
+case of the code ignored), and appended to
+a day-partitioned Parquet dataset. Downtime rollups per minute, hour and
+day are merged in at ingestion time, so trend queries read a few small
+rollup files instead of the events.
+
+Layout under EVENT_STORE_DIR:
+    events/day=YYYY-MM-DD/part-<batch>-<n>.parquet   joined events
+    rollups/<grain>/YYYY-MM-DD.parquet                one file per grain and day
+    batches.json                                      ingested batches (re-ingesting one is a no-op)
+
+An event's downtime is split across the buckets it overlaps; its count
+goes to the bucket it started in. Events without an end count with zero
+downtime.
+"""
+import io
+import os
+import glob
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.json as pa_json
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import EVENT_STORE_DIR
+from search.analyzer import NUMERIC_ALARM_ID
+
+GRAINS = {"minute": 60, "hour": 3600, "day": 86400}
+CATALOGUE_FIELDS = ("reason_level_1", "reason_level_2", "category_type", "description")
+ROLLUP_KEYS = ("machine", "reason_level_1", "reason_level_2", "category_type")
+
+EVENT_TYPES = {"machine": pa.string(), "alarm_id": pa.string(),
+               "start": pa.timestamp("ms"), "end": pa.timestamp("ms")}
+
+_WRITE_LOCK = threading.Lock()
+
+# ── Parsing ─────────────────────────────────────────────────────────
+
+def _format(name: str) -> str:
+    return "jsonl" if name.lower().endswith((".jsonl", ".json", ".ndjson")) else "csv"
+
+def read_events(source, fmt: str = None) -> pa.Table:
+    """
+    Events from a path, bytes or file-like object. fmt is "csv" or "jsonl"
+    (from the file extension when omitted). Timestamps are ISO 8601.
+    """
+    if fmt is None:
+        fmt = _format(source if isinstance(source, str) else getattr(source, "name", ""))
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    if fmt == "csv":
+        # alarm_id stays a string so leading zeros survive
+        table = pa_csv.read_csv(source, convert_options=pa_csv.ConvertOptions(
+            column_types={"machine": pa.string(), "alarm_id": pa.string()}))
+    else:
+        table = pa_json.read_json(source)
+    return _normalise(table)
+
+def _normalise(table: pa.Table) -> pa.Table:
+    missing = {"machine", "alarm_id", "start"} - set(table.column_names)
+    if missing:
+        raise ValueError(f"Event file is missing column(s): {', '.join(sorted(missing))}")
+    columns = []
+    for name, typ in EVENT_TYPES.items():
+        if name not in table.column_names:
+            columns.append(pa.nulls(table.num_rows, typ))
+            continue
+        col = table[name]
+        if pa.types.is_timestamp(col.type) and col.type.tz is not None:
+            col = col.cast(pa.timestamp("ms", tz="UTC")).cast(pa.timestamp("ms"))   # stored as naive UTC
+        columns.append(col.cast(typ))
+    table = pa.table(columns, names=list(EVENT_TYPES))
+    table = table.filter(pc.is_valid(table["start"]))
+    return table.set_column(0, "machine", pc.fill_null(table["machine"], ""))
+
+# ── Catalogue join ──────────────────────────────────────────────────
+
+def alarm_key(col) -> pa.ChunkedArray:
+    """
+    Join key for alarm IDs: search.analyzer.normalize_alarm_id as an Arrow
+    expression. The manuals zero-pad codes ('0282') and PLC exports often
+    do not ('282').
+    """
+    col = pc.utf8_lower(pc.utf8_trim_whitespace(pc.fill_null(col, "")))
+    stripped = pc.utf8_ltrim(col, characters="0")
+    stripped = pc.if_else(pc.equal(stripped, ""), "0", stripped)
+    return pc.if_else(pc.match_substring_regex(col, NUMERIC_ALARM_ID), stripped, col)
+
+def catalogue_table(db) -> pa.Table:
+    """(machine, alarm_id) -> classification, newest extraction winning where manuals overlap."""
+    from service.fault_resolver import resolver_key
+    projection = {f: 1 for f in ("machine", "alarm_id", "extracted_at") + CATALOGUE_FIELDS}
+    projection["_id"] = 0
+    newest = {}
+    for doc in db.get_alarms({}, projection):
+        key = resolver_key(doc.get("machine"), doc.get("alarm_id"))
+        current = newest.get(key)
+        if current is None or str(doc.get("extracted_at") or "") > str(current.get("extracted_at") or ""):
+            newest[key] = doc
+    cols = {"machine": [k[0] for k in newest], "alarm_id": [d.get("alarm_id") for d in newest.values()]}
+    for f in CATALOGUE_FIELDS:
+        cols[f] = [d.get(f) for d in newest.values()]
+    return pa.table({k: pa.array(v, pa.string()) for k, v in cols.items()})
+
+def join_catalogue(events: pa.Table, catalogue: pa.Table) -> pa.Table:
+    """
+    Left join on (machine, normalised alarm_id); events keep their own
+    alarm_id and unknown alarms keep null classification. The boolean
+    "catalogued" column records which events found a catalogue row.
+    """
+    if catalogue is None or not catalogue.num_rows:
+        for f in CATALOGUE_FIELDS:
+            events = events.append_column(f, pa.nulls(events.num_rows, pa.string()))
+        return events.append_column("catalogued", pa.array(np.zeros(events.num_rows, dtype=bool)))
+    right = catalogue.select(["machine"] + list(CATALOGUE_FIELDS))
+    right = right.append_column("alarm_key", alarm_key(catalogue["alarm_id"]))
+    right = right.append_column("catalogued", pa.array(np.ones(right.num_rows, dtype=bool)))
+    left = events.append_column("alarm_key", alarm_key(events["alarm_id"]))
+    joined = left.join(right, keys=["machine", "alarm_key"], join_type="left outer").drop_columns(["alarm_key"])
+    return joined.set_column(joined.column_names.index("catalogued"), "catalogued",
+                             pc.fill_null(joined["catalogued"], False))
+
+# ── Rollups ─────────────────────────────────────────────────────────
+
+def _seconds(col) -> np.ndarray:
+    return pc.divide(col.cast(pa.int64()), 1000).to_numpy(zero_copy_only=False)
+
+def _key_codes(events: pa.Table) -> np.ndarray:
+    """One int64 per event identifying its ROLLUP_KEYS combination (nulls included)."""
+    code = np.zeros(events.num_rows, dtype=np.int64)
+    for k in ROLLUP_KEYS:
+        encoded = events[k].combine_chunks().dictionary_encode()
+        width = len(encoded.dictionary) + 1
+        code = code * width + pc.fill_null(encoded.indices, width - 1).to_numpy().astype(np.int64)
+    return code
+
+def rollup(events: pa.Table, grain: str, codes: np.ndarray = None) -> pa.Table:
+    """
+    Events and downtime seconds per (bucket, ROLLUP_KEYS) at this grain.
+    Grouped on integer codes with numpy rather than on the string columns.
+    """
+    size = GRAINS[grain]
+    codes = _key_codes(events) if codes is None else codes
+    start = _seconds(events["start"])
+    end = pc.fill_null(events["end"], events["start"])
+    end = np.maximum(_seconds(end), start)
+    first = start // size
+    last = np.maximum(end - 1, start) // size
+    spans = last - first + 1
+    row = np.repeat(np.arange(len(start)), spans)
+    offset = np.arange(len(row)) - np.repeat(np.cumsum(spans) - spans, spans)
+    bucket = first[row] + offset
+    downtime = np.minimum(end[row], (bucket + 1) * size) - np.maximum(start[row], bucket * size)
+
+    group = (bucket - bucket.min(initial=0)) * (codes.max(initial=0) + 1) + codes[row]
+    _, rep, inverse = np.unique(group, return_index=True, return_inverse=True)
+    columns = {k: events[k].take(pa.array(row[rep])) for k in ROLLUP_KEYS}
+    columns["bucket"] = pa.array(bucket[rep] * size, pa.int64())
+    columns["events"] = pa.array(np.bincount(inverse, weights=offset == 0).astype(np.int64))
+    columns["downtime_s"] = pa.array(np.bincount(inverse, weights=np.maximum(downtime, 0)).astype(np.int64))
+    return pa.table(columns).select(["bucket", *ROLLUP_KEYS, "events", "downtime_s"])
+
+def _sum(table: pa.Table) -> pa.Table:
+    out = table.group_by(["bucket", *ROLLUP_KEYS], use_threads=False).aggregate(
+        [("events", "sum"), ("downtime_s", "sum")])
+    return out.rename_columns([{"events_sum": "events", "downtime_s_sum": "downtime_s"}.get(c, c)
+                               for c in out.column_names])
+
+def _day(seconds) -> str:
+    return datetime.fromtimestamp(int(seconds), tz=timezone.utc).strftime("%Y-%m-%d")
+
+class AlarmEventStore:
+    def __init__(self, store_dir: str = EVENT_STORE_DIR):
+        self.store_dir = store_dir
+        self.events_dir = os.path.join(store_dir, "events")
+        self.manifest_path = os.path.join(store_dir, "batches.json")
+        for grain in GRAINS:
+            os.makedirs(os.path.join(store_dir, "rollups", grain), exist_ok=True)
+        os.makedirs(self.events_dir, exist_ok=True)
+
+    def _batches(self) -> dict:
+        if not os.path.exists(self.manifest_path): return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _rollup_path(self, grain: str, day: str) -> str:
+        return os.path.join(self.store_dir, "rollups", grain, day + ".parquet")
+
+    # ── Ingestion ───────────────────────────────────────────────────
+
+    def ingest(self, source, db=None, catalogue: pa.Table = None, name: str = None, fmt: str = None) -> dict:
+        """
+        Parse, join and store one export. source is a path, bytes or file
+        object; the catalogue comes from db unless given. Returns
+        {batch, events, matched, days, skipped}.
+        """
+        data = source if isinstance(source, bytes) else None
+        if data is None:
+            if isinstance(source, str):
+                with open(source, "rb") as f:
+                    data = f.read()
+            else:
+                data = source.read()
+        name = name or (source if isinstance(source, str) else getattr(source, "name", "events"))
+        batch = hashlib.sha1(data).hexdigest()[:16]
+        if batch in self._batches():
+            return {"batch": batch, "events": 0, "matched": 0, "days": [], "skipped": True}
+
+        events = read_events(data, fmt or _format(name))
+        if catalogue is None and db is not None:
+            catalogue = catalogue_table(db)
+        events = join_catalogue(events, catalogue)
+        matched = pc.sum(events["catalogued"]).as_py() or 0
+        return self.append(events.drop_columns(["catalogued"]), batch, name, matched)
+
+    def append(self, events: pa.Table, batch: str, name: str = "", matched: int = None) -> dict:
+        """Store joined events and merge their rollups. matched defaults to the events with a classification."""
+        events = events.combine_chunks()
+        day_index, inverse = np.unique(_seconds(events["start"]) // 86400, return_inverse=True)
+        days = pa.array([_day(d * 86400) for d in day_index], pa.string()).take(pa.array(inverse))
+        events = events.append_column("day", days)
+        with _WRITE_LOCK:
+            if len(events):
+                ds.write_dataset(
+                    events, self.events_dir, format="parquet",
+                    partitioning=ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive"),
+                    basename_template=f"part-{batch}-{{i}}.parquet",
+                    existing_data_behavior="overwrite_or_ignore")
+                codes = _key_codes(events)
+                for grain in GRAINS:
+                    self._merge_rollup(grain, rollup(events, grain, codes))
+            batches = self._batches()
+            batches[batch] = {"source": name, "events": len(events),
+                              "ingested_at": datetime.now().isoformat(timespec="seconds")}
+            tmp = self.manifest_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(batches, f)
+            os.replace(tmp, self.manifest_path)
+        if matched is None:
+            matched = len(events) - events["reason_level_1"].null_count if len(events) else 0
+        return {"batch": batch, "events": len(events), "matched": matched,
+                "days": [_day(d * 86400) for d in day_index], "skipped": False}
+
+    def _merge_rollup(self, grain: str, table: pa.Table):
+        """Add a batch's rollup rows into the per-day rollup files they touch."""
+        day_of = table["bucket"].to_numpy() // 86400
+        for d in np.unique(day_of):
+            part = table.filter(pa.array(day_of == d))
+            path = self._rollup_path(grain, _day(d * 86400))
+            if os.path.exists(path):
+                part = _sum(pa.concat_tables([pq.read_table(path), part]))
+            tmp = path + ".tmp"
+            pq.write_table(part.sort_by("bucket"), tmp)
+            os.replace(tmp, path)
+
+    # ── Queries ─────────────────────────────────────────────────────
+
+    def days(self) -> list:
+        return sorted(f[4:] for f in os.listdir(self.events_dir) if f.startswith("day="))
+
+    def downtime(self, grain: str = "hour", start: datetime = None, end: datetime = None,
+                 machine: str = None, by: tuple = ("machine",)) -> pd.DataFrame:
+        """
+        Events and downtime (seconds) per bucket of this grain, grouped by
+        the `by` columns (any of ROLLUP_KEYS), for buckets in [start, end).
+        """
+        folder = os.path.join(self.store_dir, "rollups", grain)
+        lo = start.strftime("%Y-%m-%d") if start else ""
+        hi = end.strftime("%Y-%m-%d") if end else "9999"
+        files = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+                 if f.endswith(".parquet") and lo <= f[:10] <= hi]
+        columns = ["bucket", *by, "events", "downtime_s"]
+        if not files:
+            return pd.DataFrame(columns=columns)
+        needed = list(dict.fromkeys(["bucket", *by, "events", "downtime_s"] + (["machine"] if machine is not None else [])))
+        table = pa.concat_tables([pq.read_table(f, columns=needed) for f in files])
+        mask = pc.is_valid(table["bucket"])
+        if start: mask = pc.and_(mask, pc.greater_equal(table["bucket"], int(_epoch(start))))
+        if end: mask = pc.and_(mask, pc.less(table["bucket"], int(_epoch(end))))
+        if machine is not None: mask = pc.and_(mask, pc.equal(table["machine"], machine))
+        table = table.filter(mask)
+        out = table.group_by(["bucket", *by]).aggregate([("events", "sum"), ("downtime_s", "sum")])
+        df = out.to_pandas().rename(columns={"events_sum": "events", "downtime_s_sum": "downtime_s"})
+        df["bucket"] = pd.to_datetime(df["bucket"], unit="s")
+        return df[columns].sort_values(["bucket", *by], na_position="last").reset_index(drop=True)
+
+    def events(self, start: datetime = None, end: datetime = None, machine: str = None,
+               columns: list = None) -> pd.DataFrame:
+        """Raw joined events that started in [start, end); only the day partitions in range are read."""
+        dataset = ds.dataset(self.events_dir, format="parquet", partitioning="hive")
+        expr = None
+        def both(a, b): return b if a is None else a & b
+        if start:
+            expr = both(expr, (ds.field("day") >= start.strftime("%Y-%m-%d")) & (ds.field("start") >= pa.scalar(start, pa.timestamp("ms"))))
+        if end:
+            expr = both(expr, (ds.field("day") <= end.strftime("%Y-%m-%d")) & (ds.field("start") < pa.scalar(end, pa.timestamp("ms"))))
+        if machine is not None:
+            expr = both(expr, ds.field("machine") == machine)
+        return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+    def batch_events(self, batch: str, columns: list = None) -> pd.DataFrame:
+        """The joined events one ingested batch added (for consumers that follow the store batch by batch)."""
+        files = sorted(glob.glob(os.path.join(self.events_dir, "day=*", f"part-{batch}-*.parquet")))
+        if not files:
+            return pd.DataFrame(columns=columns)
+        return ds.dataset(files, format="parquet").to_table(columns=columns).to_pandas()
+
+    def top_alarms(self, start: datetime = None, end: datetime = None, machine: str = None,
+                   top_n: int = 10) -> list:
+        """[{machine, alarm_id, description, events, downtime_s}] by total downtime, then by events."""
+        df = self.events(start, end, machine, columns=["machine", "alarm_id", "description", "start", "end"])
+        if df.empty: return []
+        df["downtime_s"] = (df["end"].fillna(df["start"]) - df["start"]).dt.total_seconds().clip(lower=0)
+        out = (df.groupby(["machine", "alarm_id"], dropna=False)
+                 .agg(description=("description", "first"), events=("start", "size"), downtime_s=("downtime_s", "sum"))
+                 .reset_index()
+                 .sort_values(["downtime_s", "events", "machine", "alarm_id"], ascending=[False, False, True, True])
+                 .head(top_n))
+        out["downtime_s"] = out["downtime_s"].astype(int)
+        return out.to_dict("records")
+
+    def stats(self) -> dict:
+        batches = self._batches()
+        return {"batches": len(batches), "events": sum(b["events"] for b in batches.values()), "days": len(self.days())}
+
+def _epoch(dt: datetime) -> float:
+    """Seconds since the epoch for a naive (UTC) or aware datetime."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
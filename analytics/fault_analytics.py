@@ -1,11 +1,17 @@
 import pandas as pd
 from sklearn.ensemble import IsolationForest
+from config import ANALYTICS_BACKEND
 
 class FaultAnalytics:
     """
     Local analytics on alarm records already stored in MongoDB.
     Replaces Cortex AI analytics for demo purposes.
     All models run on CPU using data already in your local MongoDB.
+
+    Every row carries a "count" weight: 1 per raw alarm record, or the
+    pre-aggregated count when built from alarm_rollups (see from_rollups).
+    Dimension columns may be categorical (see from_columnar); group-bys use
+    observed=True so only combinations that occur are returned.
     """
 
     def __init__(self, alarm_records: list):
@@ -14,22 +20,45 @@ class FaultAnalytics:
         for r in alarm_records:
             items.append(r if isinstance(r, dict) else r.model_dump())
         self.df = pd.DataFrame(items)
+        if not self.df.empty:
+            self.df["count"] = 1
+        self.unclassified_ids = None
+
+    @classmethod
+    def from_rollups(cls, rollups: list, unclassified_ids: list = None) -> "FaultAnalytics":
+        """Build from DatabaseManager.get_alarm_rollups() instead of raw alarms."""
+        fa = cls([])
+        fa.df = pd.DataFrame(rollups)
+        fa.unclassified_ids = unclassified_ids or []
+        return fa
+
+    @classmethod
+    def from_columnar(cls, store, unclassified_ids: list = None) -> "FaultAnalytics":
+        """Build from a ColumnarAlarmStore snapshot (one row per alarm, categorical columns)."""
+        fa = cls([])
+        fa.df = store.frame()
+        fa.unclassified_ids = unclassified_ids
+        return fa
+
+    def total_alarms(self) -> int:
+        if self.df.empty: return 0
+        return int(self.df["count"].sum())
 
     def top_fault_categories(self, machine: str = None, top_n: int = 10) -> list:
         if self.df.empty: return []
         df = self.df[self.df["machine"] == machine] if machine else self.df
         counts = (
-            df.groupby(["reason_level_1", "reason_level_2"])
-              .size()
+            df.groupby(["reason_level_1", "reason_level_2"], observed=True)["count"]
+              .sum()
               .reset_index(name="count")
-              .sort_values("count", ascending=False)
+              .sort_values(["count", "reason_level_1", "reason_level_2"], ascending=[False, True, True])
               .head(top_n)
         )
         return counts.to_dict("records")
 
     def anomalous_machines(self) -> list:
         if self.df.empty: return []
-        counts = self.df.groupby("machine").size().reset_index(name="count")
+        counts = self.df.groupby("machine", observed=True)["count"].sum().reset_index(name="count")
         if len(counts) < 3:
             return []
         model = IsolationForest(contamination=0.1, random_state=42)
@@ -37,27 +66,49 @@ class FaultAnalytics:
         return counts[counts["anomaly"] == -1]["machine"].tolist()
 
     def unclassified_alarms(self) -> list:
+        if self.unclassified_ids is not None: return self.unclassified_ids
         if self.df.empty: return []
         return self.df[self.df["reason_level_1"].isna()]["alarm_id"].tolist()
 
     def electrical_fault_rate(self, machine: str = None) -> float:
         if self.df.empty: return 0.0
         df = self.df[self.df["machine"] == machine] if machine else self.df
-        if len(df) == 0:
+        total = df["count"].sum()
+        if total == 0:
             return 0.0
-        elec = df["reason_level_2"].str.contains(
-            "electrical", case=False, na=False).sum()
-        return round(float(elec) / len(df) * 100, 1)
+        elec = df.loc[df["reason_level_2"].str.contains(
+            "electrical", case=False, na=False), "count"].sum()
+        return round(float(elec) / total * 100, 1)
 
     def monthly_alarm_trend(self, machine: str = None) -> dict:
         if self.df.empty: return {}
-        if "extracted_at" not in self.df: return {}
-        
+        if "month" not in self.df and "extracted_at" not in self.df: return {}
+
         df = self.df[self.df["machine"] == machine] if machine else self.df
         df = df.copy()
         try:
-            df["month"] = pd.to_datetime(df["extracted_at"]).dt.to_period("M")
-            counts = df.groupby("month").size()
+            if "month" not in df:
+                df["month"] = pd.to_datetime(df["extracted_at"]).dt.strftime("%Y-%m")
+            counts = df.groupby("month", observed=True)["count"].sum()
             return {str(k): int(v) for k, v in counts.items()}
         except:
             return {}
+
+def load_fault_analytics(db):
+    """
+    Analytics for the configured ANALYTICS_BACKEND:
+      local    — FaultAnalytics over the maintained alarm_rollups
+      mongo    — MongoFaultAnalytics, aggregation pipelines run next to the data
+      columnar — FaultAnalytics over the per-file Arrow snapshot (ColumnarAlarmStore)
+    """
+    if ANALYTICS_BACKEND == "mongo" and db.client:
+        from analytics.mongo_analytics import MongoFaultAnalytics
+        return MongoFaultAnalytics(db)
+    if ANALYTICS_BACKEND == "columnar":
+        from analytics.columnar_store import ColumnarAlarmStore
+        store = ColumnarAlarmStore()
+        store.sync(db)
+        return FaultAnalytics.from_columnar(store)
+    # Only the ids are listed, so only the ids are fetched
+    unclassified = [a["alarm_id"] for a in db.get_alarms({"reason_level_1": None}, {"alarm_id": 1, "_id": 0})]
+    return FaultAnalytics.from_rollups(db.get_alarm_rollups(), unclassified)
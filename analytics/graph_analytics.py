@@ -0,0 +1,181 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy import sparse
+from config import GRAPH_NEIGHBOURHOOD_CACHE_SIZE
+
+# Alarm rows per block when generating candidate pairs
+_PAIR_BLOCK = 2048
+
+class GraphAnalytics:
+    """
+    Fleet-wide component co-occurrence over the alarm graph.
+
+    A is the sparse alarm x component incidence matrix (1 where core.tagger
+    tagged the alarm with the component). A @ A.T counts the components
+    each pair of alarms shares, so its rows are 2-hop neighbourhoods
+    (alarm -> component -> alarm). Rows are computed on demand and kept in an LRU; the fleet's
+    top pairs use prefix filtering rather than materialising A @ A.T.
+
+    Alarms and components are indexed in sorted-name order, and every
+    result ties on name, matching Neo4jGraphAnalytics.
+    """
+    def __init__(self, alarm_ids: list, components: list, alarm_index: np.ndarray, component_index: np.ndarray,
+                 cache_size: int = GRAPH_NEIGHBOURHOOD_CACHE_SIZE):
+        self.alarm_ids = list(alarm_ids)
+        self.components = list(components)
+        self.row_of = {a: i for i, a in enumerate(self.alarm_ids)}
+        data = np.ones(len(alarm_index), dtype=np.int32)
+        self.A = sparse.csr_matrix((data, (alarm_index, component_index)),
+                                   shape=(len(self.alarm_ids), len(self.components)))
+        self.AT = self.A.T.tocsr()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_graph(cls, graph) -> "GraphAnalytics":
+        """From an in-memory AlarmGraph (its CompactAlarmGraph store)."""
+        return cls(*graph.store.incidence())
+
+    # ── Neighbourhoods ──────────────────────────────────────────────
+
+    def _neighbourhood(self, row: int) -> tuple:
+        """(alarm rows, shared counts) two hops from row, excluding itself; cached."""
+        with self.lock:
+            hit = self.cache.get(row)
+            if hit is not None:
+                self.cache.move_to_end(row)
+                return hit
+        co = (self.A[row] @ self.AT).tocsr()
+        cols, shared = co.indices, co.data
+        keep = cols != row
+        result = (cols[keep], shared[keep])
+        with self.lock:
+            self.cache[row] = result
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    def two_hop(self, alarm_id: str) -> list:
+        """Alarms sharing at least one component with alarm_id, by name."""
+        row = self.row_of.get(alarm_id)
+        if row is None: return []
+        cols, _ = self._neighbourhood(row)
+        return [self.alarm_ids[c] for c in np.sort(cols)]
+
+    def related_alarms(self, alarm_id: str, top_n: int = 10) -> list:
+        """[(alarm_id, shared components)] most shared first, then by name."""
+        row = self.row_of.get(alarm_id)
+        if row is None: return []
+        cols, shared = self._neighbourhood(row)
+        order = np.lexsort((cols, -shared))[:top_n]
+        return [(self.alarm_ids[cols[i]], int(shared[i])) for i in order]
+
+    def shared_components(self, alarm_a: str, alarm_b: str) -> list:
+        ra, rb = self.row_of.get(alarm_a), self.row_of.get(alarm_b)
+        if ra is None or rb is None: return []
+        both = set(self.A[ra].indices) & set(self.A[rb].indices)
+        return [self.components[c] for c in sorted(both)]
+
+    # ── Fleet-wide ──────────────────────────────────────────────────
+
+    def top_cooccurring_pairs(self, top_n: int = 10) -> list:
+        """
+        [(alarm_a, alarm_b, shared components)] with alarm_a < alarm_b, most
+        shared first, then by names.
+
+        Searched from the highest possible overlap t downwards with prefix
+        filtering: two alarms sharing >= t components must share one of
+        their (degree - t + 1) rarest components, so only those pairs are
+        generated and verified. The scan stops at the first t yielding
+        top_n pairs, which avoids forming all of A @ A.T when a few common
+        components link most alarms.
+        """
+        if top_n <= 0 or not self.A.nnz: return []
+        A = self.A.tocsr()
+        degree = np.diff(A.indptr)
+        # Components ranked rarest first; each alarm's entries sorted by that rank
+        rank = np.empty(A.shape[1], dtype=np.int64)
+        rank[np.argsort(np.diff(self.AT.indptr), kind="stable")] = np.arange(A.shape[1])
+        rows = np.repeat(np.arange(A.shape[0]), degree)
+        order = np.lexsort((rank[A.indices], rows))
+        sorted_cols = A.indices[order]
+        position = np.arange(len(order)) - A.indptr[rows]     # 0 = rarest component of the alarm
+
+        for t in range(int(degree.max()), 0, -1):
+            keep = (degree[rows] >= t) & (position < degree[rows] - t + 1)
+            P = sparse.csr_matrix((np.ones(int(keep.sum()), dtype=np.int32), (rows[keep], sorted_cols[keep])),
+                                  shape=A.shape)
+            r, c = self._upper_pairs(P)
+            if not len(r): continue
+            shared = np.asarray(A[r].multiply(A[c]).sum(axis=1)).ravel()
+            hit = shared >= t
+            if hit.sum() >= top_n or t == 1:
+                r, c, shared = r[hit], c[hit], shared[hit]
+                best = np.lexsort((c, r, -shared))[:top_n]
+                return [(self.alarm_ids[r[i]], self.alarm_ids[c[i]], int(shared[i])) for i in best]
+        return []
+
+    @staticmethod
+    def _upper_pairs(P: sparse.csr_matrix) -> tuple:
+        """(row, col) pairs with row < col that share a column of P, built block by block."""
+        PT = P.T.tocsr()
+        out_r, out_c = [], []
+        for start in range(0, P.shape[0], _PAIR_BLOCK):
+            block = (P[start:start + _PAIR_BLOCK] @ PT).tocoo()
+            br = block.row + start
+            upper = block.col > br
+            out_r.append(br[upper])
+            out_c.append(block.col[upper])
+        return np.concatenate(out_r), np.concatenate(out_c)
+
+    def stats(self) -> dict:
+        return {"alarms": self.A.shape[0], "components": self.A.shape[1], "edges": int(self.A.nnz),
+                "cached_neighbourhoods": len(self.cache)}
+
+
+class Neo4jGraphAnalytics:
+    """The same queries as GraphAnalytics, answered by Cypher with the same ordering."""
+    def __init__(self, driver):
+        self.driver = driver
+
+    def _rows(self, query: str, **params) -> list:
+        with self.driver.session() as session:
+            return [r.values() for r in session.run(query, **params)]
+
+    def two_hop(self, alarm_id: str) -> list:
+        rows = self._rows(
+            "MATCH (a:Alarm {id: $aid})-[:CAUSES]->(:Component)<-[:CAUSES]-(b:Alarm) WHERE b.id <> a.id "
+            "RETURN DISTINCT b.id ORDER BY b.id", aid=alarm_id)
+        return [r[0] for r in rows]
+
+    def related_alarms(self, alarm_id: str, top_n: int = 10) -> list:
+        rows = self._rows(
+            "MATCH (a:Alarm {id: $aid})-[:CAUSES]->(c:Component)<-[:CAUSES]-(b:Alarm) WHERE b.id <> a.id "
+            "RETURN b.id, count(DISTINCT c) AS shared ORDER BY shared DESC, b.id LIMIT $n",
+            aid=alarm_id, n=top_n)
+        return [(r[0], r[1]) for r in rows]
+
+    def shared_components(self, alarm_a: str, alarm_b: str) -> list:
+        rows = self._rows(
+            "MATCH (:Alarm {id: $a})-[:CAUSES]->(c:Component)<-[:CAUSES]-(:Alarm {id: $b}) "
+            "RETURN DISTINCT c.name ORDER BY c.name", a=alarm_a, b=alarm_b)
+        return [r[0] for r in rows]
+
+    def top_cooccurring_pairs(self, top_n: int = 10) -> list:
+        rows = self._rows(
+            "MATCH (a:Alarm)-[:CAUSES]->(c:Component)<-[:CAUSES]-(b:Alarm) WHERE a.id < b.id "
+            "RETURN a.id, b.id, count(DISTINCT c) AS shared ORDER BY shared DESC, a.id, b.id LIMIT $n",
+            n=top_n)
+        return [(r[0], r[1], r[2]) for r in rows]
+
+
+def load_graph_analytics(graph=None):
+    """Analytics for the AlarmGraph's backend: Cypher on Neo4j, sparse matrices in memory."""
+    if graph is None:
+        from search.graph_index import AlarmGraph
+        graph = AlarmGraph()
+    if graph.backend == "neo4j" and graph.neo:
+        return Neo4jGraphAnalytics(graph.neo.driver)
+    return GraphAnalytics.from_graph(graph)
@@ -0,0 +1,91 @@
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+class MongoFaultAnalytics:
+    """
+    Server-side FaultAnalytics: every query is compiled into a MongoDB
+    aggregation pipeline ($match/$group/$sort) so only aggregated rows leave
+    the database. Selected with ANALYTICS_BACKEND=mongo.
+    Returns exactly what FaultAnalytics returns for the same alarms.
+    """
+
+    def __init__(self, db):
+        self.alarms = db.alarms
+
+    def _match(self, machine: str = None, **conditions) -> dict:
+        # Leading machine equality lets $match use the (machine, alarm_id) index
+        match = {"machine": machine} if machine else {}
+        match.update(conditions)
+        return {"$match": match}
+
+    def total_alarms(self) -> int:
+        return self.alarms.count_documents({})
+
+    def top_fault_categories(self, machine: str = None, top_n: int = 10) -> list:
+        pipeline = [
+            # pandas groupby drops null keys; mirror that here
+            self._match(machine, reason_level_1={"$ne": None}, reason_level_2={"$ne": None}),
+            {"$group": {
+                "_id": {"reason_level_1": "$reason_level_1", "reason_level_2": "$reason_level_2"},
+                "count": {"$sum": 1},
+            }},
+            {"$sort": {"count": -1, "_id.reason_level_1": 1, "_id.reason_level_2": 1}},
+            {"$limit": top_n},
+        ]
+        return [
+            {"reason_level_1": r["_id"]["reason_level_1"],
+             "reason_level_2": r["_id"]["reason_level_2"],
+             "count": r["count"]}
+            for r in self.alarms.aggregate(pipeline)
+        ]
+
+    def anomalous_machines(self) -> list:
+        pipeline = [
+            self._match(machine={"$ne": None}),
+            {"$group": {"_id": "$machine", "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+        ]
+        counts = pd.DataFrame(
+            [{"machine": r["_id"], "count": r["count"]} for r in self.alarms.aggregate(pipeline)]
+        )
+        if len(counts) < 3:
+            return []
+        model = IsolationForest(contamination=0.1, random_state=42)
+        counts["anomaly"] = model.fit_predict(counts[["count"]])
+        return counts[counts["anomaly"] == -1]["machine"].tolist()
+
+    def unclassified_alarms(self) -> list:
+        pipeline = [
+            self._match(reason_level_1=None),
+            {"$project": {"_id": 0, "alarm_id": 1}},
+        ]
+        return [r["alarm_id"] for r in self.alarms.aggregate(pipeline)]
+
+    def electrical_fault_rate(self, machine: str = None) -> float:
+        pipeline = [
+            self._match(machine),
+            {"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "elec": {"$sum": {"$cond": [
+                    {"$regexMatch": {"input": {"$ifNull": ["$reason_level_2", ""]},
+                                     "regex": "electrical", "options": "i"}},
+                    1, 0
+                ]}},
+            }},
+        ]
+        res = list(self.alarms.aggregate(pipeline))
+        if not res or res[0]["total"] == 0:
+            return 0.0
+        return round(float(res[0]["elec"]) / res[0]["total"] * 100, 1)
+
+    def monthly_alarm_trend(self, machine: str = None) -> dict:
+        pipeline = [
+            self._match(machine, extracted_at={"$type": "date"}),
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m", "date": "$extracted_at"}},
+                "count": {"$sum": 1},
+            }},
+            {"$sort": {"_id": 1}},
+        ]
+        return {r["_id"]: r["count"] for r in self.alarms.aggregate(pipeline)}
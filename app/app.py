@@ -9,15 +9,28 @@ from core.database import DatabaseManager
 from core.pipeline import BulkUploadPipeline
 from core.phase_engine import PhaseEngine
 from core.spreadsheet_generator import SpreadsheetGenerator
-from config import DEFAULT_MACHINE, REASON_CLASSIFICATION_MODE
+from config import DEFAULT_MACHINE, REASON_CLASSIFICATION_MODE, EMBEDDING_WARM_UP
 
 st.set_page_config(page_title="Industrail_App", layout="wide")
 
 st.title("Industrail_App")
 st.markdown("> Free Local Architecture Demo")
 
-db = DatabaseManager()
+@st.cache_resource
+def get_db() -> DatabaseManager:
+    # One DatabaseManager per server process so its query cache survives reruns
+    return DatabaseManager()
+
+@st.cache_resource
+def start_model_warm_up():
+    # Load the embedding model and Chroma client in the background once per process
+    from search import model_registry
+    return model_registry.warm_up()
+
+db = get_db()
 pipeline = BulkUploadPipeline(db)
+if EMBEDDING_WARM_UP:
+    start_model_warm_up()
 
 tab1, tab2, tab3 = st.tabs(["Upload & Process", "Database Search", "History & Analytics"])
 
@@ -73,10 +86,13 @@ with tab1:
                     if res.alarms or res.parameters:
                         with st.spinner("Service Layer: ExtractionAgent is mapping and generating spreadsheet..."):
                             from service.extraction_agent import ExtractionAgent
-                            agent = ExtractionAgent()
+                            agent = ExtractionAgent(db)
                             out_path = agent.generate_excel(machine, res.source_text, res.alarms, res.parameters)
                             
-                        st.success(f"Spreadsheet generated locally at: {out_path}")
+                        if agent.cache_hit:
+                            st.success(f"Records unchanged since the last export; reusing: {out_path}")
+                        else:
+                            st.success(f"Spreadsheet generated locally at: {out_path}")
                         
                         with open(out_path, "rb") as f:
                             file_data = f.read()
@@ -91,32 +107,109 @@ with tab2:
     st.header("Search & Review Alarms")
     
     query = st.text_input("Search Text:")
-    search_type = st.radio("Search Type", ["Keyword (BM25)", "Semantic (Vector)", "Graph (Neo4j/NetworkX)"])
+
+    @st.cache_resource(max_entries=1)
+    def get_suggester(processed_md5s: tuple):
+        # Rebuilt only when the set of processed files changes
+        from search.suggest import AlarmSuggester
+        return AlarmSuggester().build(db.get_alarms({}))
+
+    if query.strip():
+        suggester = get_suggester(tuple(sorted(f["md5"] for f in db.get_all_processed_files())))
+        suggestions = suggester.suggest(query.split()[-1], limit=8)
+        if suggestions:
+            st.caption("Suggestions: " + " | ".join(suggestions))
+    search_type = st.radio("Search Type", ["Hybrid (BM25 + Vector)", "Keyword (BM25)", "Semantic (Vector)", "Graph (Neo4j/In-memory)"])
+    reindex = st.checkbox("Re-index all stored alarms before a semantic search", value=False)
+    expand_graph = st.checkbox("Hybrid: also match alarms by components named in the query", value=False)
+
+    @st.cache_resource
+    def get_graph():
+        # The in-memory graph is persisted and kept current by the pipeline; build it once for older databases
+        from search.graph_index import AlarmGraph
+        graph = AlarmGraph()
+        if graph.is_empty():
+            graph.build(db.get_alarms({}))
+        return graph
+
+    @st.cache_resource
+    def get_bm25():
+        # One index per server; _refresh picks up the pipeline's deltas and merges before each search
+        from search.bm25_index import PersistentBM25Index
+        return PersistentBM25Index()
+
+    @st.cache_resource(max_entries=1)
+    def get_graph_analytics(graph_version):
+        # Rebuilt when the persisted graph changes, so its 2-hop cache survives reruns
+        from analytics.graph_analytics import load_graph_analytics
+        return load_graph_analytics(get_graph())
+
+    def show_hits(hits: list):
+        # One batched lookup for every hit, then a highlighted card per alarm
+        from search.hydrate import hydrate_hits
+        for h in hydrate_hits(db, hits, query):
+            st.markdown(f"**{h['alarm_id']}** · {h.get('machine') or '-'} · {h.get('reason_level_2') or ''}  \n"
+                        f"{h['description_highlight']}  \n"
+                        f"*Cause:* {h['cause_highlight']}")
     
     if st.button("Search"):
         alarms_raw = db.get_alarms({})
         if not alarms_raw:
             st.warning("No alarms in database. Please upload a PDF first.")
         else:
-            if "Keyword" in search_type:
-                from search.bm25_index import BM25AlarmIndex
-                idx = BM25AlarmIndex()
-                idx.build(alarms_raw)
-                res = idx.search(query, top_k=5)
-                st.write("Top Alarm IDs matching keywords:", res)
+            if "Hybrid" in search_type:
+                from search.vector_index import VectorAlarmIndex
+                from search.query_service import HybridSearchService
+                bm25 = get_bm25()
+                if bm25.doc_count == 0:
+                    bm25.add(alarms_raw)
+                reindexed = {}
+
+                def open_vector():
+                    # Runs in the vector worker, so model load and indexing count against its deadline
+                    vector = VectorAlarmIndex()
+                    if reindex or vector.count() == 0:
+                        reindexed.update(vector.add_alarms(alarms_raw))
+                    return vector
+
+                with st.spinner("Searching..."):
+                    graph = get_graph() if expand_graph else None
+                    res = HybridSearchService(bm25, graph=graph, vector_factory=open_vector).search(
+                        query, top_k=10, expand_graph=expand_graph)
+                if reindexed:
+                    st.caption(f"Re-indexed: {reindexed['indexed']} embedded, {reindexed['skipped']} unchanged.")
+                show_hits(res["hits"])
+                st.caption(f"Backend latency (ms): {res['timings_ms']}")
+                if res["timed_out"]:
+                    st.warning(f"Timed out and skipped: {', '.join(res['timed_out'])}")
+                if res["errors"]:
+                    st.warning(f"Failed: {res['errors']}")
+            elif "Keyword" in search_type:
+                idx = get_bm25()
+                if idx.doc_count == 0:
+                    # First search on a database populated before the persistent index existed
+                    idx.add(alarms_raw)
+                show_hits(idx.search_hits(query, top_k=5))
             elif "Semantic" in search_type:
-                with st.spinner("Generating embeddings & searching ChromaDB..."):
+                with st.spinner("Searching ChromaDB..."):
                     from search.vector_index import VectorAlarmIndex
                     idx = VectorAlarmIndex()
-                    idx.add_alarms(alarms_raw)
-                    res = idx.search(query, top_k=5)
-                    st.write("Semantic Match Results:", res)
+                    if reindex or idx.count() == 0:
+                        # Unchanged alarms are skipped and embeddings come from the cache where possible
+                        counts = idx.add_alarms(alarms_raw)
+                        st.caption(f"Re-indexed: {counts['indexed']} embedded, {counts['skipped']} unchanged.")
+                    show_hits(idx.search(query, top_k=5))
+                    with st.expander("Model Registry Stats"):
+                        from search import model_registry
+                        st.json(model_registry.stats())
             elif "Graph" in search_type:
-                with st.spinner("Building network graph..."):
-                    from search.graph_index import AlarmGraph
-                    idx = AlarmGraph()
-                    idx.build(alarms_raw)
-                    st.write("Component Risk Ranking:", idx.component_risk_ranking()[:10])
+                with st.spinner("Loading alarm graph..."):
+                    graph = get_graph()
+                    st.write("Component Risk Ranking:", graph.component_risk_ranking()[:10])
+                    ga = get_graph_analytics(graph.store.mtime if graph.store else None)
+                    if query.strip():
+                        st.write(f"Alarms sharing components with {query.strip()}:", ga.related_alarms(query.strip(), 10))
+                    st.write("Alarm pairs sharing the most components (fleet-wide):", ga.top_cooccurring_pairs(10))
 
 with tab3:
     st.header("History & Analytics")
@@ -137,7 +230,7 @@ with tab3:
                 st.caption(f"Extracted: {f.get('processed_at')}")
             with colC:
                 if st.button("Delete Data", key=f"del_{f['md5']}"):
-                    if db.delete_processed_file(f['md5']):
+                    if pipeline.delete_file(f['md5']):
                         st.success("Deleted successfully!")
                         st.rerun()
                     else:
@@ -146,18 +239,63 @@ with tab3:
     st.divider()
     st.subheader("Global Fault Analytics")
     
-    alarms_raw = db.get_alarms({})
-    if not alarms_raw:
+    from analytics.fault_analytics import load_fault_analytics
+    fa = load_fault_analytics(db)
+    if fa.total_alarms() == 0:
         st.info("No alarms to analyze.")
     else:
-        from analytics.fault_analytics import FaultAnalytics
-        fa = FaultAnalytics(alarms_raw)
-        
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Total Alarms in DB", len(alarms_raw))
+            st.metric("Total Alarms in DB", fa.total_alarms())
             st.metric("Electrical Fault Rate", f"{fa.electrical_fault_rate()}%")
         
         with col2:
             st.write("Top Combined Fault Categories (Reason 1 + 2)")
             st.dataframe(fa.top_fault_categories())
+
+    with st.expander("Alarm Events & Downtime"):
+        from analytics.event_store import AlarmEventStore
+        events = AlarmEventStore()
+        upload = st.file_uploader("PLC/HMI alarm log (CSV or JSONL: machine, alarm_id, start, end)",
+                                  type=["csv", "jsonl", "json"], key="event_upload")
+        if upload and st.button("Ingest Events"):
+            try:
+                res = events.ingest(upload.getvalue(), db=db, name=upload.name)
+                if res["skipped"]:
+                    st.info("This log was already ingested.")
+                else:
+                    st.success(f"Ingested {res['events']} events ({res['matched']} matched to the catalogue) "
+                               f"over {len(res['days'])} day(s).")
+            except Exception as e:
+                st.error(f"Event ingestion failed: {e}")
+
+        stats = events.stats()
+        if stats["events"]:
+            import datetime as dt
+            grain = st.radio("Downtime per", ["day", "hour", "minute"], horizontal=True, key="event_grain")
+            # Window ending at the latest ingested day: 90 days of days, a week of hours, a day of minutes
+            end = dt.datetime.strptime(events.days()[-1], "%Y-%m-%d") + dt.timedelta(days=1)
+            start = end - dt.timedelta(days={"day": 90, "hour": 7, "minute": 1}[grain])
+            downtime = events.downtime(grain, start, end, by=("machine",))
+            st.bar_chart(downtime, x="bucket", y="downtime_s", color="machine")
+            st.write("Top Alarms by Downtime (last 7 days)")
+            st.dataframe(events.top_alarms(end - dt.timedelta(days=7), end, top_n=10))
+            st.caption(f"{stats['events']} events from {stats['batches']} log(s) over {stats['days']} day(s).")
+        else:
+            st.info("No alarm events ingested yet.")
+
+    with st.expander("Machine Anomalies"):
+        # Cached scores over a sliding window; the model is refitted on schedule or drift, not per view
+        from analytics.anomaly_engine import load_anomaly_engine
+        engine = load_anomaly_engine(db)
+        scores = engine.machine_scores()
+        if scores:
+            import pandas as pd
+            st.write("Anomalous machines:", engine.anomalous_machines() or "none")
+            st.dataframe(pd.DataFrame(scores), use_container_width=True)
+            st.caption(f"{engine.stats()}")
+        else:
+            st.info("Not enough alarm history to score machines yet.")
+
+    with st.expander("Query Cache Stats"):
+        st.json(db.cache_stats())
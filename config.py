@@ -6,11 +6,25 @@ load_dotenv()
 # APP
 DEFAULT_MACHINE = os.getenv("DEFAULT_MACHINE", "KHS_Filler")
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "./output")
+SPREADSHEET_STREAMING = os.getenv("SPREADSHEET_STREAMING", "true").lower() == "true" # write-only workbooks: rows go straight to disk
+PARAMETER_SAMPLING_INTERVAL_MINS = int(os.getenv("PARAMETER_SAMPLING_INTERVAL_MINS", "5")) # Machine Parameters tab default
 EXTRACTION_VERSION = os.getenv("EXTRACTION_VERSION", "v4-parameter-noise-filter")
+TEMPLATE_VERSION = os.getenv("TEMPLATE_VERSION", "v1-13-tab") # bump when tab builders change, to retire cached exports
+EXPORT_CACHE_MAX_MB = float(os.getenv("EXPORT_CACHE_MAX_MB", "500"))   # OUTPUT_DIR size kept by evicting least recently used exports
+EXPORT_CACHE_MAX_AGE_DAYS = float(os.getenv("EXPORT_CACHE_MAX_AGE_DAYS", "30"))
+
+# STORAGE
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongodb") # mongodb | sqlite
+SQLITE_PATH = os.getenv("SQLITE_PATH", "./o3sigma.db")
 
 # MONGODB
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "o3sigma_demo")
+MONGODB_WRITE_BATCH_SIZE = int(os.getenv("MONGODB_WRITE_BATCH_SIZE", "1000"))
+READ_BATCH_SIZE = int(os.getenv("READ_BATCH_SIZE", "1000")) # documents per cursor batch / SQLite page when streaming exports
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))   # entries; 0 disables the read cache
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))   # seconds
+ALARM_DOC_CACHE_SIZE = int(os.getenv("ALARM_DOC_CACHE_SIZE", "4096"))   # search-hit documents by (machine, alarm_id)
 
 # PDF PARSING
 PDF_PARSER = os.getenv("PDF_PARSER", "pdfplumber")
@@ -33,20 +47,56 @@ FILE_STORAGE_DIR = os.getenv("FILE_STORAGE_DIR", "./pdf_store")
 
 # SEARCH LAYER
 SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory")
+BM25_INDEX_DIR = os.getenv("BM25_INDEX_DIR", "./bm25_index")
+BM25_MAX_DELTAS = int(os.getenv("BM25_MAX_DELTAS", "8")) # delta segments before a background merge
 
 # VECTOR SEARCH
-VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chromadb")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chromadb") # chromadb | numpy (memory-mapped exact search)
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "./vector_store")
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float16") # float16 | int8
+VECTOR_STORE_MAX_DEAD = float(os.getenv("VECTOR_STORE_MAX_DEAD", "0.3")) # share of replaced/deleted rows before compaction
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "512"))
+EMBEDDING_WARM_UP = os.getenv("EMBEDDING_WARM_UP", "true").lower() == "true"
+EMBEDDING_RUNTIME = os.getenv("EMBEDDING_RUNTIME", "torch") # torch | onnx (int8-quantised, CPU)
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_models")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0")) # 0 = one per physical core
+ONNX_MIN_COSINE = float(os.getenv("ONNX_MIN_COSINE", "0.99"))
+
+# HYBRID SEARCH
+SEARCH_BACKEND_TIMEOUT = float(os.getenv("SEARCH_BACKEND_TIMEOUT", "2.0")) # seconds per query, shared by all backends
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# TAGGING
+TAGGER_VOCABULARY_PATH = os.getenv("TAGGER_VOCABULARY_PATH", "") # optional JSON: group -> tag -> synonym terms
 
 # GRAPH
-GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "neo4j") # neo4j fallback networkx handling will be implemented in graph_index.py
+GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "neo4j") # neo4j | memory (persistent array graph; also the fallback)
+GRAPH_STORE_DIR = os.getenv("GRAPH_STORE_DIR", "./graph_store")
+GRAPH_NEIGHBOURHOOD_CACHE_SIZE = int(os.getenv("GRAPH_NEIGHBOURHOOD_CACHE_SIZE", "1024")) # cached 2-hop rows
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
+NEO4J_BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", "1000")) # rows per UNWIND write transaction
 
 # ANALYTICS
-ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "local")
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "local") # local (pandas over rollups) | mongo (aggregation pipelines) | columnar (Arrow snapshot)
+ANALYTICS_STORE_DIR = os.getenv("ANALYTICS_STORE_DIR", "./analytics_store")
+EVENT_STORE_DIR = os.getenv("EVENT_STORE_DIR", "./event_store") # alarm occurrence events + downtime rollups
+ANOMALY_WINDOW_DAYS = int(os.getenv("ANOMALY_WINDOW_DAYS", "7")) # sliding window per machine feature vector
+ANOMALY_HISTORY_DAYS = int(os.getenv("ANOMALY_HISTORY_DAYS", "90")) # daily window snapshots the model trains on
+ANOMALY_REFIT_HOURS = float(os.getenv("ANOMALY_REFIT_HOURS", "24"))
+ANOMALY_DRIFT_THRESHOLD = float(os.getenv("ANOMALY_DRIFT_THRESHOLD", "1.0")) # mean feature shift (training std devs) forcing a refit
+ANOMALY_STATE_PATH = os.getenv("ANOMALY_STATE_PATH", "./anomaly_state.pkl")
+
+# FAULT RESOLVER (python -m service.fault_resolver)
+RESOLVER_HOST = os.getenv("RESOLVER_HOST", "127.0.0.1")
+RESOLVER_PORT = int(os.getenv("RESOLVER_PORT", "8765"))
+RESOLVER_POLL_SECONDS = float(os.getenv("RESOLVER_POLL_SECONDS", "5")) # when change streams are unavailable
 
 # Constants
 REASON_LEVEL_1_CATEGORIES = [
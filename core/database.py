@@ -1,11 +1,61 @@
 import os
-from pymongo import MongoClient, ASCENDING, DESCENDING
+import json
+import hashlib
+from collections import Counter
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
 from pymongo.errors import ConnectionFailure
-from config import MONGODB_URI, MONGODB_DATABASE
+from config import (MONGODB_URI, MONGODB_DATABASE, MONGODB_WRITE_BATCH_SIZE, STORAGE_BACKEND, SQLITE_PATH,
+                    READ_BATCH_SIZE, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, ALARM_DOC_CACHE_SIZE)
+from core.query_cache import QueryCache, ALL
+
+# Fields that change on every extraction run without the record itself changing
+VOLATILE_FIELDS = ("_id", "extracted_at", "content_hash")
+
+def content_hash(doc: dict) -> str:
+    """Stable SHA-1 of a record's content, ignoring volatile fields."""
+    payload = {k: v for k, v in doc.items() if k not in VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# Dimensions of the alarm_rollups collection (plus the extraction month)
+ROLLUP_FIELDS = ("machine", "reason_level_1", "reason_level_2", "category_type")
+
+def rollup_key(doc: dict) -> tuple:
+    extracted_at = doc.get("extracted_at")
+    month = extracted_at.strftime("%Y-%m") if hasattr(extracted_at, "strftime") else None
+    return tuple(doc.get(f) for f in ROLLUP_FIELDS) + (month,)
+
+def _read_tags(collection: str, filters: dict) -> list:
+    """Cache tags for a read: its source file when filtered by one, else the whole collection."""
+    md5 = (filters or {}).get("source_md5")
+    return [(collection, md5 if isinstance(md5, str) else ALL)]
+
+def _filter_key(filters: dict, projection: dict = None) -> str:
+    key = json.dumps(filters or {}, sort_keys=True, default=str)
+    return key + json.dumps(projection, sort_keys=True) if projection else key
+
+# Fields a search result needs; extracted_at picks the newest record when several manuals share a key
+HIT_FIELDS = ("alarm_id", "machine", "description", "cause", "reason_level_1", "reason_level_2",
+              "category_type", "source_md5", "extracted_at")
 
 class DatabaseManager:
-    """Manages MongoDB connections, schema, and queries."""
+    """
+    Manages MongoDB connections, schema, and queries.
+    With STORAGE_BACKEND=sqlite every call is served by the embedded
+    SQLiteStore instead; an unreachable MongoDB is reported, never replaced.
+    Reads go through a QueryCache that save_*, register_processed_file and
+    delete_processed_file invalidate per collection and source_md5; it
+    hands out deep copies, so callers may modify what they read.
+    Alarm documents fetched by (machine, alarm_id) for search results are
+    kept in a second, per-document cache invalidated the same way.
+    """
     def __init__(self):
+        self.client = None
+        self.sqlite = None
+        self.cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        self.doc_cache = QueryCache(ALARM_DOC_CACHE_SIZE, QUERY_CACHE_TTL)
+        if STORAGE_BACKEND == "sqlite":
+            self._use_sqlite()
+            return
         try:
             self.client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
             self.client.admin.command('ping')
@@ -14,11 +64,20 @@ class DatabaseManager:
             self.parameters = self.db['parameters']
             self.processed_files = self.db['processed_files']
             self.export_history = self.db['export_history']
+            self.alarm_rollups = self.db['alarm_rollups']
             self._setup_indexes()
+            # Backfill rollups for databases populated before they existed
+            if self.alarm_rollups.estimated_document_count() == 0 and self.alarms.estimated_document_count() > 0:
+                self.rebuild_alarm_rollups()
         except ConnectionFailure:
+            # Never switch stores silently: data written to SQLite here would be invisible once MongoDB is back
             self.client = None
             print(f"Warning: Could not connect to MongoDB at {MONGODB_URI}")
 
+    def _use_sqlite(self):
+        from core.sqlite_store import SQLiteStore
+        self.sqlite = SQLiteStore(SQLITE_PATH)
+
     def _setup_indexes(self):
         if not self.client: return
         self.processed_files.create_index("md5", unique=True)
@@ -33,19 +92,52 @@ class DatabaseManager:
         self.parameters.create_index([("machine", 1), ("description", 1)])
         self.parameters.create_index([("source_md5", 1), ("description", 1)], unique=True)
 
-    def get_processed_file(self, md5: str) -> dict:
-        if not self.client: return None
-        return self.processed_files.find_one({"md5": md5})
+        self.export_history.create_index([("cache_key", 1), ("exported_at", -1)])
 
-    def get_all_processed_files(self) -> list:
-        if not self.client: return []
-        return list(self.processed_files.find({}, {"file_content": 0}).sort("processed_at", DESCENDING))
+        self.alarm_rollups.create_index([(f, 1) for f in ROLLUP_FIELDS + ("month",)], unique=True)
+
+    def cache_stats(self) -> dict:
+        stats = self.cache.stats()
+        stats["alarm_docs"] = self.doc_cache.stats()
+        return stats
+
+    def get_processed_file(self, md5: str, include_content: bool = False) -> dict:
+        """The processed-file record; the PDF bytes (file_content) are only read, uncached, on request."""
+        def load():
+            if self.sqlite: return self.sqlite.get_processed_file(md5, include_content)
+            if not self.client: return None
+            return self.processed_files.find_one({"md5": md5}, None if include_content else {"file_content": 0})
+        if include_content:
+            return load()
+        return self.cache.get_or_load(("processed_files", md5), [("processed_files", md5)], load)
+
+    def get_all_processed_files(self, use_cache: bool = True) -> list:
+        """use_cache=False reads the store directly, for readers in another process than the writers."""
+        def load():
+            if self.sqlite: return self.sqlite.get_all_processed_files()
+            if not self.client: return []
+            return list(self.processed_files.find({}, {"file_content": 0}).sort("processed_at", DESCENDING))
+        if not use_cache:
+            return load()
+        return self.cache.get_or_load(("processed_files", ALL), [("processed_files", ALL)], load)
 
     def delete_processed_file(self, md5: str) -> bool:
+        deleted = self._delete_processed_file(md5)
+        for collection in ("processed_files", "alarms", "parameters", "alarm_rollups"):
+            self.cache.invalidate(collection, [md5])
+        self.doc_cache.invalidate("alarms", [md5])
+        return deleted
+
+    def _delete_processed_file(self, md5: str) -> bool:
+        if self.sqlite: return self.sqlite.delete_processed_file(md5)
         if not self.client: return False
         try:
+            deltas = Counter()
+            for doc in self.alarms.find({"source_md5": md5}, {f: 1 for f in ROLLUP_FIELDS + ("extracted_at",)}):
+                deltas[rollup_key(doc)] -= 1
             self.processed_files.delete_one({"md5": md5})
             self.alarms.delete_many({"source_md5": md5})
+            self._apply_rollup_deltas(deltas)
             self.parameters.delete_many({"source_md5": md5})
             return True
         except Exception as e:
@@ -55,6 +147,15 @@ class DatabaseManager:
     def register_processed_file(self, md5: str, filename: str, machine: str,
                                 tabs_extracted: list, record_counts: dict,
                                 extraction_version: str, file_bytes: bytes = None):
+        self._register_processed_file(md5, filename, machine, tabs_extracted, record_counts,
+                                      extraction_version, file_bytes)
+        self.cache.invalidate("processed_files", [md5])
+
+    def _register_processed_file(self, md5: str, filename: str, machine: str,
+                                 tabs_extracted: list, record_counts: dict,
+                                 extraction_version: str, file_bytes: bytes = None):
+        if self.sqlite: return self.sqlite.register_processed_file(
+            md5, filename, machine, tabs_extracted, record_counts, extraction_version, file_bytes)
         if not self.client: return
         import datetime
         doc = {
@@ -69,43 +170,195 @@ class DatabaseManager:
         }
         self.processed_files.update_one({"md5": md5}, {"$set": doc}, upsert=True)
 
-    def save_alarms(self, alarms_list: list):
-        if not self.client or not alarms_list: return
-        from pymongo import UpdateOne
-        requests = []
-        for r in alarms_list:
+    def _write_changed(self, collection, records: list, key_fields: tuple, track_fields: tuple = ()) -> tuple:
+        """
+        Upsert only records whose content hash differs from the stored one.
+        Writes go out as unordered bulk_writes in batches of MONGODB_WRITE_BATCH_SIZE.
+        Returns (counts, changes) where changes lists (stored_doc or None, new_doc)
+        for every written record; stored docs only carry key and track_fields.
+        """
+        counts = {"inserted": 0, "modified": 0, "unchanged": 0}
+        docs = {}
+        for r in records:
             doc = r.model_dump()
-            requests.append(UpdateOne(
-                {"source_md5": doc.get("source_md5"), "alarm_id": doc.get("alarm_id")},
-                {"$set": doc},
-                upsert=True
-            ))
-        if requests:
-            self.alarms.bulk_write(requests)
-
-    def save_parameters(self, params_list: list):
-        if not self.client or not params_list: return
-        from pymongo import UpdateOne
+            doc["content_hash"] = content_hash(doc)
+            docs[tuple(doc.get(k) for k in key_fields)] = doc
+
+        # One query for the stored hashes of every source file in this batch
+        projection = {k: 1 for k in key_fields + track_fields}
+        projection.update({"content_hash": 1, "_id": 0})
+        md5s = list({d.get("source_md5") for d in docs.values()})
+        stored = {
+            tuple(s.get(k) for k in key_fields): s
+            for s in collection.find({"source_md5": {"$in": md5s}}, projection)
+        }
+
         requests = []
-        for r in params_list:
-            doc = r.model_dump()
-            requests.append(UpdateOne(
-                {"source_md5": doc.get("source_md5"), "description": doc.get("description")},
-                {"$set": doc},
-                upsert=True
-            ))
-        if requests:
-            self.parameters.bulk_write(requests)
-
-    def get_alarms(self, filters: dict) -> list:
-        if not self.client: return []
-        return list(self.alarms.find(filters))
+        changes = []
+        for key, doc in docs.items():
+            old = stored.get(key)
+            if old and old.get("content_hash") == doc["content_hash"]:
+                counts["unchanged"] += 1
+                continue
+            requests.append(UpdateOne(dict(zip(key_fields, key)), {"$set": doc}, upsert=True))
+            changes.append((old, doc))
+
+        for i in range(0, len(requests), MONGODB_WRITE_BATCH_SIZE):
+            res = collection.bulk_write(requests[i:i + MONGODB_WRITE_BATCH_SIZE], ordered=False)
+            counts["inserted"] += res.upserted_count
+            counts["modified"] += res.modified_count
+            counts["unchanged"] += res.matched_count - res.modified_count
+        return counts, changes
+
+    def _apply_rollup_deltas(self, deltas: Counter):
+        requests = [
+            UpdateOne(dict(zip(ROLLUP_FIELDS + ("month",), key)), {"$inc": {"count": n}}, upsert=True)
+            for key, n in deltas.items() if n
+        ]
+        if not requests: return
+        self.alarm_rollups.bulk_write(requests, ordered=False)
+        self.alarm_rollups.delete_many({"count": {"$lte": 0}})
+
+    def rebuild_alarm_rollups(self):
+        """Recompute alarm_rollups from scratch out of the alarms collection."""
+        if self.sqlite:
+            self.sqlite.rebuild_alarm_rollups()
+        elif self.client:
+            deltas = Counter(
+                rollup_key(doc)
+                for doc in self.alarms.find({}, {f: 1 for f in ROLLUP_FIELDS + ("extracted_at",)})
+            )
+            self.alarm_rollups.delete_many({})
+            self._apply_rollup_deltas(deltas)
+        self.cache.invalidate("alarm_rollups")
+
+    def get_alarm_rollups(self, filters: dict = None) -> list:
+        """Alarm counts per machine x reason_level_1 x reason_level_2 x category_type x month."""
+        def load():
+            if self.sqlite: return self.sqlite.get_alarm_rollups(filters)
+            if not self.client: return []
+            return list(self.alarm_rollups.find(filters or {}, {"_id": 0}))
+        key = ("alarm_rollups", _filter_key(filters))
+        return self.cache.get_or_load(key, [("alarm_rollups", ALL)], load)
+
+    def save_alarms(self, alarms_list: list) -> dict:
+        """Returns counts of inserted, modified and unchanged alarm records."""
+        if not alarms_list or not (self.client or self.sqlite):
+            return {"inserted": 0, "modified": 0, "unchanged": 0}
+        counts = self._save_alarms(alarms_list)
+        if counts["inserted"] or counts["modified"]:
+            self.cache.invalidate("alarms", {r.source_md5 for r in alarms_list})
+            self.doc_cache.invalidate("alarms", {r.source_md5 for r in alarms_list})
+            self.cache.invalidate("alarm_rollups")
+        return counts
+
+    def _save_alarms(self, alarms_list: list) -> dict:
+        if self.sqlite: return self.sqlite.save_alarms(alarms_list)
+        counts, changes = self._write_changed(
+            self.alarms, alarms_list, ("source_md5", "alarm_id"),
+            track_fields=ROLLUP_FIELDS + ("extracted_at",)
+        )
+        deltas = Counter()
+        for old, new in changes:
+            if old:
+                deltas[rollup_key(old)] -= 1
+            deltas[rollup_key(new)] += 1
+        self._apply_rollup_deltas(deltas)
+        return counts
+
+    def save_parameters(self, params_list: list) -> dict:
+        """Returns counts of inserted, modified and unchanged parameter records."""
+        if not params_list or not (self.client or self.sqlite):
+            return {"inserted": 0, "modified": 0, "unchanged": 0}
+        if self.sqlite:
+            counts = self.sqlite.save_parameters(params_list)
+        else:
+            counts, _ = self._write_changed(self.parameters, params_list, ("source_md5", "description"))
+        if counts["inserted"] or counts["modified"]:
+            self.cache.invalidate("parameters", {r.source_md5 for r in params_list})
+        return counts
+
+    def get_alarms(self, filters: dict, projection: dict = None, use_cache: bool = True) -> list:
+        def load():
+            if self.sqlite: return self.sqlite.get_alarms(filters, projection)
+            if not self.client: return []
+            return list(self.alarms.find(filters, projection))
+        if not use_cache:
+            return load()
+        key = ("alarms", _filter_key(filters, projection))
+        return self.cache.get_or_load(key, _read_tags("alarms", filters), load)
+
+    def get_alarms_by_keys(self, keys: list, fields: tuple = HIT_FIELDS) -> dict:
+        """
+        (machine, alarm_id) -> alarm document (only `fields`), for search hits.
+        Cached documents are reused; the rest come from one $in query. When
+        several source files hold the same key, the newest extraction wins.
+        A missing machine is matched by "".
+        """
+        keys = list(dict.fromkeys(keys))
+        found, missing = {}, []
+        for key in keys:
+            doc = self.doc_cache.get(key + (fields,))
+            if doc is None:
+                missing.append(key)
+            else:
+                found[key] = doc
+        if not missing or not (self.client or self.sqlite):
+            return found
+
+        generation = self.doc_cache.generation
+        machines = {m for m, _ in missing}
+        if "" in machines:
+            machines.add(None)
+        filters = {"alarm_id": {"$in": sorted({a for _, a in missing})}, "machine": {"$in": list(machines)}}
+        projection = {f: 1 for f in fields + ("extracted_at", "source_md5")}
+        projection["_id"] = 0
+        if self.sqlite:
+            docs = self.sqlite.get_alarms(filters, projection)
+        else:
+            docs = self.alarms.find(filters, projection)
+        wanted = set(missing)
+        for doc in docs:
+            key = (doc.get("machine") or "", doc.get("alarm_id"))
+            if key not in wanted: continue
+            current = found.get(key)
+            if current is None or str(doc.get("extracted_at") or "") > str(current.get("extracted_at") or ""):
+                found[key] = doc
+        for key in missing:
+            if key in found:
+                self.doc_cache.put(key + (fields,), [("alarms", found[key].get("source_md5"))], found[key], generation)
+        return found
 
     def get_parameters(self, filters: dict) -> list:
+        def load():
+            if self.sqlite: return self.sqlite.get_parameters(filters)
+            if not self.client: return []
+            return list(self.parameters.find(filters))
+        key = ("parameters", _filter_key(filters))
+        return self.cache.get_or_load(key, _read_tags("parameters", filters), load)
+
+    # Streaming reads: a cursor per call and no query cache, so large exports never hold a full result list
+
+    def iter_alarms(self, filters: dict, projection: dict = None):
+        if self.sqlite: return self.sqlite.iter_alarms(filters, projection, READ_BATCH_SIZE)
+        if not self.client: return iter(())
+        return self.alarms.find(filters, projection).batch_size(READ_BATCH_SIZE)
+
+    def iter_parameters(self, filters: dict):
+        if self.sqlite: return self.sqlite.iter_parameters(filters, READ_BATCH_SIZE)
+        if not self.client: return iter(())
+        return self.parameters.find(filters).batch_size(READ_BATCH_SIZE)
+
+    def content_hashes(self, collection: str, source_md5: str):
+        """Content hashes of one source file's alarms or parameters, in stored order (export cache keys)."""
+        if self.sqlite: return self.sqlite.content_hashes(collection, source_md5)
         if not self.client: return []
-        return list(self.parameters.find(filters))
+        cursor = self.db[collection].find({"source_md5": source_md5}, {"content_hash": 1, "_id": 0})
+        return (d.get("content_hash") for d in cursor.batch_size(READ_BATCH_SIZE))
 
-    def log_export(self, machine: str, filename: str, tabs_exported: list, record_counts: dict):
+    def log_export(self, machine: str, filename: str, tabs_exported: list, record_counts: dict,
+                   cache_key: str = None):
+        if self.sqlite: return self.sqlite.log_export(machine, filename, tabs_exported, record_counts, cache_key)
         if not self.client: return
         import datetime
         self.export_history.insert_one({
@@ -113,5 +366,18 @@ class DatabaseManager:
             "filename": filename,
             "tabs_exported": tabs_exported,
             "record_counts": record_counts,
+            "cache_key": cache_key,
             "exported_at": datetime.datetime.now()
         })
+
+    def cached_export_files(self) -> set:
+        """Filenames of the exports logged with a cache key: the only files evict_exports may delete."""
+        if self.sqlite: return self.sqlite.cached_export_files()
+        if not self.client: return set()
+        return set(self.export_history.distinct("filename", {"cache_key": {"$ne": None}}))
+
+    def find_export(self, cache_key: str) -> dict:
+        """The newest export logged with this cache key, or None."""
+        if self.sqlite: return self.sqlite.find_export(cache_key)
+        if not self.client: return None
+        return self.export_history.find_one({"cache_key": cache_key}, sort=[("exported_at", DESCENDING)])
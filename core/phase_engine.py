@@ -1,61 +1,210 @@
 from core.schemas import AlarmRecord, ParameterRecord
-from typing import List, Dict
+from typing import Callable, Dict, Iterator, List, NamedTuple, Tuple
+from config import PARAMETER_SAMPLING_INTERVAL_MINS
+
+class TabSpec(NamedTuple):
+    phase: int
+    columns: List[str]
+    rows: Callable      # (engine) -> iterator of row dicts, or (engine, record) -> rows for a source tab
+    source: str = None  # "alarms" | "parameters": fed one record at a time from the shared pass
+
+# Tab name -> spec
+TABS: Dict[str, TabSpec] = {}
+
+# The platform's 13-tab bulk-upload template; tabs registered elsewhere go last
+WORKBOOK_ORDER = ["Data Types", "Machine Details", "Machine Parameters", "Product Configuration",
+                  "Downtime Configuration", "Waste Configuration", "User Configuration", "Crew Schedule", "OEE",
+                  "Parameter Specifications", "Checklist-type", "Checklist-configuration", "Checklist-Detail"]
+
+def register_tab(name: str, phase: int, columns: List[str], source: str = None):
+    """
+    Register a lazy row generator as the builder of a workbook tab. With a
+    source ("alarms" or "parameters") it is called per record of that
+    collection and yields the record's rows, if any.
+    """
+    def register(fn):
+        TABS[name] = TabSpec(phase, columns, fn, source)
+        return fn
+    return register
+
+DATA_TYPES = ["String", "Int", "Float", "Date", "Bool"]
+CATEGORY_TYPES = ["Planned Downtime", "Unplanned Downtime", "Total Shutdown"]
+WASTE_CATEGORY = "Waste"
+FAULT_COLUMNS = ["Machine *", "Reason 1 *", "Reason 2", "Reason 3", "Reason 4", "Category Type *",
+                 "Fault Code *", "Fault Name *"]
 
 class PhaseEngine:
-    def __init__(self, machine: str, text: str, alarms: List[AlarmRecord], parameters: List[ParameterRecord]):
+    """
+    Maps alarm and parameter records to workbook tabs. rows() streams
+    (tab, row) pairs for every registered tab of the requested phases:
+    the fixed tabs first, then one pass over the alarms and one over the
+    parameters, each record handed to every tab fed by that collection.
+    The SpreadsheetGenerator appends each row to its sheet as it comes.
+
+    With a db the records are read by machine from DatabaseManager cursors,
+    newest processed file first; an alarm ID (or parameter) found in several
+    manuals is exported once, from the newest. Without one, the alarms and
+    parameters passed in are used.
+    """
+    def __init__(self, machine: str, text: str, alarms: List[AlarmRecord] = None,
+                 parameters: List[ParameterRecord] = None, db=None):
         self.machine = machine
         self.text = text
-        self.alarms = alarms
-        self.parameters = parameters
-
-    def build(self, phases: List[int]) -> Dict[str, list]:
-        tabs = {}
-        if 1 in phases:
-            self._build_phase1(tabs)
-        if 2 in phases:
-            self._build_phase2(tabs)
-        if 3 in phases:
-            self._build_phase3(tabs)
-        return tabs
-
-    def _build_phase1(self, tabs: dict) -> None:
-        tabs["Machine Details"] = [{"Machine *": self.machine, "Description": "Main unit"}]
-        tabs["OEE"] = [{"Machine *": self.machine, "Calculation Type": "Standard"}]
-        
-        # Downtime Configuration tab (Alarms)
-        downtime = []
-        for r in self.alarms:
-             downtime.append({
-                 "Machine *": r.machine or self.machine,
-                 "Reason 1 *": r.reason_level_1,
-                 "Reason 2": r.reason_level_2,
-                 "Reason 3": r.reason_level_3 or r.cause or "",
-                 "Reason 4": r.reason_level_4 or r.action or "",
-                 "Category Type *": r.category_type,
-                 "Fault Code *": str(r.alarm_id).zfill(4),
-                 "Fault Name *": r.description
-             })
-        tabs["Downtime Configuration"] = downtime
-        
-        # Parameter Specifications
-        specs = []
-        for p in self.parameters:
-             specs.append({
-                 "Machine *": p.machine or self.machine,
-                 "Parameter Desc *": p.description,
-                 "Product Desc *": p.product_desc or "All",
-                 "LRL": p.lrl,
-                 "LSL": p.lsl,
-                 "LWL": p.lwl,
-                 "Target": p.target,
-                 "UWL": p.uwl,
-                 "USL": p.usl,
-                 "URL": p.url
-             })
-        tabs["Parameter Specifications"] = specs
-
-    def _build_phase2(self, tabs: dict) -> None:
-        pass # To be implemented in Q2 2026
-
-    def _build_phase3(self, tabs: dict) -> None:
-        pass # To be implemented in Q4 2026
+        self.alarms = alarms or []
+        self.parameters = parameters or []
+        self.db = db
+        self.seen = {}
+
+    def tabs(self, phases: List[int]) -> List[str]:
+        """Tabs of these phases, in workbook order."""
+        names = sorted(TABS, key=lambda n: WORKBOOK_ORDER.index(n) if n in WORKBOOK_ORDER else len(WORKBOOK_ORDER))
+        return [name for name in names if TABS[name].phase in phases]
+
+    def rows(self, phases: List[int]) -> Iterator[Tuple[str, dict]]:
+        tabs = self.tabs(phases)
+        self.seen = {}
+        for name in tabs:
+            if TABS[name].source is None:
+                for row in TABS[name].rows(self):
+                    yield name, row
+        for source, records in (("alarms", self.iter_alarms), ("parameters", self.iter_parameters)):
+            fed = [(name, TABS[name].rows) for name in tabs if TABS[name].source == source]
+            if not fed: continue     # no tab needs this collection: it is not read at all
+            for r in records():
+                for name, fn in fed:
+                    for row in fn(self, r):
+                        yield name, row
+
+    def first(self, tab: str, value) -> bool:
+        """True the first time value is seen for tab in this export (per-tab de-duplication)."""
+        seen = self.seen.setdefault(tab, set())
+        if value in seen:
+            return False
+        seen.add(value)
+        return True
+
+    @staticmethod
+    def columns(tab: str) -> List[str]:
+        return TABS[tab].columns
+
+    # ── Record sources ──────────────────────────────────────────────
+
+    def _source_files(self) -> list:
+        return [f["md5"] for f in self.db.get_all_processed_files() if f.get("machine") == self.machine]
+
+    def iter_alarms(self) -> Iterator[dict]:
+        if self.db is None:
+            yield from (r if isinstance(r, dict) else r.model_dump() for r in self.alarms)
+            return
+        seen = set()
+        for md5 in self._source_files():
+            for doc in self.db.iter_alarms({"source_md5": md5}):
+                if doc.get("alarm_id") not in seen:
+                    seen.add(doc.get("alarm_id"))
+                    yield doc
+
+    def iter_parameters(self) -> Iterator[dict]:
+        if self.db is None:
+            yield from (p if isinstance(p, dict) else p.model_dump() for p in self.parameters)
+            return
+        seen = set()
+        for md5 in self._source_files():
+            for doc in self.db.iter_parameters({"source_md5": md5}):
+                if doc.get("description") not in seen:
+                    seen.add(doc.get("description"))
+                    yield doc
+
+    def fault_row(self, r: dict) -> dict:
+        return {
+            "Machine *": r.get("machine") or self.machine,
+            "Reason 1 *": r.get("reason_level_1"),
+            "Reason 2": r.get("reason_level_2"),
+            "Reason 3": r.get("reason_level_3") or r.get("cause") or "",
+            "Reason 4": r.get("reason_level_4") or r.get("action") or "",
+            "Category Type *": r.get("category_type"),
+            "Fault Code *": str(r.get("alarm_id")).zfill(4),
+            "Fault Name *": r.get("description")
+        }
+
+
+# ── Phase 1 ─────────────────────────────────────────────────────────
+
+@register_tab("Machine Details", 1, ["Machine *", "Description"])
+def machine_details(pe: PhaseEngine):
+    yield {"Machine *": pe.machine, "Description": "Main unit"}
+
+@register_tab("OEE", 1, ["Machine *", "Calculation Type"])
+def oee(pe: PhaseEngine):
+    yield {"Machine *": pe.machine, "Calculation Type": "Standard"}
+
+@register_tab("Downtime Configuration", 1, FAULT_COLUMNS, source="alarms")
+def downtime_configuration(pe: PhaseEngine, r: dict):
+    if r.get("category_type") != WASTE_CATEGORY:
+        yield pe.fault_row(r)
+
+@register_tab("Parameter Specifications", 1, ["Machine *", "Parameter Desc *", "Product Desc *", "LRL", "LSL",
+                                              "LWL", "Target", "UWL", "USL", "URL"], source="parameters")
+def parameter_specifications(pe: PhaseEngine, p: dict):
+    yield {
+        "Machine *": p.get("machine") or pe.machine,
+        "Parameter Desc *": p.get("description"),
+        "Product Desc *": p.get("product_desc") or "All",
+        "LRL": p.get("lrl"),
+        "LSL": p.get("lsl"),
+        "LWL": p.get("lwl"),
+        "Target": p.get("target"),
+        "UWL": p.get("uwl"),
+        "USL": p.get("usl"),
+        "URL": p.get("url")
+    }
+
+
+# ── Phase 2: the rest of the template that manuals can fill ─────────
+# Data types, products, machine parameters and waste faults come from
+# the extracted records. OEE stays the phase 1 tab.
+
+@register_tab("Data Types", 2, ["Data Type", "Yes/No", "Category Type", "Waste Type"])
+def data_types(pe: PhaseEngine):
+    lists = [DATA_TYPES, ["Yes", "No"], CATEGORY_TYPES, [WASTE_CATEGORY]]
+    for i in range(max(len(l) for l in lists)):
+        yield dict(zip(TABS["Data Types"].columns, (l[i] if i < len(l) else None for l in lists)))
+
+@register_tab("Machine Parameters", 2, ["Machine *", "Parameter *", "Sampling Interval (mins)*", "Data Type *"],
+              source="parameters")
+def machine_parameters(pe: PhaseEngine, p: dict):
+    limits = [p.get(f) for f in ("target", "lrl", "lsl", "lwl", "uwl", "usl", "url")]
+    yield {
+        "Machine *": p.get("machine") or pe.machine,
+        "Parameter *": p.get("description"),
+        "Sampling Interval (mins)*": PARAMETER_SAMPLING_INTERVAL_MINS,
+        "Data Type *": "Float" if any(v is not None for v in limits) else "String"
+    }
+
+@register_tab("Product Configuration", 2, ["Product Code *", "Product Desc *", "Machine *", "Speed *", "UOM *"],
+              source="parameters")
+def product_configuration(pe: PhaseEngine, p: dict):
+    product = p.get("product_desc")
+    if product and pe.first("Product Configuration", product):
+        yield {"Product Code *": "", "Product Desc *": product, "Machine *": p.get("machine") or pe.machine,
+               "Speed *": "", "UOM *": ""}
+
+@register_tab("Waste Configuration", 2, FAULT_COLUMNS, source="alarms")
+def waste_configuration(pe: PhaseEngine, r: dict):
+    if r.get("category_type") == WASTE_CATEGORY:
+        yield pe.fault_row(r)
+
+
+# ── Phase 3: platform configuration ─────────────────────────────────
+# Users, crews and checklists are not in manuals, so these tabs carry
+# the template headers for the platform team to fill in.
+
+def template_only(pe: PhaseEngine):
+    return iter(())
+
+register_tab("User Configuration", 3, ["First Name *", "Last Name *", "Email", "UserName*", "Password *",
+                                       "Country *", "Phone# *"])(template_only)
+register_tab("Crew Schedule", 3, ["Shift*", "Start Time (HH:MM) *", "End Time (HH:MM) *", "Night Shift"])(template_only)
+register_tab("Checklist-type", 3, ["Checklist Type*"])(template_only)
+register_tab("Checklist-configuration", 3, ["Checklist Type*", "Checklist Name*", "Machine"])(template_only)
+register_tab("Checklist-Detail", 3, ["Checklist Name*", "Checklist Item*", "Checklist Group*", "Item Type*",
+                                     "Standard", "Min", "Max", "DropdownValue(s)"])(template_only)
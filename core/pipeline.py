@@ -4,7 +4,7 @@ from core.pdf_processor import PDFProcessor
 from core.database import DatabaseManager
 from core.schemas import ExtractionResult, AlarmRecord, ParameterRecord
 from core.file_store import FileStore
-from config import EXTRACTION_VERSION
+from config import EXTRACTION_VERSION, ANALYTICS_BACKEND
 from extractors.local_llm_extractor import LocalLLMExtractor
 from extractors.llm_extractor import LLMClassifier
 from extractors.parameter_specs_extractor import ParameterSpecsExtractor
@@ -78,6 +78,7 @@ class BulkUploadPipeline:
                     reason_level_3=item.get("cause"),
                     reason_level_4=item.get("action"),
                     category_type=item.get("category_type", "Unplanned Downtime"),
+                    components=item.get("components", []),
                     machine=machine,
                     source_md5=md5,
                     source_file=filename,
@@ -102,9 +103,11 @@ class BulkUploadPipeline:
 
         # Step 4 — STORE IN MONGODB
         log("Step 4A: Pushing models to internal Database storage...")
-        self.db.save_alarms(alarms_extracted)
-        self.db.save_parameters(params_extracted)
-        log("Step 4A Complete: Database commit successful.")
+        alarm_counts = self.db.save_alarms(alarms_extracted)
+        param_counts = self.db.save_parameters(params_extracted)
+        log(f"Step 4A Complete: Database commit successful. "
+            f"Alarms {alarm_counts['inserted']} inserted / {alarm_counts['modified']} modified / {alarm_counts['unchanged']} unchanged, "
+            f"Parameters {param_counts['inserted']} inserted / {param_counts['modified']} modified / {param_counts['unchanged']} unchanged.")
         
         tabs_extracted = []
         if processor.has_alarms: tabs_extracted.append("alarms")
@@ -124,12 +127,12 @@ class BulkUploadPipeline:
 
         # Step 5 — DOCUMENT INTELLIGENCE BUILD
         if alarms_extracted:
-            log("Step 5A: Building Keyword Search Index (BM25)...")
+            log("Step 5A: Updating persistent Keyword Search Index (BM25)...")
             try:
-                from search.bm25_index import BM25AlarmIndex
-                idx = BM25AlarmIndex()
-                idx.build([a.dict() for a in alarms_extracted])
-                log("BM25 Index compiled successfully.")
+                from search.bm25_index import PersistentBM25Index
+                idx = PersistentBM25Index()
+                idx.add(alarms_extracted)
+                log(f"BM25 Index updated successfully ({idx.doc_count} documents).")
             except Exception as e:
                 log(f"BM25 build failed: {e}")
 
@@ -137,12 +140,12 @@ class BulkUploadPipeline:
             try:
                 from search.vector_index import VectorAlarmIndex
                 idx = VectorAlarmIndex()
-                idx.add_alarms([a.dict() for a in alarms_extracted])
-                log("Semantic Vector Index updated successfully.")
+                counts = idx.add_alarms([a.dict() for a in alarms_extracted])
+                log(f"Semantic Vector Index updated successfully ({counts['indexed']} embedded, {counts['skipped']} unchanged).")
             except Exception as e:
                 log(f"Vector Index build failed: {e}")
 
-            log("Step 5C: Building Graph Database Index (NetworkX)...")
+            log("Step 5C: Updating Graph Index...")
             try:
                 from search.graph_index import AlarmGraph
                 idx = AlarmGraph()
@@ -151,6 +154,15 @@ class BulkUploadPipeline:
             except Exception as e:
                 log(f"Graph Index build failed: {e}")
 
+            if ANALYTICS_BACKEND == "columnar":
+                log("Step 5D: Updating Columnar Analytics Snapshot...")
+                try:
+                    from analytics.columnar_store import ColumnarAlarmStore
+                    ColumnarAlarmStore().write_file(md5, alarms_extracted)
+                    log("Analytics snapshot updated.")
+                except Exception as e:
+                    log(f"Analytics snapshot update failed: {e}")
+
         log("Pipeline Completely Resolved.")
 
         return ExtractionResult(
@@ -159,9 +171,37 @@ class BulkUploadPipeline:
             parameters=params_extracted,
             errors=[],
             warnings=[],
-            debug_steps=["Parsed PDF", f"Found Alarms: {processor.has_alarms}", f"Found Params: {processor.has_parameters}"],
+            debug_steps=["Parsed PDF", f"Found Alarms: {processor.has_alarms}", f"Found Params: {processor.has_parameters}",
+                         f"Alarm writes: {alarm_counts}", f"Parameter writes: {param_counts}"],
             timings={"total": time.time() - start_time},
             source_filename=filename,
             source_md5=md5,
             source_text=text
         )
+
+    def delete_file(self, md5: str) -> bool:
+        """Remove a processed file from the database and the persistent search indices."""
+        if not self.db.delete_processed_file(md5):
+            return False
+        try:
+            from search.bm25_index import PersistentBM25Index
+            PersistentBM25Index().delete(md5)
+        except Exception as e:
+            print(f"BM25 delete failed: {e}")
+        try:
+            from search.vector_index import VectorAlarmIndex
+            VectorAlarmIndex().delete(md5)
+        except Exception as e:
+            print(f"Vector delete failed: {e}")
+        try:
+            from search.graph_index import AlarmGraph
+            AlarmGraph().delete(md5)
+        except Exception as e:
+            print(f"Graph delete failed: {e}")
+        if ANALYTICS_BACKEND == "columnar":
+            try:
+                from analytics.columnar_store import ColumnarAlarmStore
+                ColumnarAlarmStore().remove(md5)
+            except Exception as e:
+                print(f"Analytics snapshot delete failed: {e}")
+        return True
@@ -0,0 +1,110 @@
+import copy
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+# Tag for entries that depend on a whole collection rather than one source file
+ALL = "*"
+
+_MISSING = object()
+
+class QueryCache:
+    """
+    Bounded in-process read-through cache with TTL and LRU eviction.
+    Every entry is tagged with (collection, source_md5) pairs — or
+    (collection, ALL) when it spans the collection — so writes invalidate
+    exactly the entries they can affect. Values are deep-copied on the way
+    in and out, so callers may modify what they get back.
+    """
+    def __init__(self, max_entries: int = 256, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()     # key -> (expires_at, value, tags)
+        self.tagged = defaultdict(set)   # tag -> keys
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0              # bumped on invalidation so in-flight loads are not stored stale
+
+    def get_or_load(self, key, tags: list, loader):
+        if self.max_entries <= 0:
+            return loader()
+        generation = self.generation
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        self.put(key, tags, value, generation)
+        return value
+
+    def get(self, key, default=None):
+        """Cached value for key, or default; counts a hit or a miss."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                value = entry[1]
+            else:
+                if entry:
+                    self._drop(key)
+                self.misses += 1
+                return default
+        return copy.deepcopy(value)
+
+    def put(self, key, tags: list, value, generation: int = None):
+        """Store value, unless an invalidation happened since `generation` was read before loading it."""
+        if self.max_entries <= 0:
+            return
+        value = copy.deepcopy(value)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self.tagged[tag].add(key)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, collection: str, md5s=()):
+        """Drop entries for these source files plus collection-wide entries."""
+        tags = [(collection, ALL)] + [(collection, m) for m in md5s]
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self.tagged.get(tag, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.tagged.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _drop(self, key):
+        _, _, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
@@ -15,6 +15,7 @@ class AlarmRecord(BaseModel):
     reason_level_3:  Optional[str] = None
     reason_level_4:  Optional[str] = None
     category_type:   str = "Unplanned Downtime"
+    components:      List[str] = [] # ["inverter", "motor"] — core.tagger tags of the cause
 
     # Added by pipeline
     machine:         Optional[str] = None
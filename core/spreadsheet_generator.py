@@ -1,37 +1,68 @@
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 import os
 import datetime
-from config import OUTPUT_DIR
+from itertools import chain
+from config import OUTPUT_DIR, SPREADSHEET_STREAMING
+
+# Rule 1 from CLAUDE: Format Fault Code as text format "@"
+TEXT_COLUMNS = {"Fault Code *"}
 
 class SpreadsheetGenerator:
-    def __init__(self):
-        self.wb = Workbook()
-        self.wb.remove(self.wb.active) # Remove default sheet
+    """
+    Writes tabs of row dicts to an .xlsx file. In streaming mode (the
+    default) the workbook is write-only: each row is serialised as it is
+    appended, so rows can come from any iterator and memory stays flat
+    however many there are. Column formats are applied as cells are written.
+    Sheets opened with add_sheet() take rows in any order, so one pass over
+    the records can feed several tabs.
+    """
+    def __init__(self, streaming: bool = SPREADSHEET_STREAMING):
+        self.streaming = streaming
+        self.wb = Workbook(write_only=streaming)
+        self.sheets = {}     # name -> (worksheet, columns, indexes of text-format columns)
+        if not streaming:
+            self.wb.remove(self.wb.active) # Remove default sheet
         os.makedirs(OUTPUT_DIR, exist_ok=True)
 
     def create_workbook(self):
         pass
 
-    def populate_rows(self, sheet_name: str, rows: list):
+    def populate_rows(self, sheet_name: str, rows, columns: list = None) -> int:
+        """Write rows (a list or any iterable of dicts) to a new sheet; columns default to the first row's keys."""
+        rows = iter(rows)
+        if columns is None:
+            first = next(rows, None)
+            if first is None:
+                self.wb.create_sheet(title=sheet_name)
+                return 0
+            columns = list(first.keys())
+            rows = chain([first], rows)
+        self.add_sheet(sheet_name, columns)
+        count = 0
+        for row_dict in rows:
+            self.append(sheet_name, row_dict)
+            count += 1
+        return count
+
+    def add_sheet(self, sheet_name: str, columns: list):
+        """Create a sheet with its header row; rows are added with append(), in any order across sheets."""
         ws = self.wb.create_sheet(title=sheet_name)
-        if not rows:
-            return
-            
-        columns = list(rows[0].keys())
         ws.append(columns)
-        
-        for row_dict in rows:
-            row_data = []
-            for col in columns:
-                val = row_dict.get(col, "")
-                row_data.append(val)
-            ws.append(row_data)
-
-        # Rule 1 from CLAUDE: Format Fault Code as text format "@"
-        if "Fault Code *" in columns:
-            col_idx = columns.index("Fault Code *") + 1
-            for row in range(2, ws.max_row + 1):
-                ws.cell(row=row, column=col_idx).number_format = "@"
+        self.sheets[sheet_name] = (ws, columns, [i for i, col in enumerate(columns) if col in TEXT_COLUMNS])
+
+    def append(self, sheet_name: str, row_dict: dict):
+        ws, columns, text_idx = self.sheets[sheet_name]
+        row_data = [row_dict.get(col, "") for col in columns]
+        for i in text_idx:
+            row_data[i] = self._text_cell(ws, row_data[i])
+        ws.append(row_data)
+
+    def _text_cell(self, ws, value):
+        # A pre-styled cell works for both workbook modes and saves a second pass over the column
+        cell = WriteOnlyCell(ws, value=value)
+        cell.number_format = "@"
+        return cell
 
     def save(self, prefix: str) -> str:
         date_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
@@ -0,0 +1,354 @@
+import os
+import json
+import sqlite3
+import datetime
+import threading
+from collections import Counter
+from core.database import content_hash, rollup_key, ROLLUP_FIELDS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_files (
+    md5          TEXT PRIMARY KEY,
+    machine      TEXT,
+    processed_at TEXT,
+    doc          TEXT NOT NULL,
+    file_content BLOB
+);
+CREATE INDEX IF NOT EXISTS processed_files_machine ON processed_files (machine);
+CREATE INDEX IF NOT EXISTS processed_files_machine_processed_at ON processed_files (machine, processed_at DESC);
+
+CREATE TABLE IF NOT EXISTS alarms (
+    source_md5   TEXT,
+    alarm_id     TEXT,
+    machine      TEXT,
+    content_hash TEXT,
+    doc          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alarms_source_md5 ON alarms (source_md5);
+CREATE INDEX IF NOT EXISTS alarms_machine_alarm_id ON alarms (machine, alarm_id);
+CREATE UNIQUE INDEX IF NOT EXISTS alarms_source_md5_alarm_id ON alarms (source_md5, alarm_id);
+
+CREATE TABLE IF NOT EXISTS parameters (
+    source_md5   TEXT,
+    description  TEXT,
+    machine      TEXT,
+    content_hash TEXT,
+    doc          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parameters_source_md5 ON parameters (source_md5);
+CREATE INDEX IF NOT EXISTS parameters_machine_description ON parameters (machine, description);
+CREATE UNIQUE INDEX IF NOT EXISTS parameters_source_md5_description ON parameters (source_md5, description);
+
+CREATE TABLE IF NOT EXISTS export_history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    machine     TEXT,
+    exported_at TEXT,
+    doc         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS export_history_cache_key ON export_history (json_extract(doc, '$.cache_key'));
+
+-- rollup_key is the JSON-encoded dimension tuple: SQLite treats NULLs as
+-- distinct in UNIQUE indexes, so the dimensions cannot be the key themselves
+CREATE TABLE IF NOT EXISTS alarm_rollups (
+    rollup_key     TEXT PRIMARY KEY,
+    machine        TEXT,
+    reason_level_1 TEXT,
+    reason_level_2 TEXT,
+    category_type  TEXT,
+    month          TEXT,
+    count          INTEGER NOT NULL
+);
+"""
+
+# Real columns per table; any other filter field goes through json_extract(doc, ...)
+_COLUMNS = {
+    "processed_files": ("md5", "machine"),
+    "alarms": ("source_md5", "alarm_id", "machine"),
+    "parameters": ("source_md5", "description", "machine"),
+}
+
+def _project(doc: dict, projection: dict) -> dict:
+    """Mongo-style projection: either fields to keep or fields to drop."""
+    keep = {f for f, v in projection.items() if v and f != "_id"}
+    if keep:
+        return {f: v for f, v in doc.items() if f in keep or (f == "_id" and projection.get("_id", 1))}
+    return {f: v for f, v in doc.items() if projection.get(f, 1)}
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__} in SQLite document")
+
+def _decode(obj: dict):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.datetime.fromisoformat(obj["$date"])
+    return obj
+
+def _dumps(doc: dict) -> str:
+    return json.dumps({k: v for k, v in doc.items() if k != "_id"}, default=_encode)
+
+def _loads(text: str) -> dict:
+    return json.loads(text, object_hook=_decode)
+
+
+class SQLiteStore:
+    """
+    Embedded single-file storage with the DatabaseManager API.
+    Used on single-node plant PCs (STORAGE_BACKEND=sqlite). Records live
+    in JSON columns; the key fields are real columns carrying the same
+    unique indexes as DatabaseManager._setup_indexes.
+    """
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        # Streamlit reruns scripts on worker threads; serialise access to the connection
+        self.lock = threading.RLock()
+
+    # ── Filters ─────────────────────────────────────────────────────
+
+    def _where(self, table: str, filters: dict) -> tuple:
+        """Translate a Mongo-style filter (equality, None, $in, $ne) into SQL."""
+        clauses, args = [], []
+        for field, cond in (filters or {}).items():
+            col = field if field in _COLUMNS[table] else f"json_extract(doc, '$.{field}')"
+            if isinstance(cond, dict):
+                for op, value in cond.items():
+                    if op == "$in":
+                        values = [v for v in value if v is not None]
+                        parts = []
+                        if values:
+                            parts.append(f"{col} IN ({', '.join('?' * len(values))})")
+                            args.extend(values)
+                        if len(values) != len(value):
+                            parts.append(f"{col} IS NULL")
+                        clauses.append(f"({' OR '.join(parts) or '0'})")
+                    elif op == "$ne":
+                        if value is None:
+                            clauses.append(f"{col} IS NOT NULL")
+                        else:
+                            clauses.append(f"({col} IS NULL OR {col} != ?)")
+                            args.append(value)
+                    else:
+                        raise ValueError(f"Unsupported filter operator for SQLite backend: {op}")
+            elif cond is None:
+                clauses.append(f"{col} IS NULL")
+            else:
+                clauses.append(f"{col} = ?")
+                args.append(cond)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def _find(self, table: str, filters: dict, projection: dict = None) -> list:
+        where, args = self._where(table, filters)
+        with self.lock:
+            rows = self.conn.execute(f"SELECT doc FROM {table}{where}", args).fetchall()
+        docs = [_loads(r[0]) for r in rows]
+        return [_project(d, projection) for d in docs] if projection else docs
+
+    def _iter(self, table: str, filters: dict, projection: dict = None, page_size: int = 1000):
+        """_find as a generator: pages by rowid, holding the lock per page rather than per scan."""
+        where, args = self._where(table, filters)
+        where = (where + " AND" if where else " WHERE") + " rowid > ?"
+        last = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(f"SELECT rowid, doc FROM {table}{where} ORDER BY rowid LIMIT ?",
+                                         args + [last, page_size]).fetchall()
+            for _, text in rows:
+                doc = _loads(text)
+                yield _project(doc, projection) if projection else doc
+            if len(rows) < page_size:
+                return
+            last = rows[-1][0]
+
+    # ── processed_files ─────────────────────────────────────────────
+
+    def get_processed_file(self, md5: str, include_content: bool = True) -> dict:
+        columns = "doc, file_content" if include_content else "doc"
+        with self.lock:
+            row = self.conn.execute(f"SELECT {columns} FROM processed_files WHERE md5 = ?", (md5,)).fetchone()
+        if not row: return None
+        doc = _loads(row[0])
+        if include_content:
+            doc["file_content"] = row[1]
+        return doc
+
+    def get_all_processed_files(self) -> list:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT doc FROM processed_files ORDER BY processed_at DESC"
+            ).fetchall()
+        return [_loads(r[0]) for r in rows]
+
+    def delete_processed_file(self, md5: str) -> bool:
+        try:
+            with self.lock, self.conn:
+                deltas = Counter()
+                for (text,) in self.conn.execute("SELECT doc FROM alarms WHERE source_md5 = ?", (md5,)):
+                    deltas[rollup_key(_loads(text))] -= 1
+                self.conn.execute("DELETE FROM processed_files WHERE md5 = ?", (md5,))
+                self.conn.execute("DELETE FROM alarms WHERE source_md5 = ?", (md5,))
+                self.conn.execute("DELETE FROM parameters WHERE source_md5 = ?", (md5,))
+                self._apply_rollup_deltas(deltas)
+            return True
+        except Exception as e:
+            print(f"Error deleting file record: {e}")
+            return False
+
+    def register_processed_file(self, md5: str, filename: str, machine: str,
+                                tabs_extracted: list, record_counts: dict,
+                                extraction_version: str, file_bytes: bytes = None):
+        doc = {
+            "md5": md5,
+            "filename": filename,
+            "machine": machine,
+            "processed_at": datetime.datetime.now(),
+            "tabs_extracted": tabs_extracted,
+            "record_counts": record_counts,
+            "extraction_version": extraction_version,
+        }
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO processed_files (md5, machine, processed_at, doc, file_content) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(md5) DO UPDATE SET machine = excluded.machine, processed_at = excluded.processed_at, "
+                "doc = excluded.doc, file_content = excluded.file_content",
+                (md5, machine, doc["processed_at"].isoformat(), _dumps(doc), file_bytes)
+            )
+
+    # ── alarms / parameters ─────────────────────────────────────────
+
+    def _write_changed(self, table: str, records: list, key_fields: tuple) -> tuple:
+        """Same contract as DatabaseManager._write_changed."""
+        counts = {"inserted": 0, "modified": 0, "unchanged": 0}
+        docs = {}
+        for r in records:
+            doc = r.model_dump()
+            doc["content_hash"] = content_hash(doc)
+            docs[tuple(doc.get(k) for k in key_fields)] = doc
+
+        md5s = list({d.get("source_md5") for d in docs.values()})
+        stored = {
+            tuple(s.get(k) for k in key_fields): s
+            for s in self._find(table, {"source_md5": {"$in": md5s}})
+        }
+
+        rows, changes = [], []
+        for key, doc in docs.items():
+            old = stored.get(key)
+            if old and old.get("content_hash") == doc["content_hash"]:
+                counts["unchanged"] += 1
+                continue
+            counts["modified" if old else "inserted"] += 1
+            rows.append(key + (doc.get("machine"), doc["content_hash"], _dumps(doc)))
+            changes.append((old, doc))
+
+        k1, k2 = key_fields
+        self.conn.executemany(
+            f"INSERT INTO {table} ({k1}, {k2}, machine, content_hash, doc) VALUES (?, ?, ?, ?, ?) "
+            f"ON CONFLICT({k1}, {k2}) DO UPDATE SET machine = excluded.machine, "
+            f"content_hash = excluded.content_hash, doc = excluded.doc",
+            rows
+        )
+        return counts, changes
+
+    def _apply_rollup_deltas(self, deltas: Counter):
+        rows = [
+            (json.dumps(key),) + key + (n,)
+            for key, n in deltas.items() if n
+        ]
+        if not rows: return
+        self.conn.executemany(
+            f"INSERT INTO alarm_rollups (rollup_key, {', '.join(ROLLUP_FIELDS)}, month, count) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT(rollup_key) DO UPDATE SET count = count + excluded.count",
+            rows
+        )
+        self.conn.execute("DELETE FROM alarm_rollups WHERE count <= 0")
+
+    def rebuild_alarm_rollups(self):
+        with self.lock, self.conn:
+            deltas = Counter(rollup_key(_loads(text)) for (text,) in self.conn.execute("SELECT doc FROM alarms"))
+            self.conn.execute("DELETE FROM alarm_rollups")
+            self._apply_rollup_deltas(deltas)
+
+    def get_alarm_rollups(self, filters: dict = None) -> list:
+        fields = ROLLUP_FIELDS + ("month", "count")
+        clauses, args = [], []
+        for field, value in (filters or {}).items():
+            if field not in fields:
+                raise ValueError(f"Unknown rollup field: {field}")
+            clauses.append(f"{field} IS NULL" if value is None else f"{field} = ?")
+            if value is not None: args.append(value)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {', '.join(fields)} FROM alarm_rollups{where}", args).fetchall()
+        return [dict(zip(fields, r)) for r in rows]
+
+    def save_alarms(self, alarms_list: list) -> dict:
+        with self.lock, self.conn:
+            counts, changes = self._write_changed("alarms", alarms_list, ("source_md5", "alarm_id"))
+            deltas = Counter()
+            for old, new in changes:
+                if old:
+                    deltas[rollup_key(old)] -= 1
+                deltas[rollup_key(new)] += 1
+            self._apply_rollup_deltas(deltas)
+        return counts
+
+    def save_parameters(self, params_list: list) -> dict:
+        with self.lock, self.conn:
+            counts, _ = self._write_changed("parameters", params_list, ("source_md5", "description"))
+        return counts
+
+    def get_alarms(self, filters: dict, projection: dict = None) -> list:
+        return self._find("alarms", filters, projection)
+
+    def get_parameters(self, filters: dict) -> list:
+        return self._find("parameters", filters)
+
+    def iter_alarms(self, filters: dict, projection: dict = None, page_size: int = 1000):
+        return self._iter("alarms", filters, projection, page_size)
+
+    def iter_parameters(self, filters: dict, page_size: int = 1000):
+        return self._iter("parameters", filters, None, page_size)
+
+    def content_hashes(self, table: str, source_md5: str) -> list:
+        with self.lock:
+            rows = self.conn.execute(f"SELECT content_hash FROM {table} WHERE source_md5 = ? ORDER BY rowid",
+                                     (source_md5,)).fetchall()
+        return [r[0] for r in rows]
+
+    def log_export(self, machine: str, filename: str, tabs_exported: list, record_counts: dict,
+                   cache_key: str = None):
+        doc = {
+            "machine": machine,
+            "filename": filename,
+            "tabs_exported": tabs_exported,
+            "record_counts": record_counts,
+            "cache_key": cache_key,
+            "exported_at": datetime.datetime.now()
+        }
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO export_history (machine, exported_at, doc) VALUES (?, ?, ?)",
+                (machine, doc["exported_at"].isoformat(), _dumps(doc))
+            )
+
+    def cached_export_files(self) -> set:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT json_extract(doc, '$.filename') FROM export_history "
+                "WHERE json_extract(doc, '$.cache_key') IS NOT NULL"
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def find_export(self, cache_key: str) -> dict:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT doc FROM export_history WHERE json_extract(doc, '$.cache_key') = ? ORDER BY id DESC LIMIT 1",
+                (cache_key,)
+            ).fetchone()
+        return _loads(row[0]) if row else None
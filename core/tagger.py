@@ -0,0 +1,177 @@
+"""
+Compiled multi-pattern tagger shared by the graph builder, the heuristic
+reason classifiers and the analytics.
+
+The vocabulary maps group -> tag -> terms (the tag's synonyms). All terms
+of all groups are compiled into one trie-shaped regular expression, so a
+text is scanned once whatever the vocabulary size, and a batch of texts is
+scanned in a single pass over their concatenation.
+
+Groups: "component" holds the components the alarm graph links (tagged
+from an alarm's cause); "reason_classifier" and "llm_classifier" hold the
+keyword lists of ReasonClassifier and LLMClassifier's heuristic, one tag
+per category, so each classifier still decides as it did on its own list.
+
+Matching is case-insensitive and anchored at word starts: a plain term
+matches the whole word or its plural ("sensor", "sensors"); a term ending
+in "*" matches as a prefix ("electric*" -> "electrical"). So "planned" no
+longer matches inside "unplanned" and "amp" no longer matches "clamp", as
+the old substring checks did; compounds the substring checks did catch
+("overvoltage", "ampere") are listed as terms of their own.
+
+TAGGER_VOCABULARY_PATH may point to a JSON file of the same shape; its
+groups replace or extend the defaults.
+"""
+import re
+import json
+import bisect
+from config import TAGGER_VOCABULARY_PATH
+
+DEFAULT_VOCABULARY = {
+    "component": {
+        c: [c] for c in ("inverter", "motor", "servo", "sensor", "encoder", "valve", "pump", "bearing", "seal",
+                         "gear", "belt", "conveyor", "drive", "plc", "hmi", "camera")
+    },
+    # extractors/local_llm_extractor.py ReasonClassifier; checked in this order
+    "reason_classifier": {
+        "electrical": ["electric*", "voltage", "overvoltage", "undervoltage", "current", "overcurrent", "drive",
+                       "inverter", "short circuit", "wire", "contactor", "spark", "arc", "encoder", "fuse", "relay",
+                       "power supply", "amp", "ampere*"],
+        "instrumentation": ["sensor", "encoder", "limit switch", "photocell", "vision", "camera", "probe", "detector"],
+        "software": ["program", "software", "plc", "timeout", "hmi", "network", "communication loss", "watchdog"],
+        "mechanical": ["jam*", "wear", "broken", "loose", "fracture", "belt", "bearing", "pneumatic", "hydraulic",
+                       "valve", "pump", "gear", "seal", "lubrication", "friction"],
+    },
+    # extractors/llm_extractor.py LLMClassifier._heuristic; checked in this order, "planned" on its own
+    "llm_classifier": {
+        "electrical": ["electric*", "voltage", "overvoltage", "undervoltage", "inverter", "drive", "contactor",
+                       "fuse", "relay", "arc", "wiring", "short circuit", "power supply", "amp", "ampere*"],
+        "instrumentation": ["sensor", "encoder", "limit switch", "photocell", "camera", "probe", "detector", "vision"],
+        "software": ["plc", "software", "program", "hmi", "timeout", "communication", "watchdog", "network", "bus",
+                     "fieldbus"],
+        "mechanical": ["jam*", "belt", "bearing", "hydraulic", "valve", "pump", "gear", "seal", "lubrication",
+                       "broken", "wear", "fracture", "pneumatic"],
+        "planned": ["maintenance", "cleaning", "changeover", "scheduled", "cip", "lubrication round", "planned",
+                    "preventive"],
+    },
+}
+
+_WORD = r"[^\W_]"
+
+def _trie_regex(terms: list) -> str:
+    """Alternation of terms compiled as a character trie, e.g. pump|pumps|push -> pu(?:mps?|sh)."""
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node) -> str:
+        end = node.get("") is True
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            return "(?:" + body + ")?"
+        return body
+    return emit(trie)
+
+class Tagger:
+    def __init__(self, vocabulary: dict):
+        self.groups = list(vocabulary)
+        self.term_tags = {}      # term -> [(group, tag)]
+        words, prefixes = set(), set()
+        for group, tags in vocabulary.items():
+            for tag, terms in tags.items():
+                for term in terms:
+                    term = term.lower().strip()
+                    is_prefix = term.endswith("*")
+                    term = term.rstrip("*")
+                    (prefixes if is_prefix else words).add(term)
+                    self.term_tags.setdefault(term, []).append((group, tag))
+        # A phrase also carries the tags of vocabulary terms it starts with ("lubrication round" -> "lubrication")
+        self.expansions = {
+            t: [gt for p in self.term_tags if p == t or t.startswith(p + " ") for gt in self.term_tags[p]]
+            for t in self.term_tags
+        }
+        alternatives = []
+        if words:
+            alternatives.append(f"({_trie_regex(sorted(words))})(?:e?s)?(?!{_WORD})")
+        if prefixes:
+            alternatives.append(f"({_trie_regex(sorted(prefixes))})")
+        self.pattern = re.compile(f"(?<!{_WORD})(?:" + "|".join(alternatives or ["(?!)"]) + ")")
+
+    def _empty(self) -> dict:
+        return {g: [] for g in self.groups}
+
+    def tag(self, text: str) -> dict:
+        """group -> tags found in text, in order of first occurrence."""
+        return self.tag_many([text])[0]
+
+    def tag_many(self, texts: list) -> list:
+        """tag() for every text, scanning the whole batch in one regex pass."""
+        out = [self._empty() for _ in texts]
+        if not texts:
+            return out
+        parts = [(t or "").lower() for t in texts]
+        ends, pos = [], 0
+        for p in parts:
+            pos += len(p) + 1
+            ends.append(pos)
+        # A newline between texts keeps matches from spanning two of them; matches arrive in text order
+        i, tags = 0, out[0]
+        for m in self.pattern.finditer("\n".join(parts)):
+            if m.start() >= ends[i]:
+                i = bisect.bisect_right(ends, m.start(), i)
+                tags = out[i]
+            for group, tag in self.expansions[m.group(1) or m.group(2)]:
+                found = tags[group]
+                if tag not in found:
+                    found.append(tag)
+        return out
+
+
+def load_vocabulary(path: str = TAGGER_VOCABULARY_PATH) -> dict:
+    vocabulary = {g: dict(tags) for g, tags in DEFAULT_VOCABULARY.items()}
+    if path:
+        try:
+            with open(path) as f:
+                vocabulary.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Could not load tagger vocabulary from {path}: {e}. Using the defaults.")
+    return vocabulary
+
+_default = None
+
+def get_tagger() -> Tagger:
+    """The process-wide tagger for the configured vocabulary."""
+    global _default
+    if _default is None:
+        _default = Tagger(load_vocabulary())
+    return _default
+
+def alarm_text(r) -> str:
+    if isinstance(r, dict):
+        return f"{r.get('description') or ''} {r.get('cause') or ''}"
+    return f"{r.description or ''} {r.cause or ''}"
+
+def alarm_cause(r) -> str:
+    return (r.get("cause") if isinstance(r, dict) else r.cause) or ""
+
+def alarm_components(records: list) -> list:
+    """Component tags per alarm: the stored `components` field when present, else its cause tagged now (in one batch)."""
+    out = [None] * len(records)
+    pending = []
+    for i, r in enumerate(records):
+        stored = r.get("components") if isinstance(r, dict) else getattr(r, "components", None)
+        if stored:
+            out[i] = list(stored)
+        else:
+            pending.append(i)
+    if pending:
+        tagged = get_tagger().tag_many([alarm_cause(records[i]) for i in pending])
+        for i, tags in zip(pending, tagged):
+            out[i] = tags["component"]
+    return out
@@ -6,7 +6,7 @@ Key improvements over ReasonClassifier:
   - JSON-only output (no fragile line-by-line regex of freetext LLM responses)
   - confidence score (0.0–1.0) — know when to trust the result
   - needs_review flag — auto-flagged when confidence < 0.7
-  - Identical external interface: classify_reason(description, cause) -> dict
+  - Identical external interface: classify_reason(description, cause, tags=None) -> dict
   - Same fallback chain: groq -> ollama -> heuristic
 
 Wiring:
@@ -18,6 +18,7 @@ import re
 import json
 import os
 from config import REASON_CLASSIFICATION_MODE, REASON_LEVEL_1_CATEGORIES
+from core.tagger import get_tagger
 
 _PROMPT = """\
 You are classifying an industrial alarm for the O3Sigma manufacturing platform.
@@ -48,7 +49,7 @@ class LLMClassifier:
     Primary O3Sigma alarm classifier.
 
     Interface-compatible with ReasonClassifier — both expose:
-        classify_reason(description: str, cause: str = None) -> dict
+        classify_reason(description: str, cause: str = None, tags: dict = None) -> dict
 
     Extra fields returned (not in ReasonClassifier):
         confidence   float  — model certainty 0.0–1.0
@@ -64,15 +65,18 @@ class LLMClassifier:
 
     # ── Public interface ────────────────────────────────────────────
 
-    def classify_reason(self, description: str, cause: str = None) -> dict:
-        """Classify one alarm. Results are cached by description text."""
+    def classify_reason(self, description: str, cause: str = None, tags: dict = None) -> dict:
+        """
+        Classify one alarm. Results are cached by description text.
+        tags: the alarm's core.tagger output, reused by the heuristic when given.
+        """
         key = description.strip().lower()
         if key in self._cache:
             return self._cache[key]
 
         result = self._try_llm(description, cause)
         if result is None:
-            result = self._heuristic(description, cause)
+            result = self._heuristic(description, cause, tags)
 
         self._cache[key] = result
         return result
@@ -158,33 +162,25 @@ class LLMClassifier:
 
     # ── Heuristic fallback ──────────────────────────────────────────
 
-    def _heuristic(self, description: str, cause: str) -> dict:
+    def _heuristic(self, description: str, cause: str, tags: dict = None) -> dict:
         """Keyword-based fallback — no LLM required. Always succeeds."""
-        d = (description + " " + (cause or "")).lower()
-
-        electrical = ["electric", "voltage", "inverter", "drive", "contactor", "fuse",
-                      "relay", "arc", "wiring", "short circuit", "power supply", "amp"]
-        instrumentation = ["sensor", "encoder", "limit switch", "photocell", "camera",
-                           "probe", "detector", "vision"]
-        software = ["plc", "software", "program", "hmi", "timeout", "communication",
-                    "watchdog", "network", "bus", "fieldbus"]
-        mechanical = ["jam", "belt", "bearing", "hydraulic", "valve", "pump", "gear",
-                      "seal", "lubrication", "broken", "wear", "fracture", "pneumatic"]
-        planned = ["maintenance", "cleaning", "changeover", "scheduled", "cip",
-                   "lubrication round", "planned", "preventive"]
-
-        if any(w in d for w in electrical):
+        # This heuristic's keyword lists are the "llm_classifier" group of the shared tagger (core/tagger.py)
+        if tags is None:
+            tags = get_tagger().tag(description + " " + (cause or ""))
+        found = tags.get("llm_classifier", [])
+
+        if "electrical" in found:
             r2, conf = "Electrical", 0.75
-        elif any(w in d for w in instrumentation):
+        elif "instrumentation" in found:
             r2, conf = "Sensor/Instrumentation", 0.70
-        elif any(w in d for w in software):
+        elif "software" in found:
             r2, conf = "Software/Control", 0.70
-        elif any(w in d for w in mechanical):
+        elif "mechanical" in found:
             r2, conf = "Mechanical", 0.75
         else:
             r2, conf = "Mechanical", 0.50
 
-        cat = "Planned Downtime" if any(w in d for w in planned) else "Unplanned Downtime"
+        cat = "Planned Downtime" if "planned" in found else "Unplanned Downtime"
 
         return {
             "reason_level_1": "Basic Machine and Safety Faults",
@@ -3,6 +3,7 @@ import ollama
 from groq import Groq
 import os
 from config import REASON_CLASSIFICATION_MODE, REASON_LEVEL_1_CATEGORIES, OLLAMA_MODEL, GROQ_MODEL, GROQ_API_KEY # Need to adjust max_tokens in prompt
+from core.tagger import get_tagger, alarm_text, alarm_cause
 
 class ClassificationCache:
     def __init__(self):
@@ -24,7 +25,8 @@ class ReasonClassifier:
                 self.mode = "heuristic"
                 print("Fallback to heuristic classification (no GROQ key)")
     
-    def classify_reason(self, description: str, cause: str = None) -> dict:
+    def classify_reason(self, description: str, cause: str = None, tags: dict = None) -> dict:
+        """tags: this alarm's core.tagger output, when the caller already tagged it."""
         cached = self.cache.get(description)
         if cached:
             return cached
@@ -34,7 +36,7 @@ class ReasonClassifier:
         elif self.mode == "ollama":
             return self._ollama_classify(description, cause)
         else:
-            return self._heuristic_classify(description, cause)
+            return self._heuristic_classify(description, cause, tags)
 
     def _build_prompt(self, description, cause):
         return (
@@ -91,23 +93,21 @@ class ReasonClassifier:
             print(f"Ollama API error fallback: {e}")
             return self._heuristic_classify(description, cause)
 
-    def _heuristic_classify(self, description: str, cause: str) -> dict:
+    def _heuristic_classify(self, description: str, cause: str, tags: dict = None) -> dict:
         cat = "Basic Machine and Safety Faults"
         r2 = "Mechanical"
-        desc_lower = (description + " " + (cause or "")).lower()
-        
-        electrical_words = ["electric", "voltage", "current", "drive", "inverter", "short circuit", "wire", "contactor", "spark", "arc", "encoder", "fuse", "relay", "power supply", "amp"]
-        mechanical_words = ["jam", "wear", "broken", "loose", "fracture", "belt", "bearing", "pneumatic", "hydraulic", "valve", "pump", "gear", "seal", "lubrication", "friction"]
-        instrumentation_words = ["sensor", "encoder", "limit switch", "photocell", "vision", "camera", "probe", "detector"]
-        software_words = ["program", "software", "plc", "timeout", "hmi", "network", "communication loss", "watchdog"]
+        # This classifier's keyword lists are the "reason_classifier" group of the shared tagger (core/tagger.py)
+        if tags is None:
+            tags = get_tagger().tag(f"{description or ''} {cause or ''}")
+        found = tags.get("reason_classifier", [])
 
-        if any(w in desc_lower for w in electrical_words):
+        if "electrical" in found:
             r2 = "Electrical"
-        elif any(w in desc_lower for w in instrumentation_words):
+        elif "instrumentation" in found:
             r2 = "Sensor/Instrumentation"
-        elif any(w in desc_lower for w in software_words):
+        elif "software" in found:
             r2 = "Software/Control"
-        elif any(w in desc_lower for w in mechanical_words):
+        elif "mechanical" in found:
             r2 = "Mechanical"
             
         result = {
@@ -131,12 +131,15 @@ class LocalLLMExtractor:
             if not extracted:
                 if os.environ.get("ALARM_LLM_EXTRACTION", "false").lower() == "true":
                     extracted = self._extract_with_llm(chunk)
-            for item in extracted:
-                desc = item.get("description", "")
-                cause = item.get("cause", "")
-                clss = self.classifier.classify_reason(desc, cause)
-                item.update(clss)
-                alarms.append(item)
+            alarms.extend(extracted)
+
+        # Tag the whole manual in one pass: each alarm's text for the classifier, its cause for the graph
+        texts = [t for item in alarms for t in (alarm_text(item), alarm_cause(item))]
+        all_tags = get_tagger().tag_many(texts)
+        for item, tags, cause_tags in zip(alarms, all_tags[::2], all_tags[1::2]):
+            clss = self.classifier.classify_reason(item.get("description", ""), item.get("cause", ""), tags=tags)
+            item.update(clss)
+            item["components"] = cause_tags["component"]
                 
         # Deduplication handled downstream primarily or here based on alarm_id
         unique_alarms = {}
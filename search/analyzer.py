@@ -0,0 +1,99 @@
+"""
+Alarm-aware text analyzer shared by the search layer.
+
+  "Oil pressure 0.5bar below P0243 (Alarm 0282)"
+    -> oil pressur 0.5 bar below p243 243 alarm 282
+
+Pipeline: NFKC + lowercase -> split on punctuation (decimals stay whole)
+-> zero-pad normalisation of numbers -> letter/digit codes also emit their
+parts -> light suffix stemming of plain words.
+"""
+import re
+import unicodedata
+
+# Bump when analyze() output changes so persisted indexes get rebuilt
+ANALYZER_VERSION = 2
+
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)+|[^\W_]+")
+_RUNS = re.compile(r"[^\W\d_]+|\d+")
+_VOWEL = re.compile(r"[aeiouy]")
+_VC = re.compile(r"[aeiouy]+[^aeiouy]+")
+
+# (suffix, replacement), first match wins; only applied when a vowel-bearing stem of 3+ chars remains
+_SUFFIXES = (
+    ("ational", "ate"), ("ization", "ize"), ("fulness", "ful"), ("iveness", "ive"),
+    ("tional", "tion"), ("ation", "ate"), ("ical", "ic"), ("ement", ""), ("ment", ""), ("ness", ""),
+    ("ingly", ""), ("edly", ""), ("ing", ""), ("ed", ""), ("ly", ""),
+)
+
+def _measure(stem: str) -> int:
+    """Porter's m: vowel-consonant sequences in the stem ('pow' 1, 'controll' 2)."""
+    return len(_VC.findall(stem))
+
+def normalize_number(digits: str) -> str:
+    """'0282' -> '282' so zero-padded and plain alarm codes meet."""
+    return digits.lstrip("0") or "0"
+
+# Alarm IDs made only of ASCII digits lose their zero padding; analytics.event_store.alarm_key
+# applies the same pattern and steps to Arrow columns
+NUMERIC_ALARM_ID = r"^[0-9]+$"
+_NUMERIC_ID = re.compile(NUMERIC_ALARM_ID)
+
+def normalize_alarm_id(alarm_id) -> str:
+    """
+    The join key for alarm IDs everywhere (search, fault resolver, event
+    store): trimmed and lower-cased, numeric codes without zero padding.
+    ' 0282', 282 -> '282'; 'E-12' -> 'e-12'; None -> ''.
+    """
+    aid = "" if alarm_id is None else str(alarm_id).strip().lower()
+    return normalize_number(aid) if _NUMERIC_ID.match(aid) else aid
+
+def stem(word: str) -> str:
+    if len(word) <= 3:
+        return word
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix, repl in _SUFFIXES:
+        if word.endswith(suffix):
+            base = word[:-len(suffix)]
+            if len(base) >= 3 and _VOWEL.search(base):
+                word = base + repl
+                # stopped -> stopp -> stop
+                if repl == "" and len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                    word = word[:-1]
+            break
+    # A second pass so base and inflected forms meet (controller, controlled -> controll);
+    # only on longer stems, so power/powered and filter/filtered both keep their "er"
+    if word.endswith("er") and _measure(word[:-2]) > 1:
+        word = word[:-2]
+    if len(word) > 4 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+def surface_terms(text: str) -> list:
+    """Lowercased words with punctuation stripped, before stemming (for suggestions)."""
+    return _TOKEN.findall(unicodedata.normalize("NFKC", text or "").lower())
+
+def term_spans(text: str) -> list:
+    """(start, end) of each surface term in text, for highlighting matches in the original string."""
+    return [m.span() for m in _TOKEN.finditer(text or "")]
+
+def analyze(text: str) -> list:
+    tokens = []
+    for tok in surface_terms(text):
+        if tok[0].isdigit() and not tok.isalnum():
+            tokens.append(tok)                          # decimal like 0.5
+            continue
+        runs = _RUNS.findall(tok)
+        if len(runs) == 1:
+            tokens.append(normalize_number(tok) if tok.isdigit() else stem(tok))
+            continue
+        # Code such as P0243 or 5bar: the whole code, then its parts
+        runs = [normalize_number(r) if r.isdigit() else r for r in runs]
+        tokens.append("".join(runs))
+        tokens.extend(r if r.isdigit() else stem(r) for r in runs if r.isdigit() or len(r) > 1)
+    return tokens
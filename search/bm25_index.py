@@ -1,4 +1,28 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+import numpy as np
 from rank_bm25 import BM25Okapi
+from config import BM25_INDEX_DIR, BM25_MAX_DELTAS
+from search.bm25_matrix import BM25Matrix, bm25_weights, posting_weights
+from search.analyzer import analyze, ANALYZER_VERSION
+
+try:
+    import fcntl
+except ImportError:     # Windows: writers in one process are still serialised by _WRITE_LOCK
+    fcntl = None
+
+def tokenize(text: str) -> list:
+    return analyze(text)
+
+def _alarm_fields(r) -> tuple:
+    """(alarm_id, machine, source_md5, text) for a dict or AlarmRecord; the ID is indexed as text too."""
+    if isinstance(r, dict):
+        desc, cause = r.get('description') or '', r.get('cause') or ''
+        aid = r.get("alarm_id")
+        return aid, r.get("machine") or "", r.get("source_md5") or "", f"{aid} {desc} {cause}"
+    return r.alarm_id, r.machine or "", r.source_md5 or "", f"{r.alarm_id} {r.description} {r.cause or ''}"
 
 class BM25AlarmIndex:
     """
@@ -16,13 +40,9 @@ class BM25AlarmIndex:
         self.corpus = []
         self.alarm_ids = []
         for r in alarm_records:
-            # handle dict or Pydantic object
-            is_dict = isinstance(r, dict)
-            desc = r.get('description','') if is_dict else r.description
-            cause = r.get('cause','') if is_dict else r.cause
-            text = f"{desc} {cause}"
-            self.corpus.append(text.lower().split())
-            self.alarm_ids.append(r["alarm_id"] if is_dict else r.alarm_id)
+            alarm_id, _, _, text = _alarm_fields(r)
+            self.corpus.append(tokenize(text))
+            self.alarm_ids.append(alarm_id)
         if self.corpus:
             self.bm25 = BM25Okapi(self.corpus)
 
@@ -30,7 +50,442 @@ class BM25AlarmIndex:
         """Returns list of alarm_ids ranked by BM25 score."""
         if not self.bm25:
             return []
-        scores = self.bm25.get_scores(query.lower().split())
+        scores = self.bm25.get_scores(tokenize(query))
         ranked = sorted(zip(self.alarm_ids, scores),
                         key=lambda x: x[1], reverse=True)
         return [aid for aid, score in ranked[:top_k] if score > 0]
+
+
+_ARRAYS = ("doc_len", "idf", "indptr", "postings_doc", "postings_tf", "postings_w",
+           "vocab", "alarm_ids", "doc_machine", "doc_md5")
+
+# Serialises writers within this process; the LOCK file's flock serialises processes. Readers never block.
+_WRITE_LOCK = threading.Lock()
+
+class _Vocabulary:
+    """term -> column over the sorted, memory-mapped vocab array, so opening an index parses no term list."""
+    def __init__(self, terms: np.ndarray):
+        self.terms = terms
+
+    def get(self, term: str, default=None):
+        i = int(np.searchsorted(self.terms, term))
+        return i if i < len(self.terms) and self.terms[i] == term else default
+
+    def columns(self, terms: list) -> np.ndarray:
+        """Column of each term, -1 where it is not in the vocabulary; one search for the whole list."""
+        terms = np.array(terms, dtype=str)
+        if not len(self.terms):
+            return np.full(len(terms), -1, dtype=np.int64)
+        i = np.minimum(np.searchsorted(self.terms, terms), len(self.terms) - 1)
+        return np.where(self.terms[i] == terms, i, -1).astype(np.int64)
+
+class PersistentBM25Index:
+    """
+    On-disk BM25 inverted index, updated incrementally per source_md5.
+
+    Layout under index_dir/gen-<n>/ (the merged base generation):
+      meta.json         corpus stats (n_docs, avgdl, average_idf, k1, b) and
+                        the machine and source_md5 names the codes refer to
+      vocab.npy         terms, sorted; the column order
+      alarm_ids.npy     alarm_id per document
+      doc_machine.npy   machine code per document
+      doc_md5.npy       source_md5 code per document
+      doc_len.npy       tokens per document
+      idf.npy           idf per term
+      indptr.npy        postings offsets per term (CSC layout)
+      postings_doc.npy  document ids, sorted within each term
+      postings_tf.npy   term frequencies, parallel to postings_doc
+      postings_w.npy    precomputed BM25 weight per posting (float32)
+    Every array is opened with mmap, so loading costs nothing up front:
+    terms are found by binary search and documents are only looked up for
+    the hits. Queries are scored as sparse products, and rankings match
+    BM25Okapi (rank_bm25) up to float32 rounding of the weights.
+
+    add() and delete() only write a small delta-<n>.json (the source files
+    it drops and the tokenized documents it adds); CURRENT names the base
+    generation followed by the live deltas and is replaced atomically.
+    Readers keep the deltas as a small in-memory segment next to the base:
+    corpus stats are recounted over both, and a query weights just its own
+    terms' postings with them, so scores equal those of the merged index.
+    Once max_deltas have piled up a background thread merges them into a
+    new base generation. Writers hold a thread lock and an flock on
+    index_dir/LOCK, so processes sharing the index never lose a delta.
+    """
+    VERSION = 3
+
+    def __init__(self, index_dir: str = BM25_INDEX_DIR, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25,
+                 max_deltas: int = BM25_MAX_DELTAS):
+        self.index_dir = index_dir
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        self.max_deltas = max_deltas
+        os.makedirs(index_dir, exist_ok=True)
+        # One instance is shared by the app's sessions; a reload must not swap arrays under a running search
+        self.lock = threading.RLock()
+        self.generation = None
+        self._load()
+
+    # ── Loading ─────────────────────────────────────────────────────
+
+    def _current(self) -> str:
+        try:
+            with open(os.path.join(self.index_dir, "CURRENT")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _parse(current: str) -> tuple:
+        """(base generation or None, [delta names]) from the contents of CURRENT."""
+        parts = (current or "").split()
+        if parts and parts[0].startswith("gen-"):
+            return parts[0], parts[1:]
+        return None, parts
+
+    def _load(self):
+        for _ in range(3):
+            try:
+                return self._load_current()
+            except FileNotFoundError:
+                continue    # merged away between reading CURRENT and opening it; read CURRENT again
+        raise RuntimeError(f"BM25 index at {self.index_dir} keeps changing while loading")
+
+    def _load_current(self):
+        current = self._current()
+        base, deltas = self._parse(current)
+        self._use_base({"n_docs": 0, "avgdl": 0.0, "machines": [], "md5s": []}, {
+            "doc_len": np.zeros(0, dtype=np.int32), "idf": np.zeros(0), "indptr": np.zeros(1, dtype=np.int32),
+            "postings_doc": np.zeros(0, dtype=np.int32), "postings_tf": np.zeros(0, dtype=np.int32),
+            "postings_w": np.zeros(0, dtype=np.float32), "vocab": np.zeros(0, dtype=str),
+            "alarm_ids": np.zeros(0, dtype=str), "doc_machine": np.zeros(0, dtype=np.int32),
+            "doc_md5": np.zeros(0, dtype=np.int32),
+        })
+        if base is not None:
+            path = os.path.join(self.index_dir, base)
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("version") != self.VERSION or meta.get("analyzer") != ANALYZER_VERSION:
+                print(f"BM25 index at {path} was built by another index/analyzer version; ignoring it")
+            else:
+                self._use_base(meta, {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                                      for name in _ARRAYS})
+        self._use_deltas(deltas)
+        self.generation = current
+
+    def _use_base(self, meta: dict, arrays: dict):
+        self.meta = meta
+        for name, arr in arrays.items():
+            setattr(self, name, arr)
+        self.term_ids = _Vocabulary(self.vocab)
+        self.machines, self.md5s = meta["machines"], meta["md5s"]
+        self.machine_ids = {m: i for i, m in enumerate(self.machines)}
+        self.base_docs = len(self.doc_len)
+        self.n_docs, self.avgdl = meta["n_docs"], meta["avgdl"]
+        self.matrix = BM25Matrix(self.postings_w, self.postings_doc, self.indptr, self.n_docs,
+                                 self.term_ids, self.doc_machine, self.machine_ids)
+
+    def _use_deltas(self, deltas: list):
+        # Later deltas drop documents added by earlier ones; whatever survives goes after the base
+        drop_md5s, new_docs = set(), []
+        for name in deltas:
+            with open(os.path.join(self.index_dir, name)) as f:
+                delta = json.load(f)
+            if delta.get("analyzer") != ANALYZER_VERSION:
+                print(f"BM25 delta {name} was tokenized by another analyzer version; ignoring it")
+                continue
+            dropped = set(delta["drop"])
+            drop_md5s |= dropped
+            new_docs = [d for d in new_docs if d[2] not in dropped] + delta["docs"]
+        self.deltas = deltas
+        md5_ids = {m: i for i, m in enumerate(self.md5s)}
+        dropped = [md5_ids[m] for m in drop_md5s if m in md5_ids]
+        self.base_live = ~np.isin(self.doc_md5, dropped) if dropped else None
+
+        # The delta documents as a segment of their own, term-major like the base
+        self.delta_terms, terms, docs, tfs = {}, [], [], []
+        for doc, (_, _, _, tokens) in enumerate(new_docs):
+            counts = {}
+            for t in tokens:
+                counts[t] = counts.get(t, 0) + 1
+            for t, tf in counts.items():
+                terms.append(self.delta_terms.setdefault(t, len(self.delta_terms)))
+                docs.append(doc)
+                tfs.append(tf)
+        terms = np.array(terms, dtype=np.int64)
+        order = np.argsort(terms, kind="stable")
+        self.delta_docs = [d[:3] for d in new_docs]
+        self.delta_indptr = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=len(self.delta_terms)))])
+        self.delta_postings_doc = np.array(docs, dtype=np.int64)[order]
+        self.delta_postings_tf = np.array(tfs, dtype=np.int32)[order]
+        self.delta_len = np.array([len(d[3]) for d in new_docs], dtype=np.int32)
+        if deltas:
+            self._count_stats()
+
+    def _count_stats(self):
+        """Corpus stats and idf of base plus deltas, as the merged index would have them."""
+        base_df = np.diff(self.indptr).astype(np.int64)
+        base_len = int(np.asarray(self.doc_len).sum())
+        if self.base_live is not None:
+            # Dropped base documents no longer count towards any term's document frequency
+            seen = np.concatenate([[0], np.cumsum(self.base_live[self.postings_doc])])
+            base_df = seen[self.indptr[1:]] - seen[self.indptr[:-1]]
+            base_len = int(np.asarray(self.doc_len)[self.base_live].sum())
+        # Delta terms add to their base column's frequency; terms new to the base get columns after it
+        delta_df = np.diff(self.delta_indptr)
+        delta_columns = self.term_ids.columns(list(self.delta_terms))
+        new = delta_columns < 0
+        np.add.at(base_df, delta_columns[~new], delta_df[~new])
+        delta_columns[new] = len(base_df) + np.arange(int(new.sum()))
+        df = np.concatenate([base_df, delta_df[new]])
+
+        live_base = self.base_docs if self.base_live is None else int(self.base_live.sum())
+        self.n_docs = live_base + len(self.delta_docs)
+        self.avgdl = (base_len + int(self.delta_len.sum())) / self.n_docs if self.n_docs else 0.0
+        # Same idf as rank_bm25.BM25Okapi over the terms still in use, as _build computes it
+        used = df > 0
+        idf = np.log(self.n_docs - df + 0.5) - np.log(df + 0.5) if self.n_docs else np.zeros(len(df))
+        average_idf = float(idf[used].sum()) / int(used.sum()) if used.any() else 0.0
+        idf = np.where(idf < 0, self.epsilon * average_idf, idf)
+        self.base_idf, self.delta_idf = idf[:len(base_df)], idf[delta_columns]
+
+        for _, machine, _ in self.delta_docs:
+            self.machine_ids.setdefault(machine, len(self.machine_ids))
+        self.doc_machines = np.concatenate([np.asarray(self.doc_machine), np.array(
+            [self.machine_ids[d[1]] for d in self.delta_docs], dtype=np.int32)])
+
+    def _refresh(self):
+        with self.lock:
+            if self._current() != self.generation:
+                self._load()
+
+    @property
+    def doc_count(self) -> int:
+        with self.lock:
+            self._refresh()
+            return self.n_docs
+
+    # ── Writing ─────────────────────────────────────────────────────
+
+    @contextmanager
+    def _locked(self):
+        with _WRITE_LOCK, open(os.path.join(self.index_dir, "LOCK"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def add(self, alarm_records: list):
+        """Index alarms, replacing any documents already indexed for their source_md5."""
+        if not alarm_records: return
+        fields = [_alarm_fields(r) for r in alarm_records]
+        docs = [[alarm_id, machine, md5, tokenize(text)] for alarm_id, machine, md5, text in fields]
+        self._write_delta(sorted({d[2] for d in docs}), docs)
+
+    def delete(self, source_md5: str):
+        """Remove every document indexed for this source file."""
+        self._write_delta([source_md5], [])
+
+    def _write_delta(self, drop_md5s: list, docs: list):
+        # Only CURRENT is read: the cost of a write is the size of its batch, not of the index
+        with self._locked():
+            current = self._current()
+            base, deltas = self._parse(current)
+            name = f"delta-{self._next_number(current)}.json"
+            tmp = os.path.join(self.index_dir, name + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump({"analyzer": ANALYZER_VERSION, "drop": drop_md5s, "docs": docs}, f)
+            os.replace(tmp, os.path.join(self.index_dir, name))
+            self._set_current(" ".join(([base] if base else []) + deltas + [name]))
+        if len(deltas) + 1 >= self.max_deltas:
+            # Merged by an index of its own, so this one is never swapped out under a running search
+            merge = lambda: PersistentBM25Index(self.index_dir, self.k1, self.b, self.epsilon, self.max_deltas).merge()
+            threading.Thread(target=merge, name="bm25-merge", daemon=True).start()
+
+    def merge(self):
+        """Fold the live deltas into a new base generation."""
+        with self._locked(), self.lock:
+            self._refresh()
+            base, deltas = self._parse(self.generation)
+            if not deltas:
+                return
+            gen = f"gen-{self._next_number(self.generation)}"
+            self._write_generation(gen, *self._build())
+            self._set_current(gen)
+            if base:
+                self._remove_generation(base)
+            for name in deltas:
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    pass
+            self._load()
+
+    def _next_number(self, current: str) -> int:
+        base, deltas = self._parse(current)
+        names = ([base] if base else []) + deltas
+        return max((int(n.split("-")[1].split(".")[0]) for n in names), default=0) + 1
+
+    def _set_current(self, current: str):
+        tmp = os.path.join(self.index_dir, "CURRENT.tmp")
+        with open(tmp, "w") as f:
+            f.write(current)
+        os.replace(tmp, os.path.join(self.index_dir, "CURRENT"))
+
+    def _build(self) -> tuple:
+        """(meta, arrays) of one base generation holding the loaded base and deltas."""
+        keep = self.base_live if self.base_live is not None else np.ones(self.base_docs, dtype=bool)
+        n_kept = int(keep.sum())
+
+        # Surviving base documents keep their postings under fresh, dense ids; delta documents follow
+        new_id = np.cumsum(keep) - 1
+        posting_terms = np.repeat(np.arange(len(self.vocab)), np.diff(self.indptr))
+        mask = keep[self.postings_doc] if len(self.postings_doc) else np.zeros(0, dtype=bool)
+
+        # Delta terms missing from the base extend the vocabulary
+        delta_vocab = np.array(list(self.delta_terms), dtype=str)
+        delta_columns = self.term_ids.columns(delta_vocab)
+        new = delta_columns < 0
+        delta_columns[new] = len(self.vocab) + np.arange(int(new.sum()))
+        vocab = np.concatenate([np.asarray(self.vocab), delta_vocab[new]])
+        delta_terms = np.repeat(delta_columns, np.diff(self.delta_indptr))
+
+        terms = np.concatenate([posting_terms[mask], delta_terms]).astype(np.int64)
+        docs = np.concatenate([new_id[np.asarray(self.postings_doc)[mask]], self.delta_postings_doc + n_kept])
+        tfs = np.concatenate([np.asarray(self.postings_tf)[mask], self.delta_postings_tf]).astype(np.int32)
+        doc_len = np.concatenate([np.asarray(self.doc_len)[keep], self.delta_len]).astype(np.int32)
+
+        # Drop terms left without postings; columns go in term order so readers can binary-search the vocab
+        df = np.bincount(terms, minlength=len(vocab))
+        live = df > 0
+        vocab = vocab[live]
+        by_term = np.argsort(vocab, kind="stable")
+        column = np.empty(len(vocab), dtype=np.int64)
+        column[by_term] = np.arange(len(vocab))
+        terms = column[(np.cumsum(live) - 1)[terms]]
+        vocab, df = vocab[by_term], df[live][by_term]
+        order = np.lexsort((docs, terms))
+        # int32 offsets keep scipy from copying the mmap'd arrays into a common index dtype
+        index_dtype = np.int32 if len(terms) < 2**31 else np.int64
+        indptr = np.concatenate([[0], np.cumsum(df)]).astype(index_dtype)
+        docs, tfs = docs[order].astype(index_dtype), tfs[order]
+
+        n_docs = n_kept + len(self.delta_docs)
+        avgdl = float(doc_len.sum()) / n_docs if n_docs else 0.0
+        # Same idf as rank_bm25.BM25Okapi, including the epsilon floor for common terms
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5) if n_docs else np.zeros(0)
+        average_idf = float(idf.sum()) / len(idf) if len(idf) else 0.0
+        idf = np.where(idf < 0, self.epsilon * average_idf, idf)
+        weights = bm25_weights(idf, indptr, docs, tfs, doc_len, avgdl, self.k1, self.b)
+
+        # Per-document names, with the machine and source_md5 lists cut down to those still used
+        machine_codes = np.concatenate([np.asarray(self.doc_machine)[keep], np.array(
+            [self.machine_ids[d[1]] for d in self.delta_docs], dtype=np.int32)]).astype(np.int64)
+        md5_ids = {m: i for i, m in enumerate(self.md5s)}
+        for _, _, md5 in self.delta_docs:
+            md5_ids.setdefault(md5, len(md5_ids))
+        md5_codes = np.concatenate([np.asarray(self.doc_md5)[keep], np.array(
+            [md5_ids[d[2]] for d in self.delta_docs], dtype=np.int32)]).astype(np.int64)
+        machine_names, md5_names = list(self.machine_ids), list(md5_ids)
+        machines, doc_machine = np.unique(machine_codes, return_inverse=True)
+        md5s, doc_md5 = np.unique(md5_codes, return_inverse=True)
+        alarm_ids = np.concatenate([np.asarray(self.alarm_ids)[keep].astype(str),
+                                    np.array([str(d[0]) for d in self.delta_docs], dtype=str)])
+
+        meta = {"version": self.VERSION, "analyzer": ANALYZER_VERSION, "n_docs": n_docs, "avgdl": avgdl,
+                "average_idf": average_idf, "k1": self.k1, "b": self.b,
+                "machines": [machine_names[c] for c in machines], "md5s": [md5_names[c] for c in md5s]}
+        return meta, {
+            "doc_len": doc_len,
+            "idf": idf.astype(np.float64),
+            "indptr": indptr,
+            "postings_doc": docs,
+            "postings_tf": tfs,
+            "postings_w": weights,
+            "vocab": vocab,
+            "alarm_ids": alarm_ids,
+            "doc_machine": doc_machine.astype(np.int32),
+            "doc_md5": doc_md5.astype(np.int32),
+        }
+
+    def _write_generation(self, gen: str, meta: dict, arrays: dict):
+        path = os.path.join(self.index_dir, gen)
+        os.makedirs(path, exist_ok=True)
+        for name, arr in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), arr)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def _remove_generation(self, gen: str):
+        path = os.path.join(self.index_dir, gen)
+        try:
+            for name in os.listdir(path):
+                os.remove(os.path.join(path, name))
+            os.rmdir(path)
+        except OSError:
+            # Still memory-mapped somewhere (Windows); cleaned up by a later write
+            pass
+
+    # ── Searching ───────────────────────────────────────────────────
+
+    def _segment_matrix(self, token_lists: list) -> BM25Matrix:
+        """The query terms' columns of base plus deltas, weighted with the recounted stats."""
+        term_ids, weights, docs, indptr = {}, [], [], [0]
+        for t in sorted({t for tokens in token_lists for t in tokens}):
+            column, d = self.term_ids.get(t), self.delta_terms.get(t)
+            if column is not None:
+                start, end = self.indptr[column], self.indptr[column + 1]
+                rows, tf = np.asarray(self.postings_doc[start:end]), np.asarray(self.postings_tf[start:end])
+                if self.base_live is not None:
+                    keep = self.base_live[rows]
+                    rows, tf = rows[keep], tf[keep]
+                docs.append(rows)
+                weights.append(posting_weights(self.base_idf[column], tf, np.asarray(self.doc_len)[rows],
+                                               self.avgdl, self.k1, self.b))
+            if d is not None:
+                start, end = self.delta_indptr[d], self.delta_indptr[d + 1]
+                rows = self.delta_postings_doc[start:end]
+                docs.append(rows + self.base_docs)
+                weights.append(posting_weights(self.delta_idf[d], self.delta_postings_tf[start:end],
+                                               self.delta_len[rows], self.avgdl, self.k1, self.b))
+            if column is not None or d is not None:
+                term_ids[t] = len(indptr) - 1
+                indptr.append(sum(len(r) for r in docs))
+        weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)
+        docs = np.concatenate(docs).astype(np.int64) if docs else np.zeros(0, dtype=np.int64)
+        return BM25Matrix(weights, docs, np.array(indptr, dtype=np.int64), self.base_docs + len(self.delta_docs),
+                          term_ids, self.doc_machines, self.machine_ids)
+
+    def _doc(self, i: int) -> tuple:
+        """(alarm_id, machine, source_md5) of document i; delta documents come after the base."""
+        if i >= self.base_docs:
+            return tuple(self.delta_docs[i - self.base_docs])
+        return str(self.alarm_ids[i]), self.machines[self.doc_machine[i]], self.md5s[self.doc_md5[i]]
+
+    def _hits(self, ranked: list) -> list:
+        hits = []
+        for i, score in ranked:
+            alarm_id, machine, source_md5 = self._doc(i)
+            hits.append({"alarm_id": alarm_id, "machine": machine, "source_md5": source_md5, "score": score})
+        return hits
+
+    def search_batch(self, queries: list, top_k: int = 10, machine: str = None) -> list:
+        """Score many queries in one sparse product; one hit list per query."""
+        with self.lock:
+            self._refresh()
+            if not self.n_docs:
+                return [[] for _ in queries]
+            token_lists = [tokenize(q) for q in queries]
+            matrix = self._segment_matrix(token_lists) if self.deltas else self.matrix
+            mask = matrix.mask_for(machine) if machine else None
+            ranked = matrix.top_k(token_lists, top_k, mask)
+            return [self._hits(r) for r in ranked]
+
+    def search_hits(self, query: str, top_k: int = 10, machine: str = None) -> list:
+        """Returns [{alarm_id, machine, source_md5, score}] ranked by BM25 score."""
+        return self.search_batch([query], top_k, machine)[0]
+
+    def search(self, query: str, top_k: int = 10, machine: str = None) -> list:
+        """Returns list of alarm_ids ranked by BM25 score, like BM25AlarmIndex.search."""
+        return [h["alarm_id"] for h in self.search_hits(query, top_k, machine)]
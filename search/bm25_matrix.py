@@ -0,0 +1,75 @@
+import numpy as np
+from scipy import sparse
+
+def bm25_weights(idf: np.ndarray, indptr: np.ndarray, postings_doc: np.ndarray, postings_tf: np.ndarray,
+                 doc_len: np.ndarray, avgdl: float, k1: float, b: float) -> np.ndarray:
+    """Per-posting BM25 contribution idf * tf*(k1+1) / (tf + k1*(1-b+b*dl/avgdl)), float32."""
+    if not len(postings_doc):
+        return np.zeros(0, dtype=np.float32)
+    term_idf = np.repeat(np.asarray(idf, dtype=np.float64), np.diff(indptr))
+    return posting_weights(term_idf, postings_tf, np.asarray(doc_len)[postings_doc], avgdl, k1, b)
+
+def posting_weights(idf, tf: np.ndarray, doc_len: np.ndarray, avgdl: float, k1: float, b: float) -> np.ndarray:
+    """The same contribution for postings given their idf (one per posting, or one for all) and document lengths."""
+    tf = np.asarray(tf, dtype=np.float64)
+    norm = k1 * (1 - b + b * np.asarray(doc_len, dtype=np.float64) / avgdl)
+    return (idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+class BM25Matrix:
+    """
+    BM25 scoring as sparse linear algebra.
+
+    W is the precomputed docs x terms weight matrix (CSC, built without
+    copying from the index's postings arrays). A batch of queries becomes
+    a terms x queries count matrix Q, and W @ Q scores every query at once.
+    Only documents sharing a term with the query appear in the sparse result,
+    so top-k selection with argpartition touches just those.
+    """
+    def __init__(self, weights: np.ndarray, postings_doc: np.ndarray, indptr: np.ndarray,
+                 n_docs: int, term_ids: dict, doc_groups: np.ndarray = None, group_ids: dict = None):
+        n_terms = len(indptr) - 1
+        self.W = sparse.csc_matrix((weights, postings_doc, indptr), shape=(n_docs, n_terms), copy=False)
+        self.term_ids = term_ids
+        self.doc_groups = doc_groups    # e.g. machine code per document, for filter masks
+        self.group_ids = group_ids or {}
+
+    def query_matrix(self, token_lists: list) -> sparse.csc_matrix:
+        rows, cols = [], []
+        for q, tokens in enumerate(token_lists):
+            for t in tokens:
+                # Repeated query tokens count once per occurrence, as in BM25Okapi
+                tid = self.term_ids.get(t)
+                if tid is not None:
+                    rows.append(tid)
+                    cols.append(q)
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csc_matrix((data, (rows, cols)), shape=(self.W.shape[1], len(token_lists)))
+
+    def mask_for(self, group: str) -> np.ndarray:
+        """Boolean document mask for one group (machine); all False when unknown."""
+        code = self.group_ids.get(group)
+        if code is None or self.doc_groups is None:
+            return np.zeros(self.W.shape[0], dtype=bool)
+        return np.asarray(self.doc_groups) == code
+
+    def top_k(self, token_lists: list, top_k: int = 10, mask: np.ndarray = None) -> list:
+        """For each query, [(doc, score)] ranked by score, then by document order."""
+        if not token_lists:
+            return []
+        S = (self.W @ self.query_matrix(token_lists)).tocsc()
+        results = []
+        for q in range(S.shape[1]):
+            start, end = S.indptr[q], S.indptr[q + 1]
+            docs, scores = S.indices[start:end], S.data[start:end]
+            keep = scores > 0
+            if mask is not None:
+                keep &= mask[docs]
+            docs, scores = docs[keep], scores[keep]
+            if len(docs) > top_k:
+                # Everything tied with the k-th score stays a candidate so ties break by document order
+                kth = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+                cand = scores >= kth
+                docs, scores = docs[cand], scores[cand]
+            order = np.lexsort((docs, -scores))[:top_k]
+            results.append([(int(docs[i]), float(scores[i])) for i in order])
+        return results
@@ -1,51 +1,74 @@
-import networkx as nx
-import re
-from typing import Optional
 from neo4j import GraphDatabase
-import os
-from config import GRAPH_BACKEND, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+from config import GRAPH_BACKEND, NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NEO4J_BATCH_SIZE
+from core.tagger import alarm_components
 
-COMPONENT_PATTERN = re.compile(
-    r'\b(inverter|motor|servo|sensor|encoder|valve|pump|'
-    r'bearing|seal|gear|belt|conveyor|drive|plc|hmi|camera)\b',
-    re.IGNORECASE
+_ALARM_ROWS = (
+    "UNWIND $rows AS row "
+    "MERGE (a:Alarm {id: row.aid}) "
+    "SET a.description = row.desc, a.reason_2 = row.r2 "
+    "MERGE (m:Machine {name: row.machine}) "
+    "MERGE (a)-[:BELONGS_TO]->(m)"
+)
+_CAUSE_ROWS = (
+    "UNWIND $rows AS row "
+    "MERGE (a:Alarm {id: row.aid}) "
+    "MERGE (c:Component {name: row.comp}) "
+    "MERGE (a)-[:CAUSES]->(c)"
+)
+_CONSTRAINTS = (
+    "CREATE CONSTRAINT alarm_id IF NOT EXISTS FOR (a:Alarm) REQUIRE a.id IS UNIQUE",
+    "CREATE CONSTRAINT machine_name IF NOT EXISTS FOR (m:Machine) REQUIRE m.name IS UNIQUE",
+    "CREATE CONSTRAINT component_name IF NOT EXISTS FOR (c:Component) REQUIRE c.name IS UNIQUE",
 )
 
+def _run_rows(tx, query: str, rows: list):
+    tx.run(query, rows=rows).consume()
+
 class Neo4jGraph:
-    def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
-    
+    """
+    Neo4j backend. build() sends alarms and component links as UNWIND
+    parameter lists in explicit write transactions of at most batch_size
+    rows, rather than one auto-commit MERGE per alarm and per component.
+    The uniqueness constraints (which also index the MERGE keys) are
+    created on the first build. Pass `driver` to use an existing or
+    stand-in driver.
+    """
+    def __init__(self, uri=None, user=None, password=None, driver=None, batch_size: int = NEO4J_BATCH_SIZE):
+        self.driver = driver or GraphDatabase.driver(uri, auth=(user, password))
+        self.batch_size = batch_size
+        self.constraints_ready = False
+
     def close(self):
         self.driver.close()
-        
+
+    def ensure_constraints(self):
+        if self.constraints_ready: return
+        with self.driver.session() as session:
+            for statement in _CONSTRAINTS:
+                session.run(statement).consume()
+        self.constraints_ready = True
+
     def build(self, alarm_records: list):
         if not alarm_records: return
+        alarms, causes = {}, {}
+        for r, components in zip(alarm_records, alarm_components(alarm_records)):
+            is_dict = isinstance(r, dict)
+            aid = r.get("alarm_id") if is_dict else r.alarm_id
+            machine = r.get("machine", "unknown") if is_dict else (r.machine or "unknown")
+            desc = r.get("description", "") if is_dict else r.description
+            r2 = r.get("reason_level_2", "") if is_dict else r.reason_level_2
+
+            # Later records win, as with sequential MERGE ... SET
+            alarms.pop((aid, machine), None)
+            alarms[(aid, machine)] = {"aid": aid, "desc": desc, "r2": r2, "machine": machine}
+            for c in components:
+                causes[(aid, c)] = {"aid": aid, "comp": c}
+
+        self.ensure_constraints()
         with self.driver.session() as session:
-            for r in alarm_records:
-                is_dict = isinstance(r, dict)
-                aid = r.get("alarm_id") if is_dict else r.alarm_id
-                machine = r.get("machine", "unknown") if is_dict else (r.machine or "unknown")
-                desc = r.get("description", "") if is_dict else r.description
-                cause = r.get("cause", "") if is_dict else r.cause
-                r2 = r.get("reason_level_2", "") if is_dict else r.reason_level_2
-                
-                # Merge Alarm and Machine
-                session.run(
-                    "MERGE (a:Alarm {id: $aid}) "
-                    "SET a.description = $desc, a.reason_2 = $r2 "
-                    "MERGE (m:Machine {name: $machine}) "
-                    "MERGE (a)-[:BELONGS_TO]->(m)",
-                    aid=aid, desc=desc, r2=r2, machine=machine
-                )
-                
-                for component in COMPONENT_PATTERN.findall(cause or ""):
-                    c = component.lower()
-                    session.run(
-                        "MERGE (a:Alarm {id: $aid}) "
-                        "MERGE (c:Component {name: $comp}) "
-                        "MERGE (a)-[:CAUSES]->(c)",
-                        aid=aid, comp=c
-                    )
+            for query, rows in ((_ALARM_ROWS, list(alarms.values())), (_CAUSE_ROWS, list(causes.values()))):
+                for start in range(0, len(rows), self.batch_size):
+                    session.execute_write(_run_rows, query, rows[start:start + self.batch_size])
 
     def alarms_for_machine(self, machine: str) -> list:
         with self.driver.session() as session:
@@ -73,71 +96,80 @@ class Neo4jGraph:
             )
             return [(record["component"], record["count"]) for record in res]
 
+    def alarms_for_components(self, components: list) -> list:
+        with self.driver.session() as session:
+            res = session.run(
+                "MATCH (a:Alarm)-[:CAUSES]->(c:Component) WHERE c.name IN $comps "
+                "MATCH (a)-[:BELONGS_TO]->(m:Machine) "
+                "RETURN m.name AS machine, a.id AS aid, count(DISTINCT c) AS matched "
+                "ORDER BY matched DESC, machine, aid",
+                comps=components
+            )
+            return [(record["machine"], record["aid"], record["matched"]) for record in res]
+
 class AlarmGraph:
     """
-    In-memory directed graph or Neo4j based on config.
+    Persistent in-memory graph (CompactAlarmGraph) or Neo4j based on config.
     """
     def __init__(self):
-        self.backend = GRAPH_BACKEND
-        self.G = None
+        self.backend = "memory" if GRAPH_BACKEND == "networkx" else GRAPH_BACKEND
+        self.store = None
         self.neo = None
-        
+
         if self.backend == "neo4j":
             try:
                 self.neo = Neo4jGraph(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
                 # Test connection
                 self.neo.driver.verify_connectivity()
             except Exception as e:
-                print(f"Neo4j connection failed: {e}. Falling back to networkx memory graph.")
-                self.backend = "networkx"
+                print(f"Neo4j connection failed: {e}. Falling back to the in-memory graph.")
+                self.backend = "memory"
                 self.neo = None
-                
-        if self.backend == "networkx":
-            self.G = nx.DiGraph()
+
+        if self.backend == "memory":
+            from search.graph_store import CompactAlarmGraph
+            self.store = CompactAlarmGraph()
 
     def build(self, alarm_records: list):
+        """Add alarms to the graph; in memory, whatever was stored for their source files is replaced."""
         if self.backend == "neo4j" and self.neo:
             self.neo.build(alarm_records)
             return
+        self.store.add(alarm_records)
 
-        for r in alarm_records:
-            is_dict = isinstance(r, dict)
-            aid     = r.get("alarm_id") if is_dict else r.alarm_id
-            machine = r.get("machine", "unknown") if is_dict else (r.machine or "unknown")
-            desc = r.get("description", "") if is_dict else r.description
-            cause = r.get("cause", "") if is_dict else r.cause
-            r2 = r.get("reason_level_2", "") if is_dict else r.reason_level_2
-
-            self.G.add_node(aid,     type="alarm",
-                            description=desc,
-                            reason_2=r2)
-            self.G.add_node(machine, type="machine")
-            self.G.add_edge(aid, machine, relation="BELONGS_TO")
+    def delete(self, source_md5: str):
+        """Remove a source file's alarms from the in-memory graph (Neo4j nodes carry no source file)."""
+        if self.store is not None:
+            self.store.remove(source_md5)
 
-            for component in COMPONENT_PATTERN.findall(cause or ""):
-                c = component.lower()
-                self.G.add_node(c, type="component")
-                self.G.add_edge(aid, c, relation="CAUSES")
+    def is_empty(self) -> bool:
+        if self.backend == "neo4j" and self.neo: return False
+        return self.store.is_empty()
 
     def alarms_for_machine(self, machine: str) -> list:
         if self.backend == "neo4j" and self.neo: return self.neo.alarms_for_machine(machine)
-        return [n for n in self.G.predecessors(machine) if self.G.nodes[n].get("type") == "alarm"]
+        return self.store.alarms_for_machine(machine)
 
     def alarms_for_component(self, component: str) -> list:
         if self.backend == "neo4j" and self.neo: return self.neo.alarms_for_component(component)
-        if component not in self.G: return []
-        return [n for n in self.G.predecessors(component) if self.G.nodes[n].get("type") == "alarm"]
+        return self.store.alarms_for_component(component)
 
     def shared_components(self, alarm_a: str, alarm_b: str) -> list:
         if self.backend == "neo4j" and self.neo: return self.neo.shared_components(alarm_a, alarm_b)
-        if alarm_a not in self.G or alarm_b not in self.G: return []
-        return list(set(self.G.successors(alarm_a)) & set(self.G.successors(alarm_b)))
+        return sorted(set(self.store.components_for_alarm(alarm_a)) & set(self.store.components_for_alarm(alarm_b)))
+
+    def alarms_for_components(self, components: list) -> list:
+        """(machine, alarm_id, matched component count) for alarms caused by any of components, most matches first."""
+        components = sorted({c.lower() for c in components})
+        if not components: return []
+        if self.backend == "neo4j" and self.neo: return self.neo.alarms_for_components(components)
+        matched = {}
+        for c in components:
+            for aid in self.store.alarms_for_component(c):
+                for m in self.store.machines_for_alarm(aid):
+                    matched[(m, aid)] = matched.get((m, aid), 0) + 1
+        return sorted(((m, aid, n) for (m, aid), n in matched.items()), key=lambda x: (-x[2], x[0], x[1]))
 
     def component_risk_ranking(self) -> list:
         if self.backend == "neo4j" and self.neo: return self.neo.component_risk_ranking()
-        comps = [
-            (node, self.G.in_degree(node))
-            for node, data in self.G.nodes(data=True)
-            if data.get("type") == "component"
-        ]
-        return sorted(comps, key=lambda x: x[1], reverse=True)
+        return self.store.component_risk_ranking()
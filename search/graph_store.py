@@ -0,0 +1,265 @@
+import os
+import threading
+import numpy as np
+from config import GRAPH_STORE_DIR
+from core.tagger import alarm_components
+
+ALARM, MACHINE, COMPONENT = 1, 2, 3
+BELONGS_TO, CAUSES = 0, 1
+
+_WRITE_LOCK = threading.Lock()
+
+def _pack(src: np.ndarray, dst: np.ndarray, rel: np.ndarray) -> np.ndarray:
+    """One sortable int64 per (src, dst, rel) edge: src in the high 32 bits, then dst, then the 1-bit rel."""
+    return (src.astype(np.int64) << 32) | (dst.astype(np.int64) << 1) | rel.astype(np.int64)
+
+def _unpack(keys: np.ndarray) -> tuple:
+    return ((keys >> 32).astype(np.int32), ((keys & 0xFFFFFFFF) >> 1).astype(np.int32),
+            (keys & 1).astype(np.int32))
+
+class CompactAlarmGraph:
+    """
+    Persistent in-memory alarm graph with array-backed adjacency.
+
+    Nodes are integer ids into an interned (kind, name) table. Edges are
+    stored once per source file as parallel int32 arrays (src, dst, rel,
+    md5), so a manual can be added or removed without rebuilding the rest;
+    The distinct edges are kept as a sorted table of packed int64 keys
+    with their multiplicity (one per source file), and CSR adjacency in
+    both directions is derived from it on the first query after a change.
+    In- and out-degree counters over the distinct edges are maintained on
+    every add/remove, so component_risk_ranking never scans the graph.
+
+    Everything, the distinct edge table and the degree counters included,
+    is saved to one .npz under store_dir, replaced atomically.
+    The name table is append-only; nodes that lose all their edges stay
+    interned but are never returned.
+    """
+    FILE = "graph.npz"
+    VERSION = 3     # 3: components tagged from the cause by core.tagger
+
+    def __init__(self, store_dir: str = GRAPH_STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.path = os.path.join(store_dir, self.FILE)
+        self._load()
+
+    # ── Loading and saving ──────────────────────────────────────────
+
+    def _load(self):
+        self.names, self.kinds, self.node_ids = [], [], {}
+        self.md5s, self.md5_ids = [], {}
+        self.src = self.dst = self.rel = self.md5 = np.zeros(0, dtype=np.int32)
+        self.keys, self.counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+        self.in_degree = self.out_degree = np.zeros(0, dtype=np.int32)
+        self.mtime = None
+        if os.path.exists(self.path):
+            self.mtime = os.path.getmtime(self.path)
+            with np.load(self.path) as data:
+                if int(data["version"]) == self.VERSION:
+                    self.names = data["names"].tolist()
+                    self.kinds = data["kinds"].tolist()
+                    self.md5s = data["md5s"].tolist()
+                    self.src, self.dst, self.rel, self.md5 = (data[k] for k in ("src", "dst", "rel", "md5"))
+                    if "keys" in data:
+                        self.keys, self.counts = data["keys"], data["counts"]
+                        self.in_degree, self.out_degree = data["in_degree"], data["out_degree"]
+                    else:
+                        self._count_edges()     # saved before the edge table was persisted
+                else:
+                    print(f"Graph store at {self.path} has another version; ignoring it")
+        self.node_ids = {(k, n): i for i, (k, n) in enumerate(zip(self.kinds, self.names))}
+        self.component_nodes = [i for i, k in enumerate(self.kinds) if k == COMPONENT]
+        self.md5_ids = {m: i for i, m in enumerate(self.md5s)}
+        self.csr = None
+
+    def _count_edges(self):
+        """Distinct edge table and degree counters recomputed from the per-file edges."""
+        self.keys, counts = np.unique(_pack(self.src, self.dst, self.rel), return_counts=True)
+        self.counts = counts.astype(np.int32)
+        src, dst, _ = _unpack(self.keys)
+        self.in_degree = np.bincount(dst, minlength=len(self.names)).astype(np.int32)
+        self.out_degree = np.bincount(src, minlength=len(self.names)).astype(np.int32)
+
+    def _refresh(self):
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime != self.mtime:
+            self._load()
+
+    def _save(self):
+        tmp = self.path + ".tmp.npz"
+        np.savez(
+            tmp, version=self.VERSION,
+            names=np.array(self.names, dtype=str), kinds=np.array(self.kinds, dtype=np.int8),
+            md5s=np.array(self.md5s, dtype=str),
+            src=self.src, dst=self.dst, rel=self.rel, md5=self.md5,
+            keys=self.keys, counts=self.counts,
+            in_degree=self.in_degree[:len(self.names)], out_degree=self.out_degree[:len(self.names)],
+        )
+        os.replace(tmp, self.path)
+        self.mtime = os.path.getmtime(self.path)
+
+    # ── Writing ─────────────────────────────────────────────────────
+
+    def _intern(self, kind: int, name: str) -> int:
+        key = (kind, name)
+        node = self.node_ids.get(key)
+        if node is None:
+            node = self.node_ids[key] = len(self.names)
+            self.names.append(name)
+            self.kinds.append(kind)
+            if node >= len(self.in_degree):
+                # Grow geometrically so interning n nodes copies O(n) entries in total
+                grow = np.zeros(max(node + 1, 2 * len(self.in_degree), 64), dtype=np.int32)
+                self.in_degree = np.concatenate([self.in_degree, grow[len(self.in_degree):]])
+                self.out_degree = np.concatenate([self.out_degree, grow[len(self.out_degree):]])
+            if kind == COMPONENT:
+                self.component_nodes.append(node)
+        return node
+
+    def _count_distinct(self, keys: np.ndarray, delta: int):
+        """Add delta per occurrence of each packed edge key; edges appearing or vanishing move the degrees."""
+        keys, n = np.unique(keys, return_counts=True)
+        pos = np.searchsorted(self.keys, keys)
+        known = pos < len(self.keys)
+        known[known] = self.keys[pos[known]] == keys[known]
+        self.counts[pos[known]] += (delta * n[known]).astype(np.int32)
+        fresh = keys[~known]
+        if delta > 0 and len(fresh):
+            src, dst, _ = _unpack(fresh)
+            np.add.at(self.in_degree, dst, 1)
+            np.add.at(self.out_degree, src, 1)
+            self.keys = np.insert(self.keys, pos[~known], fresh)
+            self.counts = np.insert(self.counts, pos[~known], n[~known].astype(np.int32))
+        gone = self.counts <= 0
+        if gone.any():
+            src, dst, _ = _unpack(self.keys[gone])
+            np.subtract.at(self.in_degree, dst, 1)
+            np.subtract.at(self.out_degree, src, 1)
+            self.keys, self.counts = self.keys[~gone], self.counts[~gone]
+
+    def _drop_md5s(self, md5_ids: set):
+        drop = np.isin(self.md5, list(md5_ids))
+        if drop.any():
+            self._count_distinct(_pack(self.src[drop], self.dst[drop], self.rel[drop]), -1)
+        keep = ~drop
+        self.src, self.dst, self.rel, self.md5 = self.src[keep], self.dst[keep], self.rel[keep], self.md5[keep]
+
+    def add(self, alarm_records: list):
+        """Index alarms, replacing whatever was stored for their source files."""
+        if not alarm_records: return
+        with _WRITE_LOCK:
+            self._refresh()
+            rows = []
+            for r, components in zip(alarm_records, alarm_components(alarm_records)):
+                is_dict = isinstance(r, dict)
+                aid = r.get("alarm_id") if is_dict else r.alarm_id
+                machine = (r.get("machine") if is_dict else r.machine) or "unknown"
+                md5 = (r.get("source_md5") if is_dict else r.source_md5) or ""
+                rows.append((aid, machine, components, md5))
+
+            md5_ids = set()
+            for md5 in {row[3] for row in rows}:
+                if md5 not in self.md5_ids:
+                    self.md5_ids[md5] = len(self.md5s)
+                    self.md5s.append(md5)
+                md5_ids.add(self.md5_ids[md5])
+            self._drop_md5s(md5_ids)
+
+            edges = set()
+            for aid, machine, components, md5 in rows:
+                a = self._intern(ALARM, aid)
+                m = self.md5_ids[md5]
+                edges.add((a, self._intern(MACHINE, machine), BELONGS_TO, m))
+                for component in components:
+                    edges.add((a, self._intern(COMPONENT, component), CAUSES, m))
+            new = np.array(sorted(edges), dtype=np.int32).reshape(-1, 4)
+            self._count_distinct(_pack(new[:, 0], new[:, 1], new[:, 2]), 1)
+            self.src = np.concatenate([self.src, new[:, 0]])
+            self.dst = np.concatenate([self.dst, new[:, 1]])
+            self.rel = np.concatenate([self.rel, new[:, 2]])
+            self.md5 = np.concatenate([self.md5, new[:, 3]])
+            self.csr = None
+            self._save()
+
+    def remove(self, source_md5: str):
+        """Drop every edge contributed by this source file."""
+        with _WRITE_LOCK:
+            self._refresh()
+            md5_id = self.md5_ids.get(source_md5)
+            if md5_id is None: return
+            self._drop_md5s({md5_id})
+            self.csr = None
+            self._save()
+
+    # ── Adjacency ───────────────────────────────────────────────────
+
+    def _adjacency(self) -> dict:
+        """CSR out- and in-adjacency over the distinct edges, built on first use after a change."""
+        self._refresh()
+        if self.csr is None:
+            n = len(self.names)
+            edges = np.stack(_unpack(self.keys), axis=1)
+            csr = {}
+            for name, key, other in (("out", 0, 1), ("in", 1, 0)):
+                order = np.lexsort((edges[:, other], edges[:, key]))
+                indptr = np.zeros(n + 1, dtype=np.int64)
+                np.cumsum(np.bincount(edges[:, key], minlength=n), out=indptr[1:])
+                csr[name] = (indptr, edges[order, other], edges[order, 2])
+            self.csr = csr
+        return self.csr
+
+    def _neighbours(self, node: int, direction: str, rel: int, kind: int) -> list:
+        indptr, nodes, rels = self._adjacency()[direction]
+        lo, hi = indptr[node], indptr[node + 1]
+        return [self.names[v] for v, r in zip(nodes[lo:hi].tolist(), rels[lo:hi].tolist())
+                if r == rel and self.kinds[v] == kind]
+
+    # ── Queries ─────────────────────────────────────────────────────
+
+    def is_empty(self) -> bool:
+        self._refresh()
+        return not len(self.keys)
+
+    def alarms_for_machine(self, machine: str) -> list:
+        self._refresh()
+        node = self.node_ids.get((MACHINE, machine))
+        return [] if node is None else self._neighbours(node, "in", BELONGS_TO, ALARM)
+
+    def alarms_for_component(self, component: str) -> list:
+        self._refresh()
+        node = self.node_ids.get((COMPONENT, component))
+        return [] if node is None else self._neighbours(node, "in", CAUSES, ALARM)
+
+    def machines_for_alarm(self, alarm_id: str) -> list:
+        self._refresh()
+        node = self.node_ids.get((ALARM, alarm_id))
+        return [] if node is None else self._neighbours(node, "out", BELONGS_TO, MACHINE)
+
+    def components_for_alarm(self, alarm_id: str) -> list:
+        self._refresh()
+        node = self.node_ids.get((ALARM, alarm_id))
+        return [] if node is None else self._neighbours(node, "out", CAUSES, COMPONENT)
+
+    def incidence(self) -> tuple:
+        """
+        Distinct alarm -> component (CAUSES) edges as (alarm_ids, components,
+        alarm_index, component_index), alarms and components sorted by name.
+        """
+        self._refresh()
+        src, dst, rel = _unpack(self.keys)
+        causes = rel == CAUSES
+        pairs = sorted({(self.names[s], self.names[d]) for s, d in zip(src[causes].tolist(), dst[causes].tolist())})
+        alarm_ids = sorted({a for a, _ in pairs})
+        components = sorted({c for _, c in pairs})
+        a_idx = {a: i for i, a in enumerate(alarm_ids)}
+        c_idx = {c: i for i, c in enumerate(components)}
+        return (alarm_ids, components,
+                np.array([a_idx[a] for a, _ in pairs], dtype=np.int32),
+                np.array([c_idx[c] for _, c in pairs], dtype=np.int32))
+
+    def component_risk_ranking(self) -> list:
+        """(component, distinct alarms causing it), highest first; read from the degree counters."""
+        self._refresh()
+        comps = [(self.names[i], int(self.in_degree[i])) for i in self.component_nodes if self.in_degree[i] > 0]
+        return sorted(comps, key=lambda x: (-x[1], x[0]))
@@ -0,0 +1,46 @@
+from search.analyzer import analyze, term_spans
+
+SNIPPET_CHARS = 160
+
+def highlight(text: str, query_terms: set, width: int = SNIPPET_CHARS) -> str:
+    """
+    Snippet of text around the first term matching the query (after analysis,
+    so "pressures" matches "pressure" and "0282" matches "282"), with matches
+    in **bold**. Returns the leading `width` characters when nothing matches.
+    """
+    text = text or ""
+    matches = [(a, b) for a, b in term_spans(text) if query_terms & set(analyze(text[a:b]))]
+    if not matches:
+        return text[:width] + ("…" if len(text) > width else "")
+    start = max(0, matches[0][0] - width // 4)
+    if start:
+        # Begin at a word boundary
+        space = text.rfind(" ", 0, start)
+        start = space + 1 if space >= 0 else 0
+    end = min(len(text), start + width)
+    out, pos = [], start
+    for a, b in matches:
+        if a < start or b > end: continue
+        out.append(text[pos:a])
+        out.append(f"**{text[a:b]}**")
+        pos = b
+    out.append(text[pos:end])
+    return ("…" if start else "") + "".join(out) + ("…" if end < len(text) else "")
+
+def hydrate_hits(db, hits: list, query: str = "") -> list:
+    """
+    Search hits ({machine, alarm_id, ...}) merged with their alarm records,
+    fetched in one batched lookup, plus highlighted description/cause
+    snippets. Hits whose record is gone (e.g. a stale index) are dropped.
+    """
+    docs = db.get_alarms_by_keys([(h.get("machine") or "", h["alarm_id"]) for h in hits])
+    terms = set(analyze(query))
+    out = []
+    for h in hits:
+        doc = docs.get((h.get("machine") or "", h["alarm_id"]))
+        if doc is None: continue
+        row = {**doc, **h}
+        row["description_highlight"] = highlight(doc.get("description"), terms)
+        row["cause_highlight"] = highlight(doc.get("cause"), terms)
+        out.append(row)
+    return out
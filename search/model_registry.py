@@ -0,0 +1,98 @@
+"""
+Process-wide registry for embedding models and Chroma clients.
+
+Loading a SentenceTransformer takes seconds and each PersistentClient opens
+its own SQLite handles, so both are created once per process and shared by
+the pipeline and the UI. warm_up() preloads them on a background thread at
+app start; encode_query() keeps recent query embeddings in an LRU.
+"""
+import time
+import threading
+from collections import OrderedDict
+from config import EMBEDDING_MODEL, EMBEDDING_RUNTIME, CHROMA_PERSIST_DIR, QUERY_EMBEDDING_CACHE_SIZE, VECTOR_BACKEND
+
+_lock = threading.Lock()
+_models = {}
+_clients = {}
+_load_seconds = {}
+
+_query_lock = threading.Lock()
+_query_cache = OrderedDict()   # (model name, runtime, query text) -> embedding list
+_query_stats = {"hits": 0, "misses": 0}
+
+def get_embedding_model(name: str = EMBEDDING_MODEL, runtime: str = EMBEDDING_RUNTIME):
+    key = f"{name}:{runtime}"
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        if key not in _models:
+            start = time.perf_counter()
+            model = None
+            if runtime == "onnx":
+                try:
+                    from search.onnx_embedder import OnnxEmbedder
+                    model = OnnxEmbedder(name)
+                except Exception as e:
+                    print(f"ONNX embedding runtime unavailable ({e}); falling back to PyTorch")
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(name)
+            _models[key] = model
+            _load_seconds[f"model:{key}"] = round(time.perf_counter() - start, 3)
+        return _models[key]
+
+def get_chroma_client(path: str = CHROMA_PERSIST_DIR):
+    client = _clients.get(path)
+    if client is not None:
+        return client
+    with _lock:
+        if path not in _clients:
+            start = time.perf_counter()
+            import chromadb
+            _clients[path] = chromadb.PersistentClient(path=path)
+            _load_seconds[f"chroma:{path}"] = round(time.perf_counter() - start, 3)
+        return _clients[path]
+
+def encode_query(text: str, name: str = EMBEDDING_MODEL, runtime: str = EMBEDDING_RUNTIME) -> list:
+    """The query's embedding from the (name, runtime) model; callers get their own copy of the cached list."""
+    key = (name, runtime, text)
+    with _query_lock:
+        if key in _query_cache:
+            _query_cache.move_to_end(key)
+            _query_stats["hits"] += 1
+            return list(_query_cache[key])
+        _query_stats["misses"] += 1
+    vector = get_embedding_model(name, runtime).encode(text).tolist()
+    with _query_lock:
+        _query_cache[key] = vector
+        while len(_query_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return list(vector)
+
+def warm_up(name: str = EMBEDDING_MODEL, path: str = CHROMA_PERSIST_DIR, background: bool = True):
+    """Load the model and Chroma client and run one throwaway encode (first-call overhead)."""
+    def _run():
+        try:
+            start = time.perf_counter()
+            if VECTOR_BACKEND == "chromadb":
+                get_chroma_client(path)
+            get_embedding_model(name).encode("warm up")
+            _load_seconds["warm_up"] = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            print(f"Model warm-up failed: {e}")
+    if not background:
+        _run()
+        return None
+    thread = threading.Thread(target=_run, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def stats() -> dict:
+    return {
+        "loaded_models": list(_models),
+        "chroma_clients": list(_clients),
+        "load_seconds": dict(_load_seconds),
+        "query_cache_size": len(_query_cache),
+        **{f"query_cache_{k}": v for k, v in _query_stats.items()},
+    }
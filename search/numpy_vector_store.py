@@ -0,0 +1,344 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+import numpy as np
+from config import VECTOR_STORE_MAX_DEAD
+
+try:
+    import fcntl
+except ImportError:     # Windows: writers in one process are still serialised by _WRITE_LOCK
+    fcntl = None
+
+# Rows scored per matmul; bounds the float32 up-cast of the stored matrix and keeps it in cache
+_SCORE_CHUNK = 4096
+
+# Serialises writers within this process; the LOCK file's flock serialises processes. Readers never block.
+_WRITE_LOCK = threading.Lock()
+
+class NumpyVectorStore:
+    """
+    Exact cosine search over a memory-mapped embedding matrix.
+
+    A drop-in for the subset of the Chroma collection API VectorAlarmIndex
+    uses (count/get/upsert/delete/query). Embeddings are L2-normalised and
+    stored as float16, or as int8 with a per-row scale; search is a
+    brute-force matrix product with argpartition top-k and a boolean
+    machine mask.
+
+    Layout under store_dir/gen-<n>/:
+      rows.jsonl   header line (version, dtype, dim), then one line per row
+                   ({"id", "metadata"}) or per delete ({"delete": [ids]})
+      vectors.bin  rows x dim, float16 or int8, raw
+      scales.bin   float32 per row (int8 only)
+    CURRENT holds "gen-<n> <rows> <bytes of rows.jsonl>": how much of the
+    generation is committed. upsert() and delete() append past that point
+    and then replace CURRENT atomically, so a write costs the size of its
+    batch and readers only ever see whole writes; a refresh reads just the
+    new log lines. A later row replaces an earlier one with the same id.
+    Replaced and deleted rows stay in the files, masked out, until they
+    exceed max_dead of the generation; the write that crosses it compacts
+    the live rows into a new generation. Writers hold a thread lock and an
+    flock on store_dir/LOCK, as PersistentBM25Index does, so the app, the
+    pipeline and the background indexer can share one store.
+    """
+    VERSION = 2
+
+    def __init__(self, store_dir: str, dtype: str = "float16", max_dead: float = VECTOR_STORE_MAX_DEAD):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported vector store dtype: {dtype}")
+        self.store_dir = store_dir
+        self.dtype = dtype
+        self.max_dead = max_dead
+        os.makedirs(store_dir, exist_ok=True)
+        self.generation = None
+        self._reset()
+        self._load()
+
+    # ── Loading ─────────────────────────────────────────────────────
+
+    def _current(self) -> str:
+        try:
+            with open(os.path.join(self.store_dir, "CURRENT")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _parse(current: str) -> tuple:
+        """(generation, committed rows, committed log bytes); rows is None for a version 1 (.npy) generation."""
+        parts = (current or "").split()
+        if not parts:
+            return None, 0, 0
+        if len(parts) == 1:
+            return parts[0], None, None
+        return parts[0], int(parts[1]), int(parts[2])
+
+    def _reset(self):
+        self.header = None           # rows.jsonl header of an appendable generation
+        self.ids, self.metadatas, self.row_of = [], [], {}
+        self.vectors, self.scales = None, None
+        self.live = np.zeros(0, dtype=bool)
+        self.machine_codes, self.machines = np.zeros(0, dtype=np.int32), {}
+
+    def _load(self):
+        for _ in range(3):
+            try:
+                return self._load_current()
+            except FileNotFoundError:
+                continue    # compacted away between reading CURRENT and opening it; read CURRENT again
+        raise RuntimeError(f"Vector store at {self.store_dir} keeps changing while loading")
+
+    def _load_current(self):
+        current = self._current()
+        gen, rows, size = self._parse(current)
+        loaded, _, loaded_size = self._parse(self.generation)
+        if rows is not None and gen == loaded and self.header is not None and size >= loaded_size:
+            self._read_log(gen, loaded_size, size)        # appended to since: only the new lines
+        else:
+            self._reset()
+            if gen is not None and rows is None:
+                self._load_npy(gen)
+            elif gen is not None:
+                self._read_log(gen, 0, size)
+        self.generation = current
+        if self.header is not None:
+            path = os.path.join(self.store_dir, gen)
+            dim = self.header["dim"]
+            self.vectors = (np.memmap(os.path.join(path, "vectors.bin"), self.dtype, "r", shape=(rows, dim))
+                            if rows else np.zeros((0, dim), dtype=self.dtype))
+            if self.dtype == "int8":
+                self.scales = (np.memmap(os.path.join(path, "scales.bin"), np.float32, "r", shape=(rows,))
+                               if rows else np.zeros(0, dtype=np.float32))
+
+    def _read_log(self, gen: str, start: int, end: int):
+        with open(os.path.join(self.store_dir, gen, "rows.jsonl"), "rb") as f:
+            f.seek(start)
+            lines = f.read(end - start).decode("utf-8").splitlines()
+        if start == 0:
+            header = json.loads(lines.pop(0))
+            if header.get("version") != self.VERSION or header.get("dtype") != self.dtype:
+                print(f"Vector store generation {gen} has another version/dtype; ignoring it")
+                return
+            self.header = header
+        self._apply([json.loads(line) for line in lines])
+
+    def _load_npy(self, gen: str):
+        """A generation written before rows were appended in place; the next write compacts it."""
+        path = os.path.join(self.store_dir, gen)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != 1 or meta.get("dtype") != self.dtype:
+            print(f"Vector store at {path} has another version/dtype; ignoring it")
+            return
+        self._apply([{"id": i, "metadata": m} for i, m in zip(meta["ids"], meta["metadatas"])])
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        if self.dtype == "int8":
+            self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+
+    def _apply(self, entries: list):
+        """Add log entries (rows and deletes), in order, to the in-memory index."""
+        first, dead = len(self.ids), []
+        for e in entries:
+            if "delete" in e:
+                dead.extend(n for n in (self.row_of.pop(i, None) for i in e["delete"]) if n is not None)
+                continue
+            if e["id"] in self.row_of:
+                dead.append(self.row_of[e["id"]])
+            self.row_of[e["id"]] = len(self.ids)
+            self.ids.append(e["id"])
+            self.metadatas.append(e["metadata"])
+        added = self.metadatas[first:]
+        self.live = np.concatenate([self.live, np.ones(len(added), dtype=bool)])
+        self.live[dead] = False
+        codes = [self.machines.setdefault(m.get("machine", ""), len(self.machines)) for m in added]
+        self.machine_codes = np.concatenate([self.machine_codes, np.array(codes, dtype=np.int32)])
+
+    def _refresh(self):
+        if self._current() != self.generation:
+            self._load()
+
+    def count(self) -> int:
+        self._refresh()
+        return len(self.row_of)
+
+    # ── Encoding ────────────────────────────────────────────────────
+
+    def _quantise(self, embeddings) -> tuple:
+        x = np.asarray(embeddings, dtype=np.float32)
+        x = x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+        if self.dtype == "float16":
+            return x.astype(np.float16), None
+        scale = np.maximum(np.abs(x).max(axis=1), 1e-12) / 127
+        return np.round(x / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+
+    def _dequantise(self, rows) -> np.ndarray:
+        x = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            x *= np.asarray(self.scales[rows])[:, None]
+        return x
+
+    # ── Chroma-compatible interface ─────────────────────────────────
+
+    def get(self, ids: list, include: list = None) -> dict:
+        self._refresh()
+        found = [i for i in ids if i in self.row_of]
+        return {"ids": found, "metadatas": [self.metadatas[self.row_of[i]] for i in found]}
+
+    def upsert(self, ids: list, embeddings: list, metadatas: list, documents: list = None):
+        """Insert or replace rows by id; documents are accepted for API parity but not stored."""
+        if not ids: return
+        vectors, scales = self._quantise(embeddings)
+        with self._locked():
+            self._refresh()
+            if self.vectors is not None and self.vectors.shape[1] != vectors.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match stored {self.vectors.shape[1]}")
+            if self.header is None:
+                # No generation yet, or a version 1 one: start an appendable generation from its rows
+                self._compact(vectors.shape[1])
+            self._append([{"id": i, "metadata": m} for i, m in zip(ids, metadatas)], vectors, scales)
+
+    def delete(self, ids: list = None, where: dict = None):
+        """Remove the rows matching both the ids and the where (field: value pairs) given."""
+        if ids is None and not where: return
+        with self._locked():
+            self._refresh()
+            wanted = None if ids is None else set(ids)
+            gone = [i for i, n in self.row_of.items()
+                    if (wanted is None or i in wanted) and all(self.metadatas[n].get(k) == v for k, v in (where or {}).items())]
+            if not gone: return
+            if self.header is None:
+                self._compact(self.vectors.shape[1])
+            self._append([{"delete": gone}])
+
+    def query(self, query_embeddings: list, n_results: int = 10, where: dict = None, include: list = None) -> dict:
+        """Chroma-shaped result: per query, metadatas and cosine distances (1 - similarity)."""
+        self._refresh()
+        out = {"ids": [], "metadatas": [], "distances": []}
+        for q in query_embeddings:
+            ranked = self.top_k(q, n_results, (where or {}).get("machine"))
+            out["ids"].append([self.ids[r] for r, _ in ranked])
+            out["metadatas"].append([self.metadatas[r] for r, _ in ranked])
+            out["distances"].append([1 - s for _, s in ranked])
+        return out
+
+    # ── Searching ───────────────────────────────────────────────────
+
+    def mask_for(self, machine: str) -> np.ndarray:
+        code = self.machines.get(machine)
+        if code is None:
+            return np.zeros(len(self.ids), dtype=bool)
+        return self.machine_codes == code
+
+    def scores(self, query_embedding, rows: np.ndarray = None) -> np.ndarray:
+        """Cosine similarity for every row, or only for the given row numbers."""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        n = len(self.ids) if rows is None else len(rows)
+        out = np.empty(n, dtype=np.float32)
+        for start in range(0, n, _SCORE_CHUNK):
+            part = slice(start, start + _SCORE_CHUNK)
+            out[part] = self._dequantise(part if rows is None else rows[part]) @ q
+        return out
+
+    def top_k(self, query_embedding, top_k: int = 10, machine: str = None) -> list:
+        """[(row, cosine similarity)] ranked by similarity, then by row order."""
+        if not self.row_of or top_k <= 0:
+            return []
+        if machine or not self.live.all():
+            # Only the machine's live rows are scored
+            mask = self.live & self.mask_for(machine) if machine else self.live
+            rows = np.flatnonzero(mask)
+            scores = self.scores(query_embedding, rows)
+        else:
+            scores = self.scores(query_embedding)
+            rows = np.arange(len(scores))
+        if len(rows) > top_k:
+            kth = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+            cand = scores >= kth
+            rows, scores = rows[cand], scores[cand]
+        order = np.lexsort((rows, -scores))[:top_k]
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    # ── Writing ─────────────────────────────────────────────────────
+
+    @contextmanager
+    def _locked(self):
+        with _WRITE_LOCK, open(os.path.join(self.store_dir, "LOCK"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _append(self, entries: list, vectors: np.ndarray = None, scales: np.ndarray = None):
+        """Write entries (and their rows) past the committed end of the live generation, then commit them."""
+        gen, rows, size = self._parse(self.generation)
+        path = os.path.join(self.store_dir, gen)
+        if vectors is not None:
+            _write_at(os.path.join(path, "vectors.bin"), rows * vectors[0].nbytes, vectors.tobytes())
+            if scales is not None:
+                _write_at(os.path.join(path, "scales.bin"), rows * 4, scales.tobytes())
+        log = "".join(json.dumps(e) + "\n" for e in entries).encode("utf-8")
+        _write_at(os.path.join(path, "rows.jsonl"), size, log)
+        self._set_current(f"{gen} {rows + (0 if vectors is None else len(vectors))} {size + len(log)}")
+        self._load()
+        if len(self.ids) - len(self.row_of) > self.max_dead * len(self.ids):
+            self._compact()
+
+    def compact(self):
+        """Rewrite the live rows into a new generation, dropping replaced and deleted ones."""
+        with self._locked():
+            self._refresh()
+            if self.vectors is not None:
+                self._compact()
+
+    def _compact(self, dim: int = None):
+        previous, _, _ = self._parse(self.generation)
+        gen = f"gen-{int(previous.split('-')[1]) + 1 if previous else 1}"
+        path = os.path.join(self.store_dir, gen)
+        os.makedirs(path, exist_ok=True)
+        rows = np.flatnonzero(self.live)
+        dim = self.vectors.shape[1] if self.vectors is not None else dim
+        vectors = np.asarray(self.vectors[rows]) if self.vectors is not None else np.zeros((0, dim), self.dtype)
+        with open(os.path.join(path, "vectors.bin"), "wb") as f:
+            f.write(vectors.tobytes())
+        if self.dtype == "int8":
+            scales = np.asarray(self.scales[rows]) if self.scales is not None else np.zeros(0, np.float32)
+            with open(os.path.join(path, "scales.bin"), "wb") as f:
+                f.write(scales.astype(np.float32).tobytes())
+        entries = [{"version": self.VERSION, "dtype": self.dtype, "dim": int(dim)}]
+        entries += [{"id": self.ids[n], "metadata": self.metadatas[n]} for n in rows]
+        log = "".join(json.dumps(e) + "\n" for e in entries).encode("utf-8")
+        with open(os.path.join(path, "rows.jsonl"), "wb") as f:
+            f.write(log)
+        self._set_current(f"{gen} {len(rows)} {len(log)}")
+        if previous:
+            self._remove_generation(previous)
+        self._load()
+
+    def _set_current(self, current: str):
+        tmp = os.path.join(self.store_dir, "CURRENT.tmp")
+        with open(tmp, "w") as f:
+            f.write(current)
+        os.replace(tmp, os.path.join(self.store_dir, "CURRENT"))
+
+    def _remove_generation(self, gen: str):
+        path = os.path.join(self.store_dir, gen)
+        try:
+            for name in os.listdir(path):
+                os.remove(os.path.join(path, name))
+            os.rmdir(path)
+        except OSError:
+            # Still memory-mapped somewhere (Windows); cleaned up by a later write
+            pass
+
+
+def _write_at(path: str, offset: int, data: bytes):
+    """Write data at offset, dropping anything an interrupted writer left past it."""
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(data)
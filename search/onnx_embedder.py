@@ -0,0 +1,145 @@
+"""
+Quantised ONNX inference path for sentence-transformers embedding models.
+
+The first use exports the model's transformer to ONNX, applies int8
+dynamic quantisation and checks the result against the PyTorch model on
+a set of probe sentences. The export directory keeps the tokenizer and
+pooling settings, so later processes run on onnxruntime alone, without
+importing torch. If the int8 model drifts past ONNX_MIN_COSINE, the
+unquantised ONNX model is used instead.
+"""
+import os
+import json
+import numpy as np
+from config import ONNX_MODEL_DIR, ONNX_THREADS, ONNX_MIN_COSINE, EMBEDDING_BATCH_SIZE
+
+PROBE_SENTENCES = [
+    "Motor overtemperature on main drive",
+    "Oil pressure 0.5 bar below setpoint P0243",
+    "Emergency stop pressed at infeed conveyor",
+    "Servo encoder communication timeout axis 3",
+    "Capper torque out of range, check clutch",
+    "Low air pressure in pneumatic supply",
+    "Label missing detected by camera inspection",
+    "PLC watchdog fault, restart controller",
+]
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return (a * b).sum(axis=1)
+
+def export_model(model_name: str, out_dir: str) -> dict:
+    """Export, quantise and validate model_name into out_dir; returns the saved settings."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    pooling = next((m for m in st_model if type(m).__name__ == "Pooling"), None)
+    if pooling is None or not (pooling.pooling_mode_mean_tokens or pooling.pooling_mode_cls_token):
+        raise ValueError(f"{model_name}: only mean or CLS pooling can run on ONNX")
+    settings = {
+        "model": model_name,
+        "pooling": "mean" if pooling.pooling_mode_mean_tokens else "cls",
+        "normalize": any(type(m).__name__ == "Normalize" for m in st_model),
+        "max_seq_length": st_model.max_seq_length,
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    transformer.tokenizer.save_pretrained(out_dir)
+    sample = transformer.tokenizer(PROBE_SENTENCES[:2], padding=True, return_tensors="pt")
+    input_names = list(sample.keys())
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    auto_model = transformer.auto_model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            auto_model, (dict(sample),), fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={**{n: {0: "batch", 1: "seq"} for n in input_names},
+                          "last_hidden_state": {0: "batch", 1: "seq"}},
+            opset_version=14,
+        )
+    int8_path = os.path.join(out_dir, "model.int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    reference = st_model.encode(PROBE_SENTENCES, convert_to_numpy=True)
+    settings["file"] = "model.int8.onnx"
+    cosine = float(_cosine_rows(OnnxEmbedder(model_name, out_dir, settings=settings).encode(PROBE_SENTENCES),
+                                reference).min())
+    if cosine < ONNX_MIN_COSINE:
+        print(f"int8 ONNX {model_name} min cosine {cosine:.4f} < {ONNX_MIN_COSINE}; using the fp32 ONNX model")
+        settings["file"] = "model.onnx"
+        cosine = float(_cosine_rows(OnnxEmbedder(model_name, out_dir, settings=settings).encode(PROBE_SENTENCES),
+                                    reference).min())
+        if cosine < ONNX_MIN_COSINE:
+            raise ValueError(f"ONNX export of {model_name} differs from PyTorch (min cosine {cosine:.4f})")
+    settings["min_cosine"] = round(cosine, 6)
+    with open(os.path.join(out_dir, "settings.json"), "w") as f:
+        json.dump(settings, f, indent=2)
+    return settings
+
+class OnnxEmbedder:
+    """
+    SentenceTransformer-compatible encode() on onnxruntime (CPU).
+    Exports on first use; intra-op threads come from ONNX_THREADS
+    (0 lets onnxruntime use one per physical core).
+    """
+    runtime = "onnx"
+
+    def __init__(self, model_name: str, model_dir: str = None, threads: int = ONNX_THREADS, settings: dict = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = model_dir or os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+        if settings is None:
+            path = os.path.join(self.model_dir, "settings.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    settings = json.load(f)
+            else:
+                settings = export_model(model_name, self.model_dir)
+        self.settings = settings
+        # Cached embeddings are keyed per runtime so torch and ONNX vectors never mix
+        self.cache_key = f"{model_name}:onnx:{settings['file']}"
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(os.path.join(self.model_dir, settings["file"]), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _encode_batch(self, texts: list) -> np.ndarray:
+        enc = self.tokenizer(texts, padding=True, truncation=True,
+                             max_length=self.settings["max_seq_length"], return_tensors="np")
+        feed = {n: enc[n].astype(np.int64) for n in self.input_names}
+        hidden = self.session.run(["last_hidden_state"], feed)[0]
+        if self.settings["pooling"] == "cls":
+            out = hidden[:, 0]
+        else:
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            out = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.settings["normalize"]:
+            out = out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = EMBEDDING_BATCH_SIZE, **kwargs) -> np.ndarray:
+        """Same shapes as SentenceTransformer.encode: a string gives a vector, a list a matrix."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Length-sorted batches keep padding (and wasted compute) low
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            for i, vec in zip(idx, self._encode_batch([texts[i] for i in idx])):
+                out[i] = vec
+        out = np.stack(out)
+        return out[0] if single else out
@@ -0,0 +1,143 @@
+"""
+Hybrid alarm search: BM25 and vector retrieval (plus optional graph
+expansion) fanned out in parallel and merged with reciprocal rank fusion.
+
+Each backend returns a ranked list keyed by (machine, alarm_id); a hit's
+fused score is sum(1 / (RRF_K + rank)) over the lists it appears in.
+Backends share one deadline, so a query costs about as much as its
+slowest backend, and one that misses the deadline is dropped from the
+fusion rather than stalling the query.
+
+Every backend has its own pool of SEARCH_WORKERS threads. A timed-out
+task keeps running in the background but only holds a thread of its own
+backend, and a backend whose threads are all still busy is skipped (as
+timed out) instead of queueing, so a stuck vector search never delays
+BM25.
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from config import SEARCH_BACKEND_TIMEOUT, SEARCH_WORKERS, RRF_K
+from core.tagger import get_tagger
+
+# Backend name -> (executor, free worker slots), shared by every query in the process
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def _pool(backend: str) -> tuple:
+    with _POOLS_LOCK:
+        if backend not in _POOLS:
+            _POOLS[backend] = (ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix=f"search-{backend}"),
+                               threading.BoundedSemaphore(SEARCH_WORKERS))
+        return _POOLS[backend]
+
+def rrf_fuse(ranked_lists: dict, top_k: int, k: int = RRF_K) -> list:
+    """
+    ranked_lists: backend -> [(machine, alarm_id)] best first.
+    Returns [{machine, alarm_id, score, ranks}] by fused score, then best
+    single rank, then key, so equal inputs always give the same order.
+    """
+    fused = {}
+    for backend, keys in ranked_lists.items():
+        rank = 0
+        seen = set()
+        for key in keys:
+            if key in seen: continue
+            seen.add(key)
+            rank += 1
+            hit = fused.setdefault(key, {"machine": key[0], "alarm_id": key[1], "score": 0.0, "ranks": {}})
+            hit["score"] += 1.0 / (k + rank)
+            hit["ranks"][backend] = rank
+    hits = sorted(fused.values(), key=lambda h: (-h["score"], min(h["ranks"].values()), h["machine"], str(h["alarm_id"])))
+    for h in hits:
+        h["score"] = round(h["score"], 6)
+    return hits[:top_k]
+
+class HybridSearchService:
+    """
+    Unified search over the BM25 index, the vector index and (optionally)
+    the alarm graph. Backends may be passed in or are created on first use
+    inside the worker thread (the vector index by vector_factory when
+    given), so a cold embedding model counts against the vector backend's
+    deadline instead of blocking the caller.
+    """
+    def __init__(self, bm25=None, vector=None, graph=None, timeout: float = SEARCH_BACKEND_TIMEOUT, rrf_k: int = RRF_K,
+                 vector_factory=None):
+        self.bm25 = bm25
+        self.vector = vector
+        self.vector_factory = vector_factory
+        self.graph = graph
+        self.timeout = timeout
+        self.rrf_k = rrf_k
+
+    # ── Backends ────────────────────────────────────────────────────
+
+    def _bm25(self, query: str, depth: int, machine: str) -> list:
+        if self.bm25 is None:
+            from search.bm25_index import PersistentBM25Index
+            self.bm25 = PersistentBM25Index()
+        return [(h["machine"], h["alarm_id"]) for h in self.bm25.search_hits(query, top_k=depth, machine=machine)]
+
+    def _vector(self, query: str, depth: int, machine: str) -> list:
+        if self.vector is None:
+            if self.vector_factory is None:
+                from search.vector_index import VectorAlarmIndex
+                self.vector_factory = VectorAlarmIndex
+            self.vector = self.vector_factory()
+        return [(h["machine"], h["alarm_id"]) for h in self.vector.search(query, top_k=depth, machine=machine)]
+
+    def _graph(self, query: str, depth: int, machine: str) -> list:
+        components = get_tagger().tag(query)["component"]
+        out = []
+        for m, aid, _ in self.graph.alarms_for_components(components):
+            m = "" if m == "unknown" else m    # the graph stores a missing machine as "unknown"
+            if machine and m != machine: continue
+            out.append((m, aid))
+            if len(out) == depth: break
+        return out
+
+    # ── Public interface ────────────────────────────────────────────
+
+    def search(self, query: str, top_k: int = 10, machine: str = None, expand_graph: bool = False) -> dict:
+        """
+        Returns {"hits": [{machine, alarm_id, score, ranks}], "timings_ms": {backend: ms},
+        "timed_out": [backend], "errors": {backend: message}}.
+        """
+        depth = max(top_k * 3, 20)
+        tasks = {"bm25": self._bm25, "vector": self._vector}
+        if expand_graph and self.graph is not None:
+            tasks["graph"] = self._graph
+
+        def timed(fn):
+            start = time.perf_counter()
+            result = fn(query, depth, machine)
+            return result, (time.perf_counter() - start) * 1000
+
+        futures, timed_out = {}, []
+        for name, fn in tasks.items():
+            executor, slots = _pool(name)
+            if not slots.acquire(blocking=False):
+                timed_out.append(name)      # every thread still busy with earlier timed-out queries
+                continue
+            futures[name] = executor.submit(timed, fn)
+            futures[name].add_done_callback(lambda _, slots=slots: slots.release())
+        wait(list(futures.values()), timeout=self.timeout)
+
+        ranked, timings, errors = {}, {}, {}
+        for name, fut in futures.items():
+            if not fut.done():
+                fut.cancel()
+                timed_out.append(name)
+                continue
+            try:
+                ranked[name], timings[name] = fut.result()
+                timings[name] = round(timings[name], 2)
+            except Exception as e:
+                print(f"{name} search failed: {e}")
+                errors[name] = str(e)
+        return {
+            "hits": rrf_fuse(ranked, top_k, self.rrf_k),
+            "timings_ms": timings,
+            "timed_out": timed_out,
+            "errors": errors,
+        }
@@ -0,0 +1,82 @@
+import bisect
+import heapq
+from collections import Counter
+from search.analyzer import surface_terms, normalize_alarm_id
+
+class PrefixIndex:
+    """
+    Static prefix index for search-as-you-type.
+
+    Keys live in one sorted list (an FST-style flat layout rather than a
+    node-per-character trie), so a prefix maps to a contiguous range found
+    with two bisects. Ranges for 1-2 character prefixes are the only large
+    ones; their top completions are precomputed at build time.
+    """
+    PRECOMPUTED_PREFIX_LEN = 2
+
+    def __init__(self, entries: list, top_k: int = 10):
+        """entries: (key, weight, suggestion) tuples; keys are matched lowercase."""
+        entries = sorted(entries, key=lambda e: e[0])
+        self.keys = [e[0] for e in entries]
+        self.weights = [e[1] for e in entries]
+        self.values = [e[2] for e in entries]
+        self.top_k = top_k
+        self.precomputed = {}
+        prefixes = {k[:n] for k in self.keys for n in range(1, self.PRECOMPUTED_PREFIX_LEN + 1)}
+        for p in prefixes:
+            self.precomputed[p] = self._rank(p, top_k)
+
+    def _range(self, prefix: str) -> tuple:
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\uffff", lo)
+        return lo, hi
+
+    def _rank(self, prefix: str, limit: int) -> list:
+        lo, hi = self._range(prefix)
+        best = heapq.nsmallest(limit * 2, range(lo, hi), key=lambda i: (-self.weights[i], self.keys[i]))
+        out, seen = [], set()
+        for i in best:
+            # Several keys (e.g. "0282" and "282") can point at the same suggestion
+            if self.values[i] in seen: continue
+            seen.add(self.values[i])
+            out.append(self.values[i])
+            if len(out) == limit: break
+        return out
+
+    def suggest(self, prefix: str, limit: int = 8) -> list:
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        if limit <= self.top_k and prefix in self.precomputed:
+            return self.precomputed[prefix][:limit]
+        return self._rank(prefix, limit)
+
+
+class AlarmSuggester:
+    """Typeahead over alarm description/cause words and alarm IDs."""
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self.index = PrefixIndex([], top_k)
+
+    def build(self, alarm_records: list):
+        words = Counter()
+        entries = []
+        for r in alarm_records:
+            is_dict = isinstance(r, dict)
+            aid = r.get("alarm_id") if is_dict else r.alarm_id
+            machine = (r.get("machine") if is_dict else r.machine) or ""
+            desc = (r.get("description") if is_dict else r.description) or ""
+            cause = (r.get("cause") if is_dict else r.cause) or ""
+            words.update(t for t in surface_terms(f"{desc} {cause}") if len(t) > 2 and not t.isdigit())
+
+            label = f"{aid} · {machine}: {desc[:60]}" if machine else f"{aid}: {desc[:60]}"
+            # Alarm IDs outrank words and match both as written ("0282") and normalised ("282")
+            for key in {str(aid).lower(), normalize_alarm_id(aid)}:
+                entries.append((key, float("inf"), label))
+        entries.extend((w, n, w) for w, n in words.items())
+        self.index = PrefixIndex(entries, self.top_k)
+        return self
+
+    def suggest(self, prefix: str, limit: int = 8) -> list:
+        return self.index.suggest(prefix, limit)
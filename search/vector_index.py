@@ -1,24 +1,63 @@
-from sentence_transformers import SentenceTransformer
-import chromadb
-from config import CHROMA_PERSIST_DIR, EMBEDDING_MODEL
+from config import (CHROMA_PERSIST_DIR, EMBEDDING_MODEL, EMBEDDING_RUNTIME, EMBEDDING_BATCH_SIZE,
+                    EMBEDDING_CACHE_PATH, VECTOR_BACKEND, VECTOR_STORE_DIR, VECTOR_STORE_DTYPE)
+from search.embedding_cache import EmbeddingCache, text_hash
+from search import model_registry
 import os
 
+# Chroma rejects very large upserts; stay well below its limit. The numpy store
+# appends each upsert under a file lock, so it gets each add_alarms call in one.
+_UPSERT_BATCH = 1000
+
 class VectorAlarmIndex:
-    def __init__(self, persist_dir: str = CHROMA_PERSIST_DIR):
+    def __init__(self, persist_dir: str = None, backend: str = VECTOR_BACKEND):
+        self.backend = backend
+        self.model_name = EMBEDDING_MODEL
+        # Model and client are shared process-wide; constructing an index is cheap
+        self.model = model_registry.get_embedding_model(EMBEDDING_MODEL, EMBEDDING_RUNTIME)
+        # ONNX vectors are cached apart from PyTorch ones
+        self.cache_key = getattr(self.model, "cache_key", self.model_name)
+        # What actually loaded: an unavailable ONNX runtime falls back to PyTorch
+        self.runtime = getattr(self.model, "runtime", "torch")
+        self.cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
+        if backend == "numpy":
+            from search.numpy_vector_store import NumpyVectorStore
+            self.collection = NumpyVectorStore(persist_dir or VECTOR_STORE_DIR, VECTOR_STORE_DTYPE)
+            return
+        persist_dir = persist_dir or CHROMA_PERSIST_DIR
         os.makedirs(persist_dir, exist_ok=True)
-        self.model = SentenceTransformer(EMBEDDING_MODEL)
-        client = chromadb.PersistentClient(path=persist_dir)
+        client = model_registry.get_chroma_client(persist_dir)
         self.collection = client.get_or_create_collection(
             name="alarms",
             metadata={"hnsw:space": "cosine"}
         )
 
-    def add_alarms(self, alarm_records: list):
-        if not alarm_records: return
-        ids = []
-        docs = []
-        embs = []
-        metas = []
+    def count(self) -> int:
+        return self.collection.count()
+
+    def embed(self, texts: list) -> list:
+        """Embeddings for texts: cache hits first, the rest encoded in batches and cached."""
+        hashes = [text_hash(t) for t in texts]
+        cached = self.cache.get_many(self.cache_key, hashes)
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached:
+                missing[h] = t
+        if missing:
+            vectors = self.model.encode(list(missing.values()), batch_size=EMBEDDING_BATCH_SIZE)
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.cache_key, fresh)
+            cached.update(fresh)
+        return [cached[h].tolist() for h in hashes]
+
+    def add_alarms(self, alarm_records: list, force: bool = False) -> dict:
+        """
+        Upsert alarms into Chroma. Alarms whose stored metadata (including the
+        text hash, embedding model and runtime) is unchanged are skipped
+        unless force=True, so switching models re-embeds every row.
+        Returns counts of indexed and skipped alarms.
+        """
+        if not alarm_records: return {"indexed": 0, "skipped": 0}
+        entries, legacy = {}, set()
         for r in alarm_records:
             is_dict = isinstance(r, dict)
             desc = r.get('description','') if is_dict else r.description
@@ -26,39 +65,72 @@ class VectorAlarmIndex:
             machine = r.get('machine','') if is_dict else r.machine
             alarm_id = r.get('alarm_id','') if is_dict else r.alarm_id
             r2 = r.get('reason_level_2','') if is_dict else r.reason_level_2
-            
+            md5 = r.get('source_md5','') if is_dict else r.source_md5
+
             text = f"{desc} {cause}"
-            vector = self.model.encode(text).tolist()
-            ids.append(f"{machine or 'x'}_{alarm_id}")
-            docs.append(text)
-            embs.append(vector)
-            metas.append({
+            # One row per manual, so deleting a manual never drops a vector another one still holds
+            entries[f"{md5 or 'x'}_{machine or 'x'}_{alarm_id}"] = (text, {
                 "alarm_id": alarm_id,
                 "machine": machine or "",
                 "reason_2": r2 or "",
+                "source_md5": md5 or "",
+                "text_hash": text_hash(text),
+                "embedding_model": self.model_name,
+                "embedding_runtime": self.runtime,
             })
-            
-        self.collection.upsert(ids=ids, documents=docs, embeddings=embs, metadatas=metas)
+            legacy.add(f"{machine or 'x'}_{alarm_id}")
+
+        # Rows stored before IDs carried the source file are replaced by the rows above
+        stale = self.collection.get(ids=list(legacy), include=["metadatas"])["ids"]
+        if stale:
+            self.collection.delete(ids=stale)
+
+        ids = list(entries)
+        if not force:
+            stored = self.collection.get(ids=ids, include=["metadatas"])
+            unchanged = {i for i, m in zip(stored["ids"], stored["metadatas"]) if m == entries[i][1]}
+            ids = [i for i in ids if i not in unchanged]
+
+        batch_size = max(len(ids), 1) if self.backend == "numpy" else _UPSERT_BATCH
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            docs = [entries[i][0] for i in batch]
+            self.collection.upsert(
+                ids=batch,
+                documents=docs,
+                embeddings=self.embed(docs),
+                metadatas=[entries[i][1] for i in batch],
+            )
+        return {"indexed": len(ids), "skipped": len(entries) - len(ids)}
+
+    def delete(self, source_md5: str):
+        """Remove the rows indexed from this source file; other manuals keep their rows for the same alarms."""
+        self.collection.delete(where={"source_md5": source_md5})
 
     def search(self, query: str, top_k: int = 10, machine: str = None) -> list:
-        vector = self.model.encode(query).tolist()
+        vector = model_registry.encode_query(query, self.model_name, EMBEDDING_RUNTIME)
         where = {"machine": machine} if machine else None
-        
+
         try:
-            results = self.collection.query(
-                query_embeddings=[vector],
-                n_results=top_k,
-                where=where,
-                include=["metadatas", "distances"]
-            )
-            
-            if not results["metadatas"] or not results["metadatas"][0]:
-                return []
-                
-            out = []
-            for m, d in zip(results["metadatas"][0], results["distances"][0]):
-                out.append({"alarm_id": m["alarm_id"], "score": round(1 - d, 3)})
-            return out
+            # Several manuals can hold the same alarm: keep its best row, fetching deeper until top_k are distinct
+            n_results = top_k
+            while True:
+                results = self.collection.query(
+                    query_embeddings=[vector],
+                    n_results=n_results,
+                    where=where,
+                    include=["metadatas", "distances"]
+                )
+                metadatas = results["metadatas"][0] if results["metadatas"] else []
+                out, seen = [], set()
+                for m, d in zip(metadatas, results["distances"][0] if metadatas else []):
+                    key = (m.get("machine", ""), m["alarm_id"])
+                    if key in seen: continue
+                    seen.add(key)
+                    out.append({"alarm_id": m["alarm_id"], "machine": key[0], "score": round(1 - d, 3)})
+                if len(out) >= top_k or len(metadatas) < n_results:
+                    return out[:top_k]
+                n_results *= 2
         except Exception as e:
             print(f"Error querying chroma: {e}")
             return []
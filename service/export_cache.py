@@ -0,0 +1,73 @@
+"""
+Reuse of generated workbooks.
+
+An export is keyed by a SHA-1 of the machine, the phases, the tab layout
+(TEMPLATE_VERSION plus every tab's name and columns) and the content
+hashes of the records it is built from. The key is stored with the
+export in export_history, so an unchanged machine gets its previous file
+back instead of a new one. The cached workbooks in OUTPUT_DIR are
+trimmed after each new export: files older than EXPORT_CACHE_MAX_AGE_DAYS
+go first, then the least recently served until they fit in
+EXPORT_CACHE_MAX_MB. Only files export_history lists under a cache key
+are ever deleted; anything else in OUTPUT_DIR is left alone.
+"""
+import os
+import time
+import hashlib
+from config import OUTPUT_DIR, TEMPLATE_VERSION, EXPORT_CACHE_MAX_MB, EXPORT_CACHE_MAX_AGE_DAYS
+
+def export_cache_key(pe, phases: list) -> str:
+    """Hash of everything an export of PhaseEngine pe (which has a db) depends on; records are streamed, not loaded."""
+    from core.phase_engine import TABS
+    h = hashlib.sha1()
+    h.update(repr((pe.machine, sorted(phases), TEMPLATE_VERSION)).encode("utf-8"))
+    h.update(repr(sorted((name, spec.columns) for name, spec in TABS.items() if spec.phase in phases)).encode("utf-8"))
+    # Newest file first, as PhaseEngine reads them: that order decides which duplicate is exported
+    for md5 in pe._source_files():
+        h.update(md5.encode("utf-8"))
+        for collection in ("alarms", "parameters"):
+            h.update(b"|")
+            for ch in pe.db.content_hashes(collection, md5):
+                h.update((ch or "").encode("utf-8"))
+    return h.hexdigest()
+
+def cached_export(db, key: str) -> str:
+    """Path of a previous export with this key that is still on disk, else None."""
+    doc = db.find_export(key) if db is not None else None
+    if not doc:
+        return None
+    path = os.path.join(OUTPUT_DIR, doc["filename"])
+    if not os.path.exists(path):
+        return None
+    os.utime(path)    # served: the size-based eviction goes by least recent use
+    return path
+
+def evict_exports(db, max_mb: float = EXPORT_CACHE_MAX_MB, max_age_days: float = EXPORT_CACHE_MAX_AGE_DAYS,
+                  keep: str = None) -> int:
+    """Delete expired cached workbooks, then the least recently used until they fit; returns how many."""
+    if db is None:
+        return 0
+    files = []
+    for name in db.cached_export_files():
+        path = os.path.join(OUTPUT_DIR, name)
+        try:
+            st = os.stat(path)
+            files.append((st.st_mtime, st.st_size, path))
+        except FileNotFoundError:
+            pass
+    files.sort()
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        if path == keep:
+            continue
+        if mtime >= cutoff and total <= max_mb * 2 ** 20:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except OSError as e:
+            print(f"Could not evict {path}: {e}")
+    return removed
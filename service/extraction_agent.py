@@ -1,6 +1,7 @@
 import os
 from core.phase_engine import PhaseEngine
 from core.spreadsheet_generator import SpreadsheetGenerator
+from service.export_cache import export_cache_key, cached_export, evict_exports
 
 class ExtractionAgent:
     """
@@ -8,19 +9,40 @@ class ExtractionAgent:
     Receives JSON records from the Document Intelligence layer.
     Classifies document type, maps JSON fields to tab rows,
     and fills the schema per tab to generate the final .xlsx file.
+    With a db, tabs stream from the machine's stored records instead,
+    and an export whose inputs have not changed is served from the cache.
     """
-    def generate_excel(self, machine: str, source_text: str, alarms: list, parameters: list) -> str:
+    def __init__(self, db=None):
+        self.db = db
+        self.cache_hit = False
+
+    def generate_excel(self, machine: str, source_text: str, alarms: list, parameters: list,
+                       phases: list = (1, 2, 3)) -> str:
         # Step 1: Initialize PhaseEngine (maps JSON to tabs)
-        pe = PhaseEngine(machine, source_text, alarms, parameters)
-        
-        # Step 2: Build tab rows based on configurations (Phases 1, 2, 3 as per architecture)
-        tabs_data = pe.build(phases=[1, 2, 3])
+        pe = PhaseEngine(machine, source_text, alarms, parameters, db=self.db)
+
+        # Step 2: Same machine, phases, layout and records as a previous export: reuse its file
+        key = export_cache_key(pe, list(phases)) if self.db is not None else None
+        path = cached_export(self.db, key) if key else None
+        self.cache_hit = path is not None
+        if path:
+            return path
         
-        # Step 3: Populate Spreadsheet 
+        # Step 3: Tabs of the requested phases (1, 2, 3 as per architecture), headers first
         sg = SpreadsheetGenerator()
-        for tname, rows in tabs_data.items():
-            sg.populate_rows(tname, rows)
+        counts = {}
+        for tname in pe.tabs(list(phases)):
+            sg.add_sheet(tname, pe.columns(tname))
+            counts[tname] = 0
+
+        # Step 4: Populate Spreadsheet (one pass per collection, each row appended to its tab as it is generated)
+        for tname, row in pe.rows(list(phases)):
+            sg.append(tname, row)
+            counts[tname] += 1
             
-        # Step 4: Save & Return file path
-        out_path = sg.save(machine)
+        # Step 5: Save, record the export under its cache key, trim OUTPUT_DIR & return file path
+        out_path = sg.save(f"{machine}_{key[:8]}" if key else machine)    # the key keeps same-second exports apart
+        if self.db is not None:
+            self.db.log_export(machine, os.path.basename(out_path), list(counts), counts, cache_key=key)
+        evict_exports(self.db, keep=out_path)
         return out_path
@@ -0,0 +1,275 @@
+"""
+Live fault-code resolver for the MES.
+
+Answers "machine M raised fault 0282: which reasons and category?" from
+an in-memory hash table keyed by (machine, normalised alarm_id), instead
+of one Mongo find per fault. The table is loaded once from the alarms
+collection and then kept current:
+  - MongoDB replica sets: a change stream applies each insert, update
+    and delete as it happens;
+  - otherwise (standalone MongoDB, SQLite): the processed-file list is
+    polled every RESOLVER_POLL_SECONDS and only the source files that
+    were added, reprocessed or deleted are reloaded.
+
+Lookups never take a lock. Where several manuals hold the same key, the
+newest extraction wins, as in DatabaseManager.get_alarms_by_keys.
+
+Run as a local HTTP service:  python -m service.fault_resolver
+    GET  /resolve?machine=Filler_01&alarm_id=0282
+    POST /resolve   [{"machine": "Filler_01", "alarm_id": "282"}, ...]
+    GET  /stats
+"""
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from config import RESOLVER_HOST, RESOLVER_PORT, RESOLVER_POLL_SECONDS
+from search.analyzer import normalize_alarm_id
+
+RESOLVE_FIELDS = ("alarm_id", "machine", "description", "reason_level_1", "reason_level_2",
+                  "reason_level_3", "reason_level_4", "category_type")
+
+def resolver_key(machine, alarm_id) -> tuple:
+    return (machine or "", normalize_alarm_id(alarm_id))
+
+class FaultResolver:
+    def __init__(self, db=None, poll_seconds: float = RESOLVER_POLL_SECONDS):
+        self.db = db
+        self.poll_seconds = poll_seconds
+        self.table = {}          # key -> resolved record (the newest candidate)
+        self.candidates = {}     # key -> {(source_md5, _id): doc}
+        self.by_source = {}      # source_md5 -> set of keys
+        self.by_id = {}          # Mongo _id -> (key, candidate id), for change-stream deletes
+        self.files = {}          # source_md5 -> processed_at, as last seen by the poller
+        self.mode = "static"
+        self.stats_ = {"lookups": 0, "misses": 0, "updates": 0, "reloads": 0}
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ── Loading ─────────────────────────────────────────────────────
+
+    def _projection(self) -> dict:
+        return {f: 1 for f in RESOLVE_FIELDS + ("source_md5", "extracted_at")}
+
+    def load(self, docs=None) -> "FaultResolver":
+        """(Re)build the table from docs, or from every alarm in the database."""
+        if docs is None:
+            docs = self.db.get_alarms({}, self._projection(), use_cache=False) if self.db else []
+            if self.db:
+                self.files = self._processed_files()
+        # Built aside and swapped in, so lookups never see a half-loaded table
+        fresh = FaultResolver()
+        for doc in docs:
+            fresh._put(doc)
+        with self._write_lock:
+            self.table, self.candidates, self.by_source, self.by_id = (
+                fresh.table, fresh.candidates, fresh.by_source, fresh.by_id)
+            self.stats_["reloads"] += 1
+        return self
+
+    def _put(self, doc: dict):
+        key = resolver_key(doc.get("machine"), doc.get("alarm_id"))
+        md5 = doc.get("source_md5") or ""
+        cid = (md5, doc.get("_id"))
+        if "_id" in doc:
+            old = self.by_id.get(doc["_id"])
+            if old and old != (key, cid):
+                self._drop(*old)      # the document's machine, alarm_id or source file changed
+            self.by_id[doc["_id"]] = (key, cid)
+        self.candidates.setdefault(key, {})[cid] = doc
+        self.by_source.setdefault(md5, set()).add(key)
+        self._settle(key)
+
+    def _drop(self, key: tuple, cid: tuple):
+        docs = self.candidates.get(key)
+        if docs is None: return
+        docs.pop(cid, None)
+        if not docs:
+            del self.candidates[key]
+        self._settle(key)
+
+    def _settle(self, key: tuple):
+        docs = self.candidates.get(key)
+        if not docs:
+            self.table.pop(key, None)
+            return
+        newest = max(docs.values(), key=lambda d: str(d.get("extracted_at") or ""))
+        self.table[key] = {f: newest.get(f) for f in RESOLVE_FIELDS}
+
+    def _remove_source(self, md5: str):
+        for key in self.by_source.pop(md5, set()):
+            docs = self.candidates.get(key, {})
+            for cid in [c for c in docs if c[0] == md5]:
+                self.by_id.pop(cid[1], None)
+                docs.pop(cid)
+            if not docs:
+                self.candidates.pop(key, None)
+            self._settle(key)
+
+    # ── Lookups ─────────────────────────────────────────────────────
+
+    def resolve(self, machine: str, alarm_id) -> dict:
+        """The alarm's reason levels and category, or None. Falls back to alarms stored without a machine."""
+        key = resolver_key(machine, alarm_id)
+        hit = self.table.get(key)
+        if hit is None and key[0]:
+            hit = self.table.get(("", key[1]))
+        self.stats_["lookups"] += 1
+        if hit is None:
+            self.stats_["misses"] += 1
+        return hit
+
+    def resolve_many(self, pairs: list) -> list:
+        """resolve() for each (machine, alarm_id) pair, in order."""
+        table = self.table
+        out = []
+        for machine, alarm_id in pairs:
+            key = resolver_key(machine, alarm_id)
+            hit = table.get(key)
+            if hit is None and key[0]:
+                hit = table.get(("", key[1]))
+            out.append(hit)
+        self.stats_["lookups"] += len(out)
+        self.stats_["misses"] += out.count(None)
+        return out
+
+    def stats(self) -> dict:
+        return dict(self.stats_, keys=len(self.table), sources=len(self.by_source), mode=self.mode)
+
+    # ── Refresh ─────────────────────────────────────────────────────
+
+    def start(self) -> "FaultResolver":
+        """Load, then follow changes in a daemon thread (change stream, else polling)."""
+        target, self.mode = self._poll, "polling"
+        if self.db is not None and self.db.client and not self.db.sqlite:
+            try:
+                # Opened before the load so no change falls between the two; replays are idempotent
+                stream = self.db.alarms.watch(full_document="updateLookup")
+                target, self.mode = (lambda: self._follow(stream)), "change_stream"
+            except Exception as e:
+                print(f"Change streams unavailable ({e}). Polling every {self.poll_seconds}s instead.")
+        self.load()
+        self._thread = threading.Thread(target=target, daemon=True, name="fault-resolver")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _follow(self, stream):
+        with stream:
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is None:
+                    time.sleep(0.05)
+                    continue
+                if not self.apply_change(change):
+                    break
+        if not self._stop.is_set():
+            print("Alarm change stream closed. Reloading and polling instead.")
+            self.mode = "polling"
+            self.load()
+            self._poll()
+
+    def apply_change(self, change: dict) -> bool:
+        """Apply one change-stream event; False when the stream is no longer usable (collection dropped)."""
+        op = change.get("operationType")
+        with self._write_lock:
+            if op in ("insert", "update", "replace") and change.get("fullDocument"):
+                self._put(change["fullDocument"])
+            elif op == "delete":
+                old = self.by_id.pop(change["documentKey"]["_id"], None)
+                if old:
+                    self._drop(*old)
+            elif op in ("drop", "dropDatabase", "invalidate"):
+                return False
+            self.stats_["updates"] += 1
+        return True
+
+    def _processed_files(self) -> dict:
+        # Uncached: the app writes from another process, whose writes never invalidate this one's cache
+        return {f["md5"]: str(f.get("processed_at"))
+                for f in self.db.get_all_processed_files(use_cache=False) if f.get("md5")}
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Fault resolver refresh failed: {e}")
+
+    def refresh(self) -> int:
+        """Reload the source files added, reprocessed or deleted since the last look; returns how many."""
+        files = self._processed_files()
+        changed = [m for m in files.keys() | self.files.keys() if files.get(m) != self.files.get(m)]
+        for md5 in changed:
+            docs = self.db.get_alarms({"source_md5": md5}, self._projection(), use_cache=False) if md5 in files else []
+            with self._write_lock:
+                self._remove_source(md5)
+                for doc in docs:
+                    self._put(doc)
+                self.stats_["updates"] += 1
+        self.files = files
+        return len(changed)
+
+
+# ── HTTP endpoint ───────────────────────────────────────────────────
+
+def make_handler(resolver: FaultResolver):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"     # keep-alive: an MES client reuses one connection
+        disable_nagle_algorithm = True    # headers and body go out in separate writes
+
+        def _send(self, status: int, payload):
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                return self._send(200, resolver.stats())
+            if url.path != "/resolve":
+                return self._send(404, {"error": "not found"})
+            q = parse_qs(url.query)
+            if "alarm_id" not in q:
+                return self._send(400, {"error": "alarm_id is required"})
+            hit = resolver.resolve(q.get("machine", [""])[0], q["alarm_id"][0])
+            self._send(200 if hit else 404, hit or {"error": "unknown alarm"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/resolve":
+                return self._send(404, {"error": "not found"})
+            try:
+                items = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+                pairs = [(i.get("machine"), i["alarm_id"]) for i in items]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                return self._send(400, {"error": "expected a JSON list of {machine, alarm_id}"})
+            self._send(200, resolver.resolve_many(pairs))
+
+        def log_message(self, *args):
+            pass    # one line per lookup would dominate the service's cost
+    return Handler
+
+def serve(resolver: FaultResolver, host: str = RESOLVER_HOST, port: int = RESOLVER_PORT) -> ThreadingHTTPServer:
+    """A started HTTP server (in a daemon thread) answering from resolver."""
+    server = ThreadingHTTPServer((host, port), make_handler(resolver))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="fault-resolver-http").start()
+    return server
+
+if __name__ == "__main__":
+    from core.database import DatabaseManager
+    resolver = FaultResolver(DatabaseManager()).start()
+    server = serve(resolver)
+    print(f"Fault resolver on http://{RESOLVER_HOST}:{RESOLVER_PORT} ({resolver.stats()})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,96 @@
+"""
+Benchmark FaultAnalytics backends across dataset sizes.
+
+  raw     — FaultAnalytics over every alarm document (pre-rollup behaviour)
+  rollups — FaultAnalytics.from_rollups (ANALYTICS_BACKEND=local)
+  mongo   — MongoFaultAnalytics aggregation pipelines (ANALYTICS_BACKEND=mongo)
+  columnar — FaultAnalytics over the Arrow snapshot (ANALYTICS_BACKEND=columnar),
+             synced from the alarms once, then loaded as each render would
+
+Needs a running MongoDB; writes to a throwaway database (o3sigma_bench).
+Usage: python tests/bench_analytics.py [size ...]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import datetime
+
+os.environ.setdefault("MONGODB_DATABASE", "o3sigma_bench")
+os.environ.setdefault("ANALYTICS_STORE_DIR", "./analytics_store_bench")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.database import DatabaseManager
+from analytics.fault_analytics import FaultAnalytics
+from analytics.mongo_analytics import MongoFaultAnalytics
+from analytics.columnar_store import ColumnarAlarmStore
+from config import REASON_LEVEL_1_CATEGORIES, ANALYTICS_STORE_DIR
+
+REASON_2 = ["Electrical", "Mechanical", "Sensor/Instrumentation", "Software/Control", "Process/Quality", None]
+METHODS = ["top_fault_categories", "electrical_fault_rate", "monthly_alarm_trend", "unclassified_alarms"]
+
+def synthetic_alarms(n: int) -> list:
+    rnd = random.Random(n)
+    docs = []
+    for i in range(n):
+        docs.append({
+            "alarm_id": str(i).zfill(4),
+            "description": f"Synthetic alarm {i}",
+            "reason_level_1": rnd.choice(REASON_LEVEL_1_CATEGORIES + [None]),
+            "reason_level_2": rnd.choice(REASON_2),
+            "category_type": rnd.choice(["Unplanned Downtime", "Planned Downtime"]),
+            "machine": f"Machine_{rnd.randint(0, 49)}",
+            "source_md5": f"bench{i // 1000}",
+            "extracted_at": datetime.datetime(2025, rnd.randint(1, 12), rnd.randint(1, 28)),
+        })
+    return docs
+
+def timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - start) * 1000
+
+def run(db: DatabaseManager, n: int):
+    db.alarms.delete_many({})
+    db.alarms.insert_many(synthetic_alarms(n))
+    db.rebuild_alarm_rollups()
+    shutil.rmtree(ANALYTICS_STORE_DIR, ignore_errors=True)
+    # Parts keyed by source file, as the pipeline writes them
+    store = ColumnarAlarmStore()
+    for md5 in db.alarms.distinct("source_md5"):
+        store.write_file(md5, db.get_alarms({"source_md5": md5}))
+
+    backends = {
+        "raw": lambda: FaultAnalytics(db.get_alarms({})),
+        "rollups": lambda: FaultAnalytics.from_rollups(
+            db.get_alarm_rollups(), [a["alarm_id"] for a in db.get_alarms({"reason_level_1": None})]),
+        "mongo": lambda: MongoFaultAnalytics(db),
+        "columnar": lambda: FaultAnalytics.from_columnar(store),
+    }
+    results = {}
+    for name, load in backends.items():
+        fa, load_ms = timed(load)
+        total_ms = load_ms
+        out = {}
+        for m in METHODS:
+            out[m], ms = timed(getattr(fa, m))
+            total_ms += ms
+        results[name] = out
+        mem = f"   frame {fa.df.memory_usage(deep=True).sum() / 1e6:7.1f} MB" if hasattr(fa, "df") else ""
+        print(f"{n:>9} {name:>8} load {load_ms:9.1f} ms   load+queries {total_ms:9.1f} ms{mem}")
+
+    for name in ("rollups", "mongo", "columnar"):
+        for m in METHODS:
+            if results[name][m] != results["raw"][m]:
+                print(f"  MISMATCH {name}.{m}")
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    db = DatabaseManager()
+    if not db.client:
+        sys.exit("MongoDB is required for this benchmark")
+    for n in sizes:
+        run(db, n)
+    db.client.drop_database(db.db.name)
+    shutil.rmtree(ANALYTICS_STORE_DIR, ignore_errors=True)
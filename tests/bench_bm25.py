@@ -0,0 +1,83 @@
+"""
+Benchmark BM25 keyword search at 10k / 100k / 1M synthetic alarms.
+
+  legacy — BM25AlarmIndex (rank_bm25 get_scores + full sort), rebuilt per search
+  matrix — PersistentBM25Index (sparse weight matrix + argpartition top-k)
+
+Legacy runs are skipped above --legacy-max documents (default 100k) because
+they take minutes per query at 1M.
+Usage: python tests/bench_bm25.py [--legacy-max N] [size ...]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search.bm25_index import BM25AlarmIndex, PersistentBM25Index
+
+VOCAB = ("motor drive fault inverter overtemperature sensor valve pump pressure low high oil "
+         "temperature servo encoder belt conveyor bearing seal gear plc hmi camera timeout "
+         "communication voltage fuse relay contactor jam lubrication hydraulic pneumatic").split()
+QUERIES = ["motor overtemperature", "oil pressure low", "servo encoder fault", "plc communication timeout",
+           "hydraulic pump pressure", "camera sensor", "belt jam conveyor", "fuse relay voltage"]
+
+def synthetic_alarms(n: int) -> list:
+    rnd = random.Random(n)
+    extra = [f"p{i}" for i in range(5000)]   # long tail of parameter codes
+    return [{
+        "alarm_id": str(i).zfill(4),
+        "machine": f"Machine_{i % 50}",
+        "source_md5": f"bench{i // 1000}",
+        "description": " ".join(rnd.choices(VOCAB, k=rnd.randint(3, 8))),
+        "cause": " ".join(rnd.choices(VOCAB + extra, k=rnd.randint(0, 6))),
+    } for i in range(n)]
+
+def ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+def run(n: int, legacy_max: int):
+    alarms = synthetic_alarms(n)
+
+    if n <= legacy_max:
+        start = time.perf_counter()
+        legacy = BM25AlarmIndex()
+        legacy.build(alarms)
+        build_ms = ms(start)
+        start = time.perf_counter()
+        for q in QUERIES:
+            legacy.search(q, top_k=10)
+        print(f"{n:>9} legacy  build {build_ms:10.1f} ms   query {ms(start) / len(QUERIES):9.2f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        idx = PersistentBM25Index(tmp)
+        start = time.perf_counter()
+        idx.add(alarms)
+        idx.merge()                      # fold the delta into a base generation
+        build_ms = ms(start)
+        idx = PersistentBM25Index(tmp)   # cold open: mmap only
+        start = time.perf_counter()
+        for q in QUERIES:
+            idx.search(q, top_k=10)
+        query_ms = ms(start) / len(QUERIES)
+        start = time.perf_counter()
+        idx.search_batch(QUERIES * 16, top_k=10)
+        batch_ms = ms(start) / (len(QUERIES) * 16)
+        start = time.perf_counter()
+        for q in QUERIES:
+            idx.search(q, top_k=10, machine="Machine_7")
+        filtered_ms = ms(start) / len(QUERIES)
+        print(f"{n:>9} matrix  build {build_ms:10.1f} ms   query {query_ms:9.2f} ms   "
+              f"batched {batch_ms:7.2f} ms/query   machine filter {filtered_ms:7.2f} ms")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    legacy_max = 100_000
+    if "--legacy-max" in args:
+        i = args.index("--legacy-max")
+        legacy_max = int(args[i + 1])
+        del args[i:i + 2]
+    for n in [int(a) for a in args] or [10_000, 100_000, 1_000_000]:
+        run(n, legacy_max)
@@ -0,0 +1,54 @@
+"""
+Embedding throughput (sentences/sec) and fidelity: PyTorch vs int8 ONNX.
+
+Encodes synthetic alarm sentences with the EMBEDDING_MODEL on PyTorch and
+on OnnxEmbedder at several thread counts, and reports the min/mean cosine
+between the two runtimes' vectors. The first run exports and quantises
+the model into ONNX_MODEL_DIR.
+Usage: python tests/bench_embedding_runtime.py [n_sentences] [threads ...]
+"""
+import os
+import sys
+import time
+import random
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE
+from search.onnx_embedder import OnnxEmbedder, _cosine_rows
+
+WORDS = ("motor drive fault inverter overtemperature sensor valve pump pressure low high oil "
+         "temperature servo encoder belt conveyor bearing seal gear plc hmi camera timeout "
+         "communication voltage fuse relay contactor jam lubrication hydraulic pneumatic "
+         "check replace reset restart clean adjust setpoint limit axis station infeed outfeed").split()
+
+def sentences(n: int) -> list:
+    rnd = random.Random(n)
+    return [f"Alarm {i:04d}: " + " ".join(rnd.choices(WORDS, k=rnd.randint(5, 25))) for i in range(n)]
+
+def throughput(model, texts: list) -> tuple:
+    model.encode(texts[:EMBEDDING_BATCH_SIZE], batch_size=EMBEDDING_BATCH_SIZE)   # warm-up
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=EMBEDDING_BATCH_SIZE)
+    return len(texts) / (time.perf_counter() - start), np.asarray(vectors)
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    n = args[0] if args else 2000
+    thread_counts = args[1:] or [1, 2, 4, 0]
+    texts = sentences(n)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch_model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    rate, reference = throughput(torch_model, texts)
+    print(f"torch        {rate:9.1f} sentences/s   (torch threads {torch.get_num_threads()})")
+
+    for threads in thread_counts:
+        onnx_model = OnnxEmbedder(EMBEDDING_MODEL, threads=threads)
+        rate, vectors = throughput(onnx_model, texts)
+        cos = _cosine_rows(vectors, reference)
+        label = f"onnx t={threads or 'auto'}"
+        print(f"{label:<12} {rate:9.1f} sentences/s   cosine vs torch min {cos.min():.4f} mean {cos.mean():.4f}   "
+              f"({onnx_model.settings['file']})")
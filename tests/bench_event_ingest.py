@@ -0,0 +1,84 @@
+"""
+Alarm event ingestion throughput and rollup query latency.
+
+Generates a synthetic PLC export (CSV) with events over a week, ingests
+it into a throwaway AlarmEventStore on one core, checks that every grain's
+rollups add up to the events' total downtime, and times downtime queries.
+Usage: python tests/bench_event_ingest.py [n_events ...]
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import datetime
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analytics.event_store import AlarmEventStore, GRAINS
+
+MACHINES, ALARMS = 50, 500
+
+def synthetic_csv(n: int) -> tuple:
+    rng = np.random.default_rng(n)
+    start = np.datetime64("2025-03-01T00:00:00") + rng.integers(0, 7 * 86400, n).astype("timedelta64[s]")
+    duration = rng.exponential(120, n).astype("int64")
+    machines = np.array([f"M{i}" for i in range(MACHINES)])
+    alarms = np.array([f"{i:04d}" for i in range(ALARMS + ALARMS // 5)])     # some unknown to the catalogue
+    table = pa.table({
+        "machine": machines[rng.integers(0, MACHINES, n)],
+        "alarm_id": alarms[rng.integers(0, len(alarms), n)],
+        "start": start.astype("datetime64[ms]"),
+        "end": (start + duration.astype("timedelta64[s]")).astype("datetime64[ms]"),
+    })
+    buf = io.BytesIO()
+    pa_csv.write_csv(table, buf)
+    return buf.getvalue(), int(duration.sum())
+
+def catalogue() -> pa.Table:
+    keys = [(f"M{m}", f"{a:04d}") for m in range(MACHINES) for a in range(ALARMS)]
+    return pa.table({
+        "machine": [k[0] for k in keys], "alarm_id": [k[1] for k in keys],
+        "reason_level_1": ["Basic Machine and Safety Faults"] * len(keys),
+        "reason_level_2": [("Electrical", "Mechanical", "Sensor/Instrumentation")[i % 3] for i in range(len(keys))],
+        "category_type": ["Unplanned Downtime"] * len(keys),
+        "description": [f"Alarm {k[1]}" for k in keys],
+    })
+
+def ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+def run(n: int, cat: pa.Table):
+    data, total_downtime = synthetic_csv(n)
+    store_dir = tempfile.mkdtemp(prefix="event_bench_")
+    try:
+        store = AlarmEventStore(store_dir)
+        start = time.perf_counter()
+        res = store.ingest(data, catalogue=cat, name="bench.csv")
+        seconds = time.perf_counter() - start
+        totals = {g: int(store.downtime(g, by=())["downtime_s"].sum()) for g in GRAINS}
+        ok = all(t == total_downtime for t in totals.values())
+        lo, hi = datetime.datetime(2025, 3, 2), datetime.datetime(2025, 3, 4)
+        timings = []
+        for grain in GRAINS:
+            t = time.perf_counter()
+            store.downtime(grain, lo, hi, by=("machine", "reason_level_2"))
+            timings.append(f"{grain} {ms(t):6.1f} ms")
+        t = time.perf_counter()
+        store.top_alarms(lo, hi, top_n=10)
+        timings.append(f"top alarms {ms(t):6.1f} ms")
+        print(f"{n:>9} events  ingest {seconds:6.2f} s ({n / seconds * 60 / 1e6:5.1f} M/min, "
+              f"{res['matched']} matched)  rollups {'ok' if ok else 'MISMATCH'}  |  " + "  ".join(timings))
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    pa.set_cpu_count(1)
+    pa.set_io_thread_count(1)
+    cat = catalogue()
+    for n in [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000]:
+        run(n, cat)
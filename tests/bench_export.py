@@ -0,0 +1,85 @@
+"""
+Export memory: lists of records vs tabs streamed from DB cursors.
+
+Fills a throwaway SQLite database with n alarms and n/10 parameters for
+one machine, then exports the full workbook twice, each in a fresh
+subprocess: from lists loaded up front (the records passed to
+ExtractionAgent as before) and from the database (PhaseEngine reading
+cursors by machine into a write-only workbook). Reports time and peak RSS,
+and the time of a repeated, unchanged export served by the export cache.
+Usage: python tests/bench_export.py [n_alarms ...]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+MACHINE = "Filler_01"
+
+def populate(n: int):
+    from core.database import DatabaseManager
+    from core.schemas import AlarmRecord, ParameterRecord
+    db = DatabaseManager()
+    now = datetime.datetime(2025, 3, 1)
+    db.save_alarms([AlarmRecord(alarm_id=str(i), description=f"Alarm {i}: inverter fault on main drive",
+                                cause="Drive overtemperature", action="Check fan and filter",
+                                reason_level_1="Basic Machine and Safety Faults", reason_level_2="Electrical",
+                                machine=MACHINE, source_md5="bench", extracted_at=now) for i in range(n)])
+    db.save_parameters([ParameterRecord(description=f"Parameter {i}", target=1.0, lsl=0.5, usl=1.5,
+                                        machine=MACHINE, source_md5="bench", extracted_at=now)
+                        for i in range(max(1, n // 10))])
+    db.register_processed_file("bench", "bench.pdf", MACHINE, ["alarms", "parameters"], {"alarms": n}, "bench")
+
+def child(streamed: bool):
+    from core.database import DatabaseManager
+    from core.schemas import AlarmRecord, ParameterRecord
+    from service.extraction_agent import ExtractionAgent
+    db = DatabaseManager()
+    start = time.perf_counter()
+    if streamed:
+        ExtractionAgent(db).generate_excel(MACHINE, "", [], [])
+        hit = time.perf_counter()
+        agent = ExtractionAgent(db)
+        agent.generate_excel(MACHINE, "", [], [])
+        hit = (time.perf_counter() - hit) if agent.cache_hit else None
+    else:
+        hit = None
+        alarms = [AlarmRecord(**d) for d in db.get_alarms({"machine": MACHINE}, {"_id": 0})]
+        params = [ParameterRecord(**d) for d in db.get_parameters({"machine": MACHINE})]
+        ExtractionAgent().generate_excel(MACHINE, "", alarms, params)
+    print(json.dumps({"seconds": time.perf_counter() - start - (hit or 0), "hit": hit,
+                      "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+def run(n: int):
+    work = tempfile.mkdtemp(prefix="export_bench_")
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", SQLITE_PATH=os.path.join(work, "db.sqlite"),
+               OUTPUT_DIR=os.path.join(work, "out"))
+    try:
+        subprocess.run([sys.executable, __file__, "--populate", str(n)], env=env, check=True)
+        line = [f"{n:>9} alarms"]
+        for streamed in (False, True):
+            proc = subprocess.run([sys.executable, __file__, "--child", str(int(streamed))],
+                                  env=env, capture_output=True, text=True, check=True)
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            line.append(f"{'cursors' if streamed else 'lists'} {r['seconds']:6.1f} s {r['peak_mb']:6.0f} MB peak")
+            if r["hit"] is not None:
+                line.append(f"unchanged re-export (cache hit) {r['hit'] * 1000:6.0f} ms")
+        print("  |  ".join(line))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--populate"]:
+        populate(int(sys.argv[2]))
+    elif sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2] == "1")
+    else:
+        for n in [int(a) for a in sys.argv[1:]] or [10_000, 100_000]:
+            run(n)
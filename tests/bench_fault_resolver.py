@@ -0,0 +1,92 @@
+"""
+Fault-code resolver throughput and latency.
+
+Builds a FaultResolver over a synthetic catalogue and measures in-process
+single and batch lookups, then GET /resolve over one keep-alive HTTP
+connection. With a MongoDB at MONGODB_URI, the indexed find the MES used
+before (machine + zero-padded alarm_id) is timed as a baseline.
+Usage: python tests/bench_fault_resolver.py [n_alarms ...]
+"""
+import os
+import sys
+import time
+import random
+import http.client
+import numpy as np
+
+os.environ.setdefault("MONGODB_DATABASE", "o3sigma_bench")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from service.fault_resolver import FaultResolver, serve
+
+LOOKUPS = 200_000
+HTTP_LOOKUPS = 5_000
+
+def synthetic_alarms(n: int) -> list:
+    return [{
+        "alarm_id": str(i % 5000).zfill(4), "machine": f"Machine_{i // 5000}",
+        "description": f"Synthetic alarm {i}", "reason_level_1": "Basic Machine and Safety Faults",
+        "reason_level_2": "Electrical", "category_type": "Unplanned Downtime", "source_md5": f"bench{i // 1000}",
+    } for i in range(n)]
+
+def probes(n: int, count: int) -> list:
+    rnd = random.Random(count)
+    # MES codes arrive unpadded and sometimes unknown
+    return [(f"Machine_{rnd.randrange(max(n // 5000, 1))}", str(rnd.randrange(5500))) for _ in range(count)]
+
+def report(name: str, latencies_ns: list):
+    lat = np.array(latencies_ns) / 1000
+    total_s = lat.sum() / 1e6
+    print(f"  {name:<24} {len(lat) / total_s:>12,.0f} lookups/s   p50 {np.percentile(lat, 50):8.2f} us   "
+          f"p99 {np.percentile(lat, 99):8.2f} us")
+
+def run(n: int):
+    docs = synthetic_alarms(n)
+    start = time.perf_counter()
+    resolver = FaultResolver().load(docs)
+    print(f"{n:>9} alarms  load {(time.perf_counter() - start) * 1000:.0f} ms  ({resolver.stats()['keys']} keys)")
+
+    pairs = probes(n, LOOKUPS)
+    lat = []
+    for machine, aid in pairs:
+        t = time.perf_counter_ns()
+        resolver.resolve(machine, aid)
+        lat.append(time.perf_counter_ns() - t)
+    report("resolve()", lat)
+
+    lat = []
+    for i in range(0, len(pairs), 1000):
+        t = time.perf_counter_ns()
+        resolver.resolve_many(pairs[i:i + 1000])
+        lat.append((time.perf_counter_ns() - t) / 1000)
+    lat = [x for x in lat for _ in range(1000)]
+    report("resolve_many(1000)", lat)
+
+    server = serve(resolver, "127.0.0.1", 0)
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+    lat = []
+    for machine, aid in pairs[:HTTP_LOOKUPS]:
+        t = time.perf_counter_ns()
+        conn.request("GET", f"/resolve?machine={machine}&alarm_id={aid}")
+        conn.getresponse().read()
+        lat.append(time.perf_counter_ns() - t)
+    report("HTTP GET /resolve", lat)
+    conn.close()
+    server.shutdown()
+
+    from core.database import DatabaseManager
+    db = DatabaseManager()
+    if db.client and not db.sqlite:
+        db.alarms.delete_many({})
+        db.alarms.insert_many([dict(d) for d in docs])
+        lat = []
+        for machine, aid in pairs[:HTTP_LOOKUPS]:
+            t = time.perf_counter_ns()
+            db.alarms.find_one({"machine": machine, "alarm_id": aid.zfill(4)}, {"_id": 0})
+            lat.append(time.perf_counter_ns() - t)
+        report("Mongo find_one (before)", lat)
+        db.client.drop_database(db.db.name)
+
+if __name__ == "__main__":
+    for n in [int(a) for a in sys.argv[1:]] or [10_000, 100_000]:
+        run(n)
@@ -0,0 +1,69 @@
+"""
+Workbook generation: in-memory vs streaming (write-only) SpreadsheetGenerator.
+
+Writes a Downtime Configuration tab of n synthetic rows, fed from a
+generator, and reports wall time, peak RSS and file size. Each run is a
+fresh subprocess so peak memory is per run.
+Usage: python tests/bench_spreadsheet.py [n_rows ...]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def rows(n: int):
+    reasons = ("Electrical", "Mechanical", "Sensor/Instrumentation")
+    for i in range(n):
+        yield {
+            "Machine *": f"Filler_{i % 20:02d}",
+            "Reason 1 *": "Basic Machine and Safety Faults",
+            "Reason 2": reasons[i % 3],
+            "Reason 3": "Drive overtemperature",
+            "Reason 4": "Check fan and filter",
+            "Category Type *": "Unplanned Downtime",
+            "Fault Code *": str(i % 10000).zfill(4),
+            "Fault Name *": f"Alarm {i}: inverter fault on main drive",
+        }
+
+def child(n: int, streaming: bool, out_dir: str):
+    import config
+    config.OUTPUT_DIR = out_dir
+    from core import spreadsheet_generator
+    spreadsheet_generator.OUTPUT_DIR = out_dir
+    start = time.perf_counter()
+    sg = spreadsheet_generator.SpreadsheetGenerator(streaming=streaming)
+    sg.populate_rows("Downtime Configuration", rows(n))
+    path = sg.save("bench")
+    print(json.dumps({"seconds": time.perf_counter() - start,
+                      "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                      "file_mb": os.path.getsize(path) / 2 ** 20}))
+
+def run(n: int):
+    line = [f"{n:>9} rows"]
+    for streaming in (False, True):
+        out_dir = tempfile.mkdtemp(prefix="sheet_bench_")
+        try:
+            proc = subprocess.run([sys.executable, __file__, "--child", str(n), str(int(streaming)), out_dir],
+                                  capture_output=True, text=True)
+            if proc.returncode:
+                line.append(f"{'streaming' if streaming else 'in-memory'} failed ({proc.returncode})")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            line.append(f"{'streaming' if streaming else 'in-memory'} {r['seconds']:7.1f} s "
+                        f"{r['peak_mb']:7.0f} MB peak")
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    print("  |  ".join(line) + f"  ({r['file_mb']:.1f} MB file)")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(int(sys.argv[2]), sys.argv[3] == "1", sys.argv[4])
+    else:
+        for n in [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]:
+            run(n)
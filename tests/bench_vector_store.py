@@ -0,0 +1,91 @@
+"""
+Recall and latency of vector backends on synthetic 384-d embeddings.
+
+  exact    — float32 brute force in memory (ground truth)
+  float16  — NumpyVectorStore, float16 rows
+  int8     — NumpyVectorStore, int8 rows + per-row scale
+  chroma   — Chroma HNSW collection (skipped if chromadb is not installed)
+
+Recall@10 is measured against the exact top 10. Embeddings are clustered
+so neighbours are meaningful, as with real alarm text.
+Usage: python tests/bench_vector_store.py [size ...]
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from search.numpy_vector_store import NumpyVectorStore
+
+DIM, TOP_K, N_QUERIES = 384, 10, 50
+
+def synthetic(n: int, rnd: np.random.Generator) -> np.ndarray:
+    centres = rnd.standard_normal((max(n // 50, 1), DIM))
+    x = centres[rnd.integers(0, len(centres), n)] + 0.6 * rnd.standard_normal((n, DIM))
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+def ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+def recall(found: list, truth: list) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def run(n: int):
+    rnd = np.random.default_rng(n)
+    vectors = synthetic(n, rnd)
+    queries = synthetic(N_QUERIES, rnd)
+    ids = [f"M{i % 20}_{i}" for i in range(n)]
+    metas = [{"alarm_id": str(i), "machine": f"M{i % 20}"} for i in range(n)]
+    truth = [list(np.argsort(-(vectors @ q), kind="stable")[:TOP_K]) for q in queries]
+
+    for dtype in ("float16", "int8"):
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            NumpyVectorStore(tmp, dtype).upsert(ids, vectors, metas)
+            build_ms = ms(start)
+            start = time.perf_counter()
+            store = NumpyVectorStore(tmp, dtype)   # cold open: mmap only
+            open_ms = ms(start)
+            start = time.perf_counter()
+            found = [[r for r, _ in store.top_k(q, TOP_K)] for q in queries]
+            query_ms = ms(start) / N_QUERIES
+            start = time.perf_counter()
+            for q in queries:
+                store.top_k(q, TOP_K, machine="M7")
+            filtered_ms = ms(start) / N_QUERIES
+            size_mb = store.vectors.nbytes / 2**20
+            print(f"{n:>8} {dtype:>8}  build {build_ms:8.1f} ms  open {open_ms:6.1f} ms  "
+                  f"query {query_ms:7.2f} ms  machine filter {filtered_ms:7.2f} ms  "
+                  f"recall@10 {recall(found, truth):.3f}  {size_mb:.1f} MB")
+
+    try:
+        import chromadb
+    except ImportError:
+        print(f"{n:>8}   chroma  skipped (chromadb not installed)")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        coll = chromadb.PersistentClient(path=tmp).get_or_create_collection(
+            name="bench", metadata={"hnsw:space": "cosine"})
+        start = time.perf_counter()
+        for i in range(0, n, 1000):
+            coll.upsert(ids=ids[i:i + 1000], embeddings=vectors[i:i + 1000].tolist(), metadatas=metas[i:i + 1000])
+        build_ms = ms(start)
+        row_of = {i: n for n, i in enumerate(ids)}
+        start = time.perf_counter()
+        res = [coll.query(query_embeddings=[q.tolist()], n_results=TOP_K) for q in queries]
+        query_ms = ms(start) / N_QUERIES
+        found = [[row_of[i] for i in r["ids"][0]] for r in res]
+        start = time.perf_counter()
+        for q in queries:
+            coll.query(query_embeddings=[q.tolist()], n_results=TOP_K, where={"machine": "M7"})
+        filtered_ms = ms(start) / N_QUERIES
+        print(f"{n:>8}   chroma  build {build_ms:8.1f} ms  open {'-':>6}     "
+              f"query {query_ms:7.2f} ms  machine filter {filtered_ms:7.2f} ms  "
+              f"recall@10 {recall(found, truth):.3f}")
+
+if __name__ == "__main__":
+    for n in [int(a) for a in sys.argv[1:]] or [10_000, 50_000, 200_000]:
+        run(n)
@@ -0,0 +1,55 @@
+"""
+Cold vs warm first-query latency for semantic search.
+
+  cold — fresh process: VectorAlarmIndex() + first search load the model on demand
+  warm — fresh process: model_registry.warm_up() runs first (as the app does at start),
+         then VectorAlarmIndex() + first search; repeated queries hit the LRU
+
+Each mode runs in its own subprocess so nothing is shared between them.
+Usage: python tests/bench_vector_warmup.py
+"""
+import os
+import sys
+import time
+import json
+import tempfile
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+QUERY = "motor overtemperature during start"
+
+def measure(mode: str, persist_dir: str) -> dict:
+    from search import model_registry
+    out = {}
+    if mode == "warm":
+        start = time.perf_counter()
+        model_registry.warm_up(path=persist_dir, background=False)
+        out["warm_up_ms"] = (time.perf_counter() - start) * 1000
+
+    from search.vector_index import VectorAlarmIndex
+    start = time.perf_counter()
+    idx = VectorAlarmIndex(persist_dir)
+    idx.search(QUERY, top_k=5)
+    out["first_query_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    VectorAlarmIndex(persist_dir).search(QUERY, top_k=5)
+    out["repeat_query_ms"] = (time.perf_counter() - start) * 1000
+    out["registry"] = model_registry.stats()
+    return out
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        print(json.dumps(measure(sys.argv[1], sys.argv[2])))
+        sys.exit(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("cold", "warm"):
+            res = subprocess.run([sys.executable, __file__, mode, tmp], cwd=ROOT,
+                                 capture_output=True, text=True, check=True)
+            r = json.loads(res.stdout.strip().splitlines()[-1])
+            line = f"{mode:>5}  first query {r['first_query_ms']:9.1f} ms   repeat {r['repeat_query_ms']:7.2f} ms"
+            if "warm_up_ms" in r:
+                line += f"   (warm-up {r['warm_up_ms']:.1f} ms, off the request path)"
+            print(line)
@@ -0,0 +1,142 @@
+import os
+import sys
+
+# Tests import the app's packages the same way the bench scripts do
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+@pytest.fixture
+def make_sqlite_db(tmp_path, monkeypatch):
+    """DatabaseManager factory on one SQLite file; each call is like another process opening it."""
+    import core.database as database
+    monkeypatch.setattr(database, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(database, "SQLITE_PATH", str(tmp_path / "db.sqlite"))
+    return database.DatabaseManager
+
+@pytest.fixture
+def sqlite_db(make_sqlite_db):
+    return make_sqlite_db()
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """DatabaseManager on an in-memory mongomock server."""
+    mongomock = pytest.importorskip("mongomock")
+    import core.database as database
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(database, "STORAGE_BACKEND", "mongodb")
+    monkeypatch.setattr(database, "MongoClient", lambda *a, **k: client)
+    return database.DatabaseManager()
+
+@pytest.fixture(params=["sqlite", "mongodb"])
+def db(request):
+    """The same test on both storage backends."""
+    return request.getfixturevalue(f"{request.param.replace('mongodb', 'mongo')}_db")
+
+class StandInNeo4j:
+    """
+    In-memory stand-in for a neo4j driver: records every statement with
+    its transaction and applies Neo4jGraph's UNWIND writes to a tiny graph.
+    Neo4jGraphAnalytics' read queries are answered by brute force over it,
+    with the ordering and LIMIT their Cypher asks for.
+    """
+    def __init__(self):
+        self.auto_commit = []       # (query, params) run outside explicit transactions
+        self.transactions = []      # [(query, params)] per execute_write
+        self.alarms, self.belongs_to, self.causes = {}, set(), set()
+
+    def session(self):
+        return StandInSession(self)
+
+    def close(self):
+        pass
+
+    def apply(self, query: str, params: dict):
+        if not query.startswith("UNWIND $rows"): return
+        for row in params["rows"]:
+            if "BELONGS_TO" in query:
+                self.alarms[row["aid"]] = {"description": row["desc"], "reason_2": row["r2"]}
+                self.belongs_to.add((row["aid"], row["machine"]))
+            else:
+                self.causes.add((row["aid"], row["comp"]))
+
+    def read(self, query: str, params: dict) -> list:
+        comps = {}
+        for aid, comp in self.causes:
+            comps.setdefault(aid, set()).add(comp)
+        if "a.id < b.id" in query:
+            rows = [(a, b, len(comps[a] & comps[b])) for a in comps for b in comps if a < b and comps[a] & comps[b]]
+            return sorted(rows, key=lambda r: (-r[2], r[0], r[1]))[:params["n"]]
+        if "AS shared" in query:
+            a = comps.get(params["aid"], set())
+            rows = [(b, len(a & cb)) for b, cb in comps.items() if b != params["aid"] and a & cb]
+            return sorted(rows, key=lambda r: (-r[1], r[0]))[:params["n"]]
+        if "RETURN DISTINCT b.id" in query:
+            a = comps.get(params["aid"], set())
+            return [(b,) for b in sorted(comps) if b != params["aid"] and a & comps[b]]
+        if "RETURN DISTINCT c.name" in query:
+            return [(c,) for c in sorted(comps.get(params["a"], set()) & comps.get(params["b"], set()))]
+        return []
+
+class StandInRecord(tuple):
+    def values(self):
+        return list(self)
+
+class StandInResult:
+    def __init__(self, rows=()):
+        self.rows = [StandInRecord(r) for r in rows]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def consume(self):
+        pass
+
+class StandInSession:
+    def __init__(self, driver: StandInNeo4j):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query: str, **params):
+        self.driver.auto_commit.append((query, params))
+        self.driver.apply(query, params)
+        return StandInResult(self.driver.read(query, params))
+
+    def execute_write(self, fn, *args):
+        statements = []
+
+        class Tx:
+            def run(tx, query, **params):
+                statements.append((query, params))
+                self.driver.apply(query, params)
+                return StandInResult()
+        result = fn(Tx(), *args)
+        self.driver.transactions.append(statements)
+        return result
+
+@pytest.fixture
+def neo4j_driver():
+    return StandInNeo4j()
+
+def alarm(alarm_id, md5="f1", machine="Filler_01", **fields):
+    import datetime
+    from core.schemas import AlarmRecord
+    fields.setdefault("description", f"Alarm {alarm_id}")
+    fields.setdefault("extracted_at", datetime.datetime(2025, 3, 1))
+    return AlarmRecord(alarm_id=alarm_id, machine=machine, source_md5=md5, **fields)
+
+def parameter(description, md5="f1", machine="Filler_01", **fields):
+    import datetime
+    from core.schemas import ParameterRecord
+    return ParameterRecord(description=description, machine=machine, source_md5=md5,
+                           extracted_at=datetime.datetime(2025, 3, 1), **fields)
+
+def add_file(db, md5, alarms, machine="Filler_01"):
+    """Save alarms and register their source file, as the pipeline does."""
+    db.save_alarms(alarms)
+    db.register_processed_file(md5, f"{md5}.pdf", machine, ["alarms"], {"alarms": len(alarms)}, "test")
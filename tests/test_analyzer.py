@@ -0,0 +1,29 @@
+import pytest
+
+from search.analyzer import analyze, stem
+
+@pytest.mark.parametrize("base, inflected", [
+    ("power", "powered"),
+    ("filter", "filtered"),
+    ("cover", "covered"),
+    ("register", "registered"),
+    ("controller", "controlled"),
+    ("inverter", "inverted"),
+    ("pump", "pumps"),
+    ("stop", "stopped"),
+    ("jam", "jamming"),
+    ("pressure", "pressures"),
+])
+def test_base_and_inflected_forms_stem_alike(base, inflected):
+    assert stem(base) == stem(inflected)
+
+@pytest.mark.parametrize("word", ["power", "filter", "cover", "water", "meter"])
+def test_short_er_words_keep_their_stem(word):
+    assert stem(word) == word
+
+def test_analyze_matches_inflected_queries():
+    assert analyze("filters clogged, powered off") == analyze("Filter clog, power off")
+
+def test_analyze_normalises_codes():
+    assert analyze("Oil pressure 0.5bar below P0243 (Alarm 0282)") == \
+        ["oil", "pressur", "0.5", "bar", "below", "p243", "243", "alarm", "282"]
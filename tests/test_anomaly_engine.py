@@ -0,0 +1,60 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from analytics.anomaly_engine import AnomalyEngine, REASONS
+
+def alarms(machine: str, day: str, n: int, start_id: int = 0) -> pd.DataFrame:
+    return pd.DataFrame({
+        "machine": [machine] * n,
+        "alarm_id": [str(start_id + i % 5) for i in range(n)],
+        "reason_level_2": [REASONS[i % len(REASONS)] for i in range(n)],
+        "ts": pd.Timestamp(day) + pd.to_timedelta(np.arange(n) % 24, unit="h"),
+    })
+
+def fleet(days: int = 20, machines: int = 4) -> pd.DataFrame:
+    dates = pd.date_range("2025-03-01", periods=days, freq="D")
+    return pd.concat([alarms(f"M{m}", str(d.date()), 5 + (m + i) % 3) for m in range(machines)
+                      for i, d in enumerate(dates)], ignore_index=True)
+
+def test_idle_machines_rescored_when_the_watermark_moves():
+    engine = AnomalyEngine(window_days=7, history_days=30, refit_hours=1e9, drift_threshold=1e9)
+    engine.update(fleet())
+    engine.refresh()
+    before = engine.scores["M1"][2].copy()
+
+    # Only M0 reports, three days later: M1's window now covers three fewer days of its alarms
+    engine.update(alarms("M0", "2025-03-23", 6))
+    result = engine.refresh()
+
+    assert result == {"refit": False, "rescored": len(engine.current_features())}
+    current = engine.current_features()["M1"]
+    assert not np.allclose(before, current)
+    np.testing.assert_allclose(engine.scores["M1"][2], current)
+    expected = -engine.model.score_samples(current.reshape(1, -1))[0]
+    assert engine.scores["M1"][0] == expected
+
+def test_machines_leaving_the_window_drop_out_of_the_scores():
+    engine = AnomalyEngine(window_days=7, history_days=30, refit_hours=1e9, drift_threshold=1e9)
+    engine.update(fleet())
+    engine.refresh()
+    engine.update(alarms("M0", "2025-04-10", 6))
+    engine.refresh()
+    assert set(engine.scores) == {"M0"}
+
+def test_same_day_update_rescores_only_touched_machines():
+    engine = AnomalyEngine(window_days=7, history_days=30, refit_hours=1e9, drift_threshold=1e9)
+    engine.update(fleet())
+    engine.refresh()
+    engine.update(alarms("M2", "2025-03-20", 3, start_id=100))
+    assert engine.refresh() == {"refit": False, "rescored": 1}
+
+def test_state_pickled_before_the_scored_watermark_rescores_everything():
+    engine = AnomalyEngine(window_days=7, history_days=30, refit_hours=1e9, drift_threshold=1e9)
+    engine.update(fleet())
+    engine.refresh()
+    del engine.scored_watermark           # as saved by the first version of the engine
+    restored = pickle.loads(pickle.dumps(engine))
+    assert restored.scored_watermark is None
+    assert restored.refresh() == {"refit": False, "rescored": len(restored.current_features())}
@@ -0,0 +1,133 @@
+import os
+import random
+import threading
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from search.bm25_index import BM25AlarmIndex, PersistentBM25Index, tokenize
+
+WORDS = ("motor drive fault inverter overtemperature sensor valve pump pressure low high oil temperature "
+         "servo encoder belt conveyor bearing seal gear plc hmi camera timeout voltage fuse relay").split()
+QUERIES = ["motor overtemperature", "oil pressure low", "servo encoder fault", "belt conveyor jam",
+           "fuse relay voltage", "camera"]
+
+def alarms(md5: str, n: int, seed: int) -> list:
+    rnd = random.Random(seed)
+    return [{"alarm_id": f"{md5}-{i}", "machine": f"M{i % 3}", "source_md5": md5,
+             "description": " ".join(rnd.choices(WORDS, k=rnd.randint(2, 7))), "cause": rnd.choice(WORDS)}
+            for i in range(n)]
+
+FILES = {md5: alarms(md5, 40, seed) for seed, md5 in enumerate(["a", "b", "c", "d", "e"])}
+
+def current(tmp_path) -> str:
+    with open(tmp_path / "idx" / "CURRENT") as f:
+        return f.read()
+
+def results(index: PersistentBM25Index) -> list:
+    return [[(h["alarm_id"], round(h["score"], 4)) for h in index.search_hits(q, top_k=15)] for q in QUERIES] + \
+           [[h["alarm_id"] for h in index.search_hits(q, top_k=15, machine="M1")] for q in QUERIES]
+
+def rebuilt(tmp_path, records: list) -> list:
+    index = PersistentBM25Index(str(tmp_path / "rebuilt"))
+    index.add(records)
+    return results(index)
+
+def test_deltas_score_like_a_full_rebuild(tmp_path):
+    index = PersistentBM25Index(str(tmp_path / "idx"), max_deltas=100)
+    for md5 in ("a", "b", "c"):
+        index.add(FILES[md5])
+    index.delete("b")
+    index.add(FILES["d"])
+    index.add(alarms("a", 25, 99))      # replaces file a's documents
+    assert current(tmp_path) == " ".join(f"delta-{n}.json" for n in range(1, 7))
+
+    expected = rebuilt(tmp_path, FILES["c"] + FILES["d"] + alarms("a", 25, 99))
+    assert results(index) == expected
+    assert results(PersistentBM25Index(str(tmp_path / "idx"))) == expected
+
+    index.merge()
+    assert index.generation == "gen-7"
+    assert sorted(os.listdir(tmp_path / "idx")) == ["CURRENT", "LOCK", "gen-7"]
+    assert results(index) == expected
+    reopened = PersistentBM25Index(str(tmp_path / "idx"))
+    assert results(reopened) == expected
+    assert reopened.doc_count == 105
+
+def test_writes_only_append_a_delta(tmp_path, monkeypatch):
+    index = PersistentBM25Index(str(tmp_path / "idx"), max_deltas=100)
+    index.add(FILES["a"])
+    index.merge()
+    # A write never loads or rebuilds the base generation
+    monkeypatch.setattr(PersistentBM25Index, "_build", lambda *a: pytest.fail("rebuilt on write"))
+    index.add(FILES["b"])
+    index.delete("a")
+    assert current(tmp_path) == "gen-2 delta-3.json delta-4.json"
+
+def test_deltas_over_a_base_are_scored_without_rebuilding_it(tmp_path, monkeypatch):
+    index = PersistentBM25Index(str(tmp_path / "idx"), max_deltas=100)
+    for md5 in ("a", "b", "c"):
+        index.add(FILES[md5])
+    index.merge()
+    cached = PersistentBM25Index(str(tmp_path / "idx"))     # held open, as the app does
+    index.delete("b")
+    index.add(FILES["d"])
+    index.add(alarms("c", 15, 42))     # replaces a base file's documents
+    assert current(tmp_path) == "gen-4 delta-5.json delta-6.json delta-7.json"
+    expected = rebuilt(tmp_path, FILES["a"] + FILES["d"] + alarms("c", 15, 42))
+
+    # Opening memory-maps the base and keeps the deltas as a segment beside it
+    monkeypatch.setattr(PersistentBM25Index, "_build", lambda *a: pytest.fail("rebuilt on load"))
+    reopened = PersistentBM25Index(str(tmp_path / "idx"))
+    assert isinstance(reopened.postings_w, np.memmap) and isinstance(reopened.vocab, np.memmap)
+    assert reopened.doc_count == 95
+    assert results(reopened) == expected
+    assert results(cached) == expected
+    monkeypatch.undo()
+
+    index.merge()
+    assert results(index) == expected
+
+def test_background_merge_after_max_deltas(tmp_path):
+    index = PersistentBM25Index(str(tmp_path / "idx"), max_deltas=3)
+    for md5 in ("a", "b", "c"):
+        index.add(FILES[md5])
+    for t in threading.enumerate():
+        if t.name == "bm25-merge":
+            t.join(10)
+    assert current(tmp_path) == "gen-4"
+    assert results(index) == rebuilt(tmp_path, FILES["a"] + FILES["b"] + FILES["c"])
+
+def _add_file(index_dir: str, md5: str):
+    PersistentBM25Index(index_dir, max_deltas=100).add(FILES[md5])
+
+def test_concurrent_processes_never_lose_a_delta(tmp_path):
+    index_dir = str(tmp_path / "idx")
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_add_file, args=(index_dir, md5)) for md5 in FILES]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+    assert [p.exitcode for p in procs] == [0] * len(procs)
+    index = PersistentBM25Index(index_dir)
+    assert index.doc_count == 200
+    index.merge()
+    assert index.doc_count == 200 and sorted(index.md5s) == sorted(FILES)
+
+def test_scores_match_rank_bm25(tmp_path):
+    records = [r for md5 in FILES for r in FILES[md5]]
+    legacy = BM25AlarmIndex()
+    legacy.build(records)
+    index = PersistentBM25Index(str(tmp_path / "idx"))
+    index.add(records)
+    for merged in (False, True):
+        if merged:
+            index.merge()
+        for q in QUERIES:
+            expected = dict(zip(legacy.alarm_ids, legacy.bm25.get_scores(tokenize(q))))
+            hits = index.search_hits(q, top_k=len(records))
+            assert {h["alarm_id"]: h["score"] for h in hits} == \
+                   pytest.approx({aid: s for aid, s in expected.items() if s > 0}, rel=1e-5)
+            assert index.search(q, top_k=10) == legacy.search(q, top_k=10)
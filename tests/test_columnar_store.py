@@ -0,0 +1,51 @@
+import pytest
+
+import analytics.fault_analytics as fault_analytics
+from analytics.columnar_store import ColumnarAlarmStore
+from analytics.fault_analytics import FaultAnalytics
+from conftest import alarm
+from test_fault_analytics import QUERIES, fleet
+
+def answers(fa) -> list:
+    return [getattr(fa, method)(*args) for method, args in QUERIES]
+
+def check(db, store):
+    raw = FaultAnalytics(db.get_alarms({}, use_cache=False))
+    assert answers(FaultAnalytics.from_columnar(store)) == answers(raw)
+
+def test_snapshot_answers_like_the_stored_alarms(db, tmp_path):
+    fleet(db)
+    store = ColumnarAlarmStore(str(tmp_path / "columnar"))
+    assert store.sync(db)
+    assert store.md5s() == {"f1", "f2", "f3"}
+    check(db, store)
+
+    # A delete by another process leaves a stale part until the next sync
+    db.delete_processed_file("f2")
+    assert store.sync(db)
+    assert store.md5s() == {"f1", "f3"}
+    check(db, store)
+
+    # The pipeline replaces a reprocessed file's part
+    db.save_alarms([alarm("3", reason_level_1="Electrical", reason_level_2="Electrical Fault")])
+    store.write_file("f1", db.get_alarms({"source_md5": "f1"}))
+    check(db, store)
+
+def test_sync_skipped_while_the_catalogue_is_unchanged(db, tmp_path, monkeypatch):
+    fleet(db)
+    store = ColumnarAlarmStore(str(tmp_path / "columnar"))
+    assert store.sync(db)
+    monkeypatch.setattr(store, "md5s", lambda: pytest.fail("synced an unchanged catalogue"))
+    assert not ColumnarAlarmStore(str(tmp_path / "columnar")).sync(db) and not store.sync(db)
+    monkeypatch.undo()
+
+    db.register_processed_file("f4", "f4.pdf", "Filler_01", ["alarms"], {"alarms": 0}, "test")
+    assert store.sync(db)
+    assert store.md5s() == {"f1", "f2", "f3", "f4"}
+
+def test_load_fault_analytics_uses_the_snapshot(db, tmp_path, monkeypatch):
+    import analytics.columnar_store as columnar_store
+    fleet(db)
+    monkeypatch.setattr(fault_analytics, "ANALYTICS_BACKEND", "columnar")
+    monkeypatch.setattr(columnar_store, "ColumnarAlarmStore", lambda: ColumnarAlarmStore(str(tmp_path / "columnar")))
+    assert answers(fault_analytics.load_fault_analytics(db)) == answers(FaultAnalytics(db.get_alarms({})))
@@ -0,0 +1,136 @@
+import os
+
+from pymongo.errors import ConnectionFailure
+
+import core.database as database
+from conftest import alarm, add_file, parameter
+
+class UnreachableClient:
+    def __init__(self, *args, **kwargs):
+        self.admin = self
+
+    def command(self, name):
+        raise ConnectionFailure("no server")
+
+def test_mongo_outage_never_falls_back_to_sqlite(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "fallback.sqlite"
+    monkeypatch.setattr(database, "STORAGE_BACKEND", "mongodb")
+    monkeypatch.setattr(database, "SQLITE_PATH", str(path))
+    monkeypatch.setattr(database, "MongoClient", UnreachableClient)
+    db = database.DatabaseManager()
+    assert db.client is None and db.sqlite is None
+    assert "Could not connect to MongoDB" in capsys.readouterr().out
+    assert not os.path.exists(path)
+    assert db.get_all_processed_files() == []
+
+def test_sqlite_only_when_selected(sqlite_db):
+    assert sqlite_db.sqlite is not None and sqlite_db.client is None
+
+def test_cached_reads_cannot_be_modified_by_callers(db):
+    add_file(db, "f1", [alarm("1"), alarm("2")])
+    for read in (lambda: db.get_alarms({"source_md5": "f1"}), db.get_all_processed_files,
+                 lambda: [db.get_processed_file("f1")], db.get_alarm_rollups):
+        first = read()
+        first[0]["machine"] = "changed"
+        first[0].setdefault("record_counts", {})["alarms"] = -1
+        first.append({"machine": "extra"})
+        second = read()
+        assert second[0]["machine"] != "changed" and len(second) == len(first) - 1
+        assert second[0].get("record_counts", {}).get("alarms") != -1
+
+    docs = db.get_alarms_by_keys([("Filler_01", "1")])
+    docs[("Filler_01", "1")]["description"] = "changed"
+    assert db.get_alarms_by_keys([("Filler_01", "1")])[("Filler_01", "1")]["description"] == "Alarm 1"
+
+def test_cached_processed_file_excludes_the_pdf_bytes(db):
+    db.save_alarms([alarm("1")])
+    db.register_processed_file("f1", "f1.pdf", "Filler_01", ["alarms"], {"alarms": 1}, "test", b"%PDF-1.4")
+    assert "file_content" not in db.get_processed_file("f1")
+    assert "file_content" not in db.get_processed_file("f1")      # cache hit
+    assert db.get_processed_file("f1", include_content=True)["file_content"] == b"%PDF-1.4"
+    assert all("file_content" not in entry[1] for entry in db.cache.entries.values() if isinstance(entry[1], dict))
+
+FILTERS = [
+    {},
+    {"machine": "Filler_01"},
+    {"reason_level_1": None},
+    {"reason_level_1": {"$ne": None}},
+    {"reason_level_1": {"$ne": "Electrical"}},
+    {"source_md5": {"$in": ["f1", "f3"]}},
+    {"reason_level_1": {"$in": ["Electrical", None]}},
+    {"reason_level_1": {"$in": []}},
+    {"machine": "Filler_01", "category_type": "Waste"},
+    {"alarm_id": "1", "source_md5": {"$ne": "f1"}},
+]
+
+def stored(db):
+    add_file(db, "f1", [alarm("1", reason_level_1="Electrical"), alarm("2", category_type="Waste"),
+                        alarm("3", reason_level_1="Mechanical", category_type="Waste")])
+    add_file(db, "f2", [alarm("1", md5="f2", machine="Capper_02", reason_level_1="Mechanical"),
+                        alarm("4", md5="f2", machine="Capper_02")], machine="Capper_02")
+    add_file(db, "f3", [alarm("5", md5="f3", reason_level_1="Electrical", category_type="Waste")])
+
+def test_sqlite_filters_select_what_mongo_selects(sqlite_db, mongo_db):
+    for db in (sqlite_db, mongo_db):
+        stored(db)
+    for filters in FILTERS:
+        selected = [sorted((a["source_md5"], a["alarm_id"]) for a in db.get_alarms(filters))
+                    for db in (sqlite_db, mongo_db)]
+        assert selected[0] == selected[1], filters
+        projected = [sorted(db.get_alarms(filters, {"alarm_id": 1, "machine": 1, "_id": 0}),
+                            key=lambda a: (a["machine"], a["alarm_id"])) for db in (sqlite_db, mongo_db)]
+        assert projected[0] == projected[1], filters
+    assert len(sqlite_db.get_alarms({"reason_level_1": None})) == 2
+
+def test_writes_and_deletes_invalidate_cached_reads(db):
+    stored(db)
+    reads = {
+        "alarms": lambda: sorted(a["alarm_id"] for a in db.get_alarms({"source_md5": "f1"})),
+        "unclassified": lambda: sorted(a["alarm_id"] for a in db.get_alarms({"reason_level_1": None})),
+        "by_key": lambda: db.get_alarms_by_keys([("Filler_01", "2")]).get(("Filler_01", "2"), {}).get("description"),
+        "rollups": lambda: sorted((r["machine"], r["reason_level_1"] or "", r["count"]) for r in db.get_alarm_rollups()),
+        "files": lambda: sorted(f["md5"] for f in db.get_all_processed_files()),
+        "file": lambda: (db.get_processed_file("f1") or {}).get("record_counts"),
+    }
+
+    def fresh():
+        db.cache.clear()
+        db.doc_cache.clear()
+        return {name: read() for name, read in reads.items()}
+
+    def check():
+        cached = {name: read() for name, read in reads.items()}
+        assert cached == fresh()
+
+    check()
+    check()     # served from the cache
+    db.save_alarms([alarm("2", reason_level_1="Electrical", description="Door open")])
+    check()
+    add_file(db, "f1", [alarm("6")])
+    check()
+    db.delete_processed_file("f1")
+    check()
+    assert reads["alarms"]() == [] and reads["files"]() == ["f2", "f3"]
+
+def saved_twice(db):
+    alarms = [alarm("1", reason_level_1="Electrical"), alarm("2")]
+    parameters = [parameter("Speed", target=1.0), parameter("Mode")]
+    assert db.save_alarms(alarms) == {"inserted": 2, "modified": 0, "unchanged": 0}
+    assert db.save_parameters(parameters) == {"inserted": 2, "modified": 0, "unchanged": 0}
+    # Fresh but identical records, as a re-upload of the same manual produces them
+    return [alarm("1", reason_level_1="Electrical"), alarm("2")], [parameter("Speed", target=1.0), parameter("Mode")]
+
+def test_identical_records_are_not_rewritten_in_mongo(mongo_db, monkeypatch):
+    alarms, parameters = saved_twice(mongo_db)
+    writes = []
+    monkeypatch.setattr(type(mongo_db.alarms), "bulk_write", lambda self, *a, **k: writes.append(self.name))
+    assert mongo_db.save_alarms(alarms) == {"inserted": 0, "modified": 0, "unchanged": 2}
+    assert mongo_db.save_parameters(parameters) == {"inserted": 0, "modified": 0, "unchanged": 2}
+    assert writes == []
+
+def test_identical_records_are_not_rewritten_in_sqlite(sqlite_db):
+    alarms, parameters = saved_twice(sqlite_db)
+    before = sqlite_db.sqlite.conn.total_changes
+    assert sqlite_db.save_alarms(alarms) == {"inserted": 0, "modified": 0, "unchanged": 2}
+    assert sqlite_db.save_parameters(parameters) == {"inserted": 0, "modified": 0, "unchanged": 2}
+    assert sqlite_db.sqlite.conn.total_changes == before
@@ -0,0 +1,50 @@
+import pyarrow as pa
+
+from analytics.event_store import AlarmEventStore, GRAINS, alarm_key, join_catalogue
+from search.analyzer import normalize_alarm_id
+
+CATALOGUE = pa.table({
+    "machine": ["Filler_01", "Filler_01", "Filler_01"],
+    "alarm_id": ["0282", "E-12", "0007"],
+    "reason_level_1": ["Basic Machine and Safety Faults", "Automation, Process and Specialized Alarms", None],
+    "reason_level_2": ["Electrical", "Software/Control", None],
+    "category_type": ["Unplanned Downtime", "Unplanned Downtime", None],
+    "description": ["Drive fault", "PLC watchdog", "Unclassified alarm"],
+})
+
+CSV = b"""machine,alarm_id,start,end
+Filler_01,282,2025-03-01T08:00:00,2025-03-01T08:02:00
+Filler_01,0282,2025-03-01T09:00:00,2025-03-01T09:01:00
+Filler_01,e-12,2025-03-01T10:00:00,2025-03-01T10:00:30
+Filler_01,7,2025-03-01T11:00:00,2025-03-01T11:00:10
+Filler_01,999,2025-03-01T12:00:00,2025-03-01T12:00:10
+Capper_02,282,2025-03-01T13:00:00,2025-03-01T13:00:10
+"""
+
+def test_unpadded_plc_codes_join_the_padded_catalogue(tmp_path):
+    store = AlarmEventStore(str(tmp_path))
+    res = store.ingest(CSV, catalogue=CATALOGUE, name="plc.csv")
+    # 282, 0282, e-12 and 7 (catalogued without a classification) match; 999 and the other machine do not
+    assert res["events"] == 6
+    assert res["matched"] == 4
+
+    events = store.events().sort_values("start")
+    assert list(events["alarm_id"]) == ["282", "0282", "e-12", "7", "999", "282"]
+    assert list(events["reason_level_2"].fillna("-")) == ["Electrical", "Electrical", "Software/Control", "-", "-", "-"]
+    assert "catalogued" not in events.columns
+
+def test_rollups_add_up_after_the_join(tmp_path):
+    store = AlarmEventStore(str(tmp_path))
+    store.ingest(CSV, catalogue=CATALOGUE, name="plc.csv")
+    for grain in GRAINS:
+        assert int(store.downtime(grain, by=())["downtime_s"].sum()) == 120 + 60 + 30 + 10 + 10 + 10
+
+def test_join_without_catalogue_matches_nothing():
+    from analytics.event_store import read_events
+    joined = join_catalogue(read_events(CSV, "csv"), None)
+    assert joined["catalogued"].to_pylist() == [False] * 6
+
+def test_arrow_join_key_agrees_with_the_python_normaliser():
+    ids = ["0282", "282", " 0282 ", "000", "0", "E-12", "e-12", " e-12", "P0243", "0x1F", "12a", "٣", "", None,
+           "Straße", "ÄLARM-7"]
+    assert alarm_key(pa.chunked_array([pa.array(ids, pa.string())])).to_pylist() == [normalize_alarm_id(i) for i in ids]
@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+
+import core.spreadsheet_generator as spreadsheet_generator
+import service.export_cache as export_cache
+from service.export_cache import evict_exports
+from service.extraction_agent import ExtractionAgent
+from conftest import alarm, add_file
+
+@pytest.fixture
+def out_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(spreadsheet_generator, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_cache, "OUTPUT_DIR", str(tmp_path))
+    return tmp_path
+
+def write(path, size: int, age_days: float = 0) -> str:
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+def test_unchanged_records_hit_and_a_write_misses(db, out_dir):
+    add_file(db, "f1", [alarm("1"), alarm("2")])
+    agent = ExtractionAgent(db)
+    first = agent.generate_excel("Filler_01", "", [], [])
+    assert not agent.cache_hit
+
+    assert agent.generate_excel("Filler_01", "", [], []) == first and agent.cache_hit
+    assert agent.generate_excel("Filler_01", "", [], [], phases=[1]) != first and not agent.cache_hit
+
+    add_file(db, "f2", [alarm("3", md5="f2")])
+    second = agent.generate_excel("Filler_01", "", [], [])
+    assert second != first and not agent.cache_hit
+    assert agent.generate_excel("Filler_01", "", [], []) == second and agent.cache_hit
+
+def test_a_deleted_file_is_regenerated(db, out_dir):
+    add_file(db, "f1", [alarm("1")])
+    agent = ExtractionAgent(db)
+    first = agent.generate_excel("Filler_01", "", [], [])
+    os.remove(first)
+    path = agent.generate_excel("Filler_01", "", [], [])
+    assert not agent.cache_hit and os.path.exists(path)
+
+def test_eviction_only_touches_cached_exports(db, out_dir):
+    old = write(out_dir / "old.xlsx", 10, age_days=30)
+    big = write(out_dir / "big.xlsx", 2 ** 20, age_days=1)
+    new = write(out_dir / "new.xlsx", 2 ** 20)
+    foreign = write(out_dir / "report.xlsx", 2 ** 20, age_days=90)
+    untracked = write(out_dir / "manual.xlsx", 2 ** 20, age_days=90)
+    for name, key in (("old.xlsx", "k1"), ("big.xlsx", "k2"), ("new.xlsx", "k3"), ("report.xlsx", None)):
+        db.log_export("Filler_01", name, [], {}, cache_key=key)
+
+    assert evict_exports(db, max_mb=1.5, max_age_days=7, keep=new) == 2
+    assert not os.path.exists(old) and not os.path.exists(big)
+    assert os.path.exists(new) and os.path.exists(foreign) and os.path.exists(untracked)
+
+def test_no_db_evicts_nothing(out_dir):
+    stray = write(out_dir / "stray.xlsx", 10, age_days=90)
+    assert evict_exports(None, max_mb=0, max_age_days=0) == 0
+    assert os.path.exists(stray)
+
+def test_a_changed_record_misses_and_other_machines_keep_their_hit(db, out_dir):
+    add_file(db, "f1", [alarm("1"), alarm("2")])
+    add_file(db, "f2", [alarm("9", md5="f2", machine="Capper_02")], machine="Capper_02")
+    agent = ExtractionAgent(db)
+    agent.generate_excel("Filler_01", "", [], [])
+    capper = agent.generate_excel("Capper_02", "", [], [])
+
+    db.save_alarms([alarm("2", description="Door open")])     # same ids, new content
+    agent.generate_excel("Filler_01", "", [], [])
+    assert not agent.cache_hit
+    assert agent.generate_excel("Capper_02", "", [], []) == capper and agent.cache_hit
+    db.save_alarms([alarm("2", description="Door open")])     # unchanged rewrite
+    agent.generate_excel("Filler_01", "", [], [])
+    assert agent.cache_hit
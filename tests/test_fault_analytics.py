@@ -0,0 +1,98 @@
+import datetime
+
+import pytest
+
+import analytics.fault_analytics as fault_analytics
+from analytics.fault_analytics import FaultAnalytics, load_fault_analytics
+from analytics.mongo_analytics import MongoFaultAnalytics
+from conftest import alarm, add_file
+
+@pytest.fixture
+def local(monkeypatch):
+    monkeypatch.setattr(fault_analytics, "ANALYTICS_BACKEND", "local")
+
+def test_unclassified_alarms_are_read_projected(db, local, monkeypatch):
+    add_file(db, "f1", [alarm("1", reason_level_1="Electrical"), alarm("2"), alarm("3")])
+    calls = []
+    original = db.get_alarms
+
+    def get_alarms(filters, projection=None, **kwargs):
+        calls.append(projection)
+        return original(filters, projection, **kwargs)
+    monkeypatch.setattr(db, "get_alarms", get_alarms)
+
+    assert load_fault_analytics(db).unclassified_alarms() == ["2", "3"]
+    assert calls == [{"alarm_id": 1, "_id": 0}]
+
+def summary(fa) -> dict:
+    machines = [None, "Filler_01", "Capper_02"]
+    return {
+        "total": fa.total_alarms(),
+        "top": [fa.top_fault_categories(m) for m in machines],
+        "electrical": [fa.electrical_fault_rate(m) for m in machines],
+        "trend": [fa.monthly_alarm_trend(m) for m in machines],
+        "anomalous": fa.anomalous_machines(),
+        "unclassified": sorted(fa.unclassified_alarms()),
+    }
+
+def test_rollups_answer_like_the_raw_alarms(db, local):
+    april = datetime.datetime(2025, 4, 2)
+    add_file(db, "f1", [alarm("1", reason_level_1="Electrical", reason_level_2="Electrical Fault"),
+                        alarm("2", reason_level_1="Mechanical", reason_level_2="Jam", extracted_at=april),
+                        alarm("3")])
+    add_file(db, "f2", [alarm("1", md5="f2", machine="Capper_02", reason_level_1="Electrical",
+                              reason_level_2="Electrical Fault"),
+                        alarm("4", md5="f2", machine="Capper_02", reason_level_1="Mechanical", reason_level_2="Jam")],
+             machine="Capper_02")
+    add_file(db, "f3", [alarm(str(i), md5="f3", machine=f"Labeler_{i}", reason_level_1="Mechanical",
+                              reason_level_2="Jam") for i in range(5, 9)])
+
+    def check():
+        raw = fault_analytics.FaultAnalytics(db.get_alarms({}, use_cache=False))
+        assert summary(load_fault_analytics(db)) == summary(raw)
+
+    check()
+    # Reclassified, moved to another month and deleted records all move the buckets
+    db.save_alarms([alarm("3", reason_level_1="Electrical", reason_level_2="Electrical Fault", extracted_at=april),
+                    alarm("2", reason_level_1="Mechanical", reason_level_2="Jam")])
+    check()
+    db.delete_processed_file("f2")
+    check()
+
+def fleet(db):
+    """Alarms with null reasons, shared ids across machines, two months and one noisy machine."""
+    april = datetime.datetime(2025, 4, 2)
+    add_file(db, "f1", [alarm("1", reason_level_1="Electrical", reason_level_2="Electrical Fault"),
+                        alarm("2", reason_level_1="Mechanical", reason_level_2="Jam", extracted_at=april),
+                        alarm("3"), alarm("9", reason_level_1="Electrical")])
+    add_file(db, "f2", [alarm("1", md5="f2", machine="Capper_02", reason_level_1="Electrical",
+                              reason_level_2="electrical overload"),
+                        alarm("4", md5="f2", machine="Capper_02", reason_level_1="Mechanical", reason_level_2="Jam")],
+             machine="Capper_02")
+    add_file(db, "f3", [alarm(str(i), md5="f3", machine=f"Labeler_{i % 4}", reason_level_1="Mechanical",
+                              reason_level_2="Jam" if i % 3 else "Seal") for i in range(40)])
+
+QUERIES = [
+    ("total_alarms", ()),
+    ("top_fault_categories", ()),
+    ("top_fault_categories", ("Filler_01",)),
+    ("top_fault_categories", (None, 2)),
+    ("top_fault_categories", ("Unknown",)),
+    ("anomalous_machines", ()),
+    ("unclassified_alarms", ()),
+    ("electrical_fault_rate", ()),
+    ("electrical_fault_rate", ("Capper_02",)),
+    ("electrical_fault_rate", ("Unknown",)),
+    ("monthly_alarm_trend", ()),
+    ("monthly_alarm_trend", ("Filler_01",)),
+]
+
+@pytest.mark.parametrize("method, args", QUERIES)
+def test_mongo_pipelines_answer_like_pandas(mongo_db, method, args):
+    fleet(mongo_db)
+    expected = getattr(FaultAnalytics(mongo_db.get_alarms({})), method)(*args)
+    assert getattr(MongoFaultAnalytics(mongo_db), method)(*args) == expected
+
+def test_every_public_query_is_compared():
+    public = {m for m in vars(FaultAnalytics) if not m.startswith("_") and callable(getattr(FaultAnalytics, m))}
+    assert public - {"from_rollups", "from_columnar"} == {m for m, _ in QUERIES}
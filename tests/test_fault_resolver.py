@@ -0,0 +1,98 @@
+import threading
+import time
+
+from conftest import alarm, add_file
+from service.fault_resolver import FaultResolver
+
+def test_new_file_resolvable_after_one_poll(make_sqlite_db):
+    app_db, resolver_db = make_sqlite_db(), make_sqlite_db()
+    add_file(app_db, "f1", [alarm("0282", "f1", reason_level_2="Electrical")])
+    resolver = FaultResolver(resolver_db).load()
+    assert resolver.resolve("Filler_01", "282")["reason_level_2"] == "Electrical"
+
+    # Warm the resolver process's cache, then write from the "app" process
+    resolver_db.get_all_processed_files()
+    resolver_db.get_alarms({})
+    add_file(app_db, "f2", [alarm("0301", "f2", reason_level_2="Mechanical")])
+
+    assert resolver.refresh() == 1
+    assert resolver.resolve("Filler_01", "301")["reason_level_2"] == "Mechanical"
+
+def test_deleted_file_drops_out_after_one_poll(make_sqlite_db):
+    app_db, resolver_db = make_sqlite_db(), make_sqlite_db()
+    add_file(app_db, "f1", [alarm("0282", "f1")])
+    resolver = FaultResolver(resolver_db).load()
+    app_db.delete_processed_file("f1")
+    resolver.refresh()
+    assert resolver.resolve("Filler_01", "282") is None
+
+
+class FakeChangeStream:
+    """The parts of a pymongo ChangeStream the resolver uses."""
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def push(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def try_next(self):
+        with self.lock:
+            return self.events.pop(0) if self.events else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_change_stream_applies_inserts_updates_and_deletes(mongo_db, monkeypatch):
+    stream = FakeChangeStream()
+    monkeypatch.setattr(mongo_db.alarms, "watch", lambda **kwargs: stream, raising=False)
+    add_file(mongo_db, "f1", [alarm("0282", "f1", reason_level_2="Electrical")])
+    resolver = FaultResolver(mongo_db).start()
+    try:
+        assert resolver.mode == "change_stream"
+        assert resolver.resolve("Filler_01", "282")["reason_level_2"] == "Electrical"
+
+        doc = {"_id": "new", "alarm_id": "0301", "machine": "Filler_01", "reason_level_2": "Mechanical",
+               "source_md5": "f2", "extracted_at": "2025-03-02"}
+        stream.push({"operationType": "insert", "fullDocument": doc})
+        assert wait_for(lambda: resolver.resolve("Filler_01", "301") is not None)
+
+        stream.push({"operationType": "update", "fullDocument": dict(doc, reason_level_2="Electrical")})
+        assert wait_for(lambda: resolver.resolve("Filler_01", "301")["reason_level_2"] == "Electrical")
+
+        stream.push({"operationType": "delete", "documentKey": {"_id": "new"}})
+        assert wait_for(lambda: resolver.resolve("Filler_01", "301") is None)
+    finally:
+        resolver.stop()
+
+def test_change_stream_invalidate_falls_back_to_polling(mongo_db, monkeypatch):
+    stream = FakeChangeStream()
+    monkeypatch.setattr(mongo_db.alarms, "watch", lambda **kwargs: stream, raising=False)
+    resolver = FaultResolver(mongo_db, poll_seconds=0.05).start()
+    try:
+        stream.push({"operationType": "invalidate"})
+        assert wait_for(lambda: resolver.mode == "polling")
+        add_file(mongo_db, "f1", [alarm("0282", "f1")])
+        assert wait_for(lambda: resolver.resolve("Filler_01", "282") is not None)
+    finally:
+        resolver.stop()
+
+def test_codes_resolve_regardless_of_padding_case_and_spaces(sqlite_db):
+    add_file(sqlite_db, "f1", [alarm("0282", reason_level_2="Electrical"), alarm("E-12", reason_level_2="Software/Control")])
+    resolver = FaultResolver(sqlite_db).load()
+    for code in ("282", " 00282", 282):
+        assert resolver.resolve("Filler_01", code)["reason_level_2"] == "Electrical"
+    for code in ("e-12", " E-12 "):
+        assert resolver.resolve("Filler_01", code)["reason_level_2"] == "Software/Control"
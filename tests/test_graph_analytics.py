@@ -0,0 +1,89 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from analytics.graph_analytics import GraphAnalytics, Neo4jGraphAnalytics
+from search.graph_index import Neo4jGraph
+from search.graph_store import CompactAlarmGraph
+
+COMPONENTS = [f"component_{i:02d}" for i in range(25)]
+
+def fleet(n: int = 300, seed: int = 7) -> list:
+    """Skewed tags: a few components appear in most alarms, so overlaps tie at every level."""
+    rnd = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(COMPONENTS))]
+    return [{"alarm_id": f"A{i:04d}", "machine": f"M{i % 5}", "source_md5": f"f{i % 3}",
+             "description": f"Alarm {i}", "reason_level_2": "Electrical",
+             "components": sorted(set(rnd.choices(COMPONENTS, weights, k=rnd.randint(1, 5))))}
+            for i in range(n)]
+
+def brute_pairs(records: list) -> list:
+    comps = {r["alarm_id"]: set(r["components"]) for r in records}
+    pairs = [(a, b, len(comps[a] & comps[b])) for a in comps for b in comps if a < b and comps[a] & comps[b]]
+    return sorted(pairs, key=lambda p: (-p[2], p[0], p[1]))
+
+def brute_related(records: list, alarm_id: str) -> list:
+    return sorted(((b if a == alarm_id else a, n) for a, b, n in brute_pairs(records) if alarm_id in (a, b)),
+                  key=lambda r: (-r[1], r[0]))
+
+@pytest.fixture(scope="module")
+def records():
+    return fleet()
+
+@pytest.fixture(scope="module")
+def expected_pairs(records):
+    return brute_pairs(records)
+
+@pytest.fixture
+def in_memory(records, tmp_path):
+    store = CompactAlarmGraph(str(tmp_path / "graph"))
+    store.add(records)
+    return GraphAnalytics.from_graph(SimpleNamespace(store=store))
+
+@pytest.fixture
+def on_neo4j(records, neo4j_driver):
+    Neo4jGraph(driver=neo4j_driver).build(records)
+    return Neo4jGraphAnalytics(neo4j_driver)
+
+@pytest.fixture(params=["memory", "neo4j"])
+def analytics(request):
+    return request.getfixturevalue("in_memory" if request.param == "memory" else "on_neo4j")
+
+@pytest.mark.parametrize("top_n", [1, 3, 10, 57, 400, 10 ** 6])
+def test_top_pairs_match_a_brute_force_count(analytics, expected_pairs, top_n):
+    assert analytics.top_cooccurring_pairs(top_n) == expected_pairs[:top_n]
+
+def test_prefix_filtering_crosses_every_overlap_level(in_memory, expected_pairs):
+    # Each cut point just past a change in shared count forces the scan down to the next threshold
+    cuts = [i + 1 for i in range(len(expected_pairs) - 1) if expected_pairs[i][2] != expected_pairs[i + 1][2]]
+    assert len(cuts) >= 3
+    for top_n in cuts:
+        assert in_memory.top_cooccurring_pairs(top_n) == expected_pairs[:top_n]
+
+def test_neighbourhoods_match_a_brute_force_count(analytics, records):
+    for r in records[::15]:
+        aid = r["alarm_id"]
+        expected = brute_related(records, aid)
+        assert analytics.related_alarms(aid, top_n=10) == expected[:10]
+        assert analytics.related_alarms(aid, top_n=len(records)) == expected
+        assert analytics.two_hop(aid) == sorted(b for b, _ in expected)
+    a, b = records[0], records[1]
+    assert analytics.shared_components(a["alarm_id"], b["alarm_id"]) == \
+        sorted(set(a["components"]) & set(b["components"]))
+    assert analytics.related_alarms("missing") == [] and analytics.two_hop("missing") == []
+
+def test_neighbourhood_lru(records):
+    aids = [r["alarm_id"] for r in records]
+    index = {c: i for i, c in enumerate(COMPONENTS)}
+    rows = [i for i, r in enumerate(records) for _ in r["components"]]
+    cols = [index[c] for r in records for c in r["components"]]
+    ga = GraphAnalytics(aids, COMPONENTS, rows, cols, cache_size=3)
+
+    first = ga.related_alarms("A0000")
+    for aid in ("A0001", "A0002", "A0000", "A0003"):      # A0000 is used again, so A0001 is the oldest
+        ga.related_alarms(aid)
+    assert list(ga.cache) == [aids.index(a) for a in ("A0002", "A0000", "A0003")]
+    assert ga.related_alarms("A0000") == first == brute_related(records, "A0000")[:10]
+    assert ga.related_alarms("A0001") == brute_related(records, "A0001")[:10]   # evicted, recomputed
+    assert ga.stats()["cached_neighbourhoods"] == 3
@@ -0,0 +1,29 @@
+from search.graph_index import Neo4jGraph
+
+def rec(alarm_id, machine, components, description=None):
+    return {"alarm_id": alarm_id, "machine": machine, "description": description or f"Alarm {alarm_id}",
+            "reason_level_2": "Electrical", "components": components}
+
+def test_build_sends_unwind_batches_in_write_transactions(neo4j_driver):
+    graph = Neo4jGraph(driver=neo4j_driver, batch_size=3)
+    records = [rec(str(i), f"M{i % 2}", ["motor", "pump"][:1 + i % 2]) for i in range(7)]
+    graph.build(records)
+
+    # 7 alarm rows and 10 component rows, at most 3 per transaction, one UNWIND statement each
+    sizes = [[len(params["rows"]) for _, params in tx] for tx in neo4j_driver.transactions]
+    assert sizes == [[3], [3], [1], [3], [3], [3], [1]]
+    assert all(q.startswith("UNWIND $rows") for tx in neo4j_driver.transactions for q, _ in tx)
+    assert all(q.startswith("CREATE CONSTRAINT") for q, _ in neo4j_driver.auto_commit)
+
+    assert neo4j_driver.belongs_to == {(str(i), f"M{i % 2}") for i in range(7)}
+    assert neo4j_driver.causes == {(str(i), c) for i in range(7) for c in ["motor", "pump"][:1 + i % 2]}
+
+def test_constraints_once_and_later_records_win(neo4j_driver):
+    graph = Neo4jGraph(driver=neo4j_driver, batch_size=100)
+    graph.build([rec("1", "M1", ["motor"], "first"), rec("1", "M1", ["motor"], "second")])
+    graph.build([rec("2", "M1", ["valve"])])
+
+    assert len(neo4j_driver.auto_commit) == 3       # the three constraints, on the first build only
+    # Duplicate (alarm, machine) and (alarm, component) rows are sent once
+    assert [len(tx[0][1]["rows"]) for tx in neo4j_driver.transactions] == [1, 1, 1, 1]
+    assert neo4j_driver.alarms["1"]["description"] == "second"
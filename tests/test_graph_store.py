@@ -0,0 +1,65 @@
+import numpy as np
+
+from search.graph_store import CompactAlarmGraph, COMPONENT
+
+def rec(alarm_id, md5, components, machine="Filler_01"):
+    return {"alarm_id": alarm_id, "machine": machine, "source_md5": md5, "components": components}
+
+def expected_degrees(graph):
+    """Distinct-edge degrees recomputed from the per-file edge arrays."""
+    edges = set(zip(graph.src.tolist(), graph.dst.tolist(), graph.rel.tolist()))
+    n = len(graph.names)
+    in_degree, out_degree = np.zeros(n, dtype=int), np.zeros(n, dtype=int)
+    for s, d, _ in edges:
+        out_degree[s] += 1
+        in_degree[d] += 1
+    return in_degree, out_degree, len(edges)
+
+def assert_consistent(graph):
+    in_degree, out_degree, distinct = expected_degrees(graph)
+    np.testing.assert_array_equal(graph.in_degree[:len(graph.names)], in_degree)
+    np.testing.assert_array_equal(graph.out_degree[:len(graph.names)], out_degree)
+    assert len(graph.keys) == distinct == len(set(graph.keys.tolist()))
+    assert int(graph.counts.sum()) == len(graph.src)
+
+def test_degrees_follow_adds_and_removes(tmp_path):
+    graph = CompactAlarmGraph(str(tmp_path))
+    graph.add([rec("1", "a", ["motor", "pump"]), rec("2", "a", ["motor"])])
+    # The same edges from a second file: counted once per distinct edge
+    graph.add([rec("1", "b", ["motor", "valve"], machine="Filler_02")])
+    assert_consistent(graph)
+    assert graph.component_risk_ranking() == [("motor", 2), ("pump", 1), ("valve", 1)]
+
+    graph.remove("a")
+    assert_consistent(graph)
+    assert graph.component_risk_ranking() == [("motor", 1), ("valve", 1)]
+    assert graph.components_for_alarm("1") == ["motor", "valve"]
+    assert graph.alarms_for_machine("Filler_01") == []
+
+    # Re-adding a file replaces its edges
+    graph.add([rec("1", "b", ["pump"])])
+    assert_consistent(graph)
+    assert graph.component_risk_ranking() == [("pump", 1)]
+
+def test_degrees_and_edges_survive_a_reload(tmp_path):
+    graph = CompactAlarmGraph(str(tmp_path))
+    graph.add([rec(str(i), f"f{i % 7}", [f"c{i % 13}", f"c{i % 5}"], machine=f"M{i % 3}") for i in range(300)])
+    graph.remove("f3")
+
+    reloaded = CompactAlarmGraph(str(tmp_path))
+    np.testing.assert_array_equal(reloaded.keys, graph.keys)
+    np.testing.assert_array_equal(reloaded.counts, graph.counts)
+    assert len(reloaded.in_degree) == len(reloaded.names)
+    assert_consistent(reloaded)
+    assert reloaded.component_risk_ranking() == graph.component_risk_ranking()
+    assert reloaded.incidence()[0] == graph.incidence()[0]
+
+def test_interning_grows_the_degree_arrays_geometrically(tmp_path):
+    graph = CompactAlarmGraph(str(tmp_path))
+    sizes = set()
+    for i in range(50):
+        graph.add([rec(f"A{i}", f"f{i}", [f"part{j}" for j in range(20)])])
+        sizes.add(len(graph.in_degree))
+    assert len(sizes) < 10
+    assert sum(graph.kinds[i] == COMPONENT for i in range(len(graph.names))) == 20
+    assert_consistent(graph)
@@ -0,0 +1,120 @@
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from search.numpy_vector_store import NumpyVectorStore
+
+DIM = 8
+
+def rows(prefix: str, n: int, seed: int, machine: str = "M1") -> tuple:
+    rnd = np.random.default_rng(seed)
+    ids = [f"{prefix}{i}" for i in range(n)]
+    return ids, rnd.normal(size=(n, DIM)).astype(np.float32), [{"machine": machine, "n": i} for i in range(n)]
+
+def rebuilt(path, dtype: str, live: dict) -> NumpyVectorStore:
+    """A store written in one upsert with only the live rows."""
+    store = NumpyVectorStore(str(path), dtype)
+    ids = list(live)
+    store.upsert(ids, [live[i][0] for i in ids], [live[i][1] for i in ids])
+    return store
+
+def answers(store: NumpyVectorStore, queries) -> list:
+    out = store.query(queries, n_results=7)
+    by_machine = store.query(queries, n_results=7, where={"machine": "M2"})
+    return [out["ids"], np.round(out["distances"], 3).tolist(), by_machine["ids"]]
+
+@pytest.fixture(params=["float16", "int8"])
+def dtype(request):
+    return request.param
+
+def test_appends_leave_written_rows_in_place(tmp_path, dtype):
+    store = NumpyVectorStore(str(tmp_path / "vs"), dtype)
+    store.upsert(*rows("a", 20, 0))
+    gen = store.generation.split()[0]
+    vectors = tmp_path / "vs" / gen / "vectors.bin"
+    before = vectors.read_bytes()
+
+    store.upsert(*rows("b", 5, 1))
+    assert store.generation.split()[:2] == [gen, "25"]
+    assert vectors.read_bytes()[:len(before)] == before
+    assert store.count() == 25
+
+def test_replacing_and_deleting_match_a_rebuilt_store(tmp_path, dtype):
+    store = NumpyVectorStore(str(tmp_path / "vs"), dtype, max_dead=1.0)
+    live = {}
+    for seed, (prefix, n, machine) in enumerate([("a", 30, "M1"), ("b", 20, "M2"), ("a", 10, "M2")]):
+        ids, vectors, metas = rows(prefix, n, seed, machine)
+        store.upsert(ids, vectors, metas)
+        live.update({i: (v, m) for i, v, m in zip(ids, vectors, metas)})
+    store.delete(ids=["a3", "b4", "missing"])
+    store.delete(where={"machine": "M2", "n": 5})
+    for i in ("a3", "b4", "a5", "b5"):
+        del live[i]
+
+    assert store.generation.split()[0] == "gen-1"      # everything was appended
+    assert store.count() == len(live)
+    assert store.get(["a0", "a3", "b5", "b6"])["ids"] == ["a0", "b6"]
+    assert store.get(["a0"])["metadatas"] == [{"machine": "M2", "n": 0}]
+    queries = np.random.default_rng(9).normal(size=(4, DIM))
+    assert answers(store, queries) == answers(rebuilt(tmp_path / "fresh", dtype, live), queries)
+
+    # A reader opened before the writes catches up from the log
+    assert answers(NumpyVectorStore(str(tmp_path / "vs"), dtype), queries) == answers(store, queries)
+
+def test_compacts_once_dead_rows_pass_the_threshold(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "vs"), max_dead=0.3)
+    ids, vectors, metas = rows("a", 10, 0)
+    store.upsert(ids, vectors, metas)
+    store.upsert(ids[:3], vectors[:3], metas[:3])         # 3 of 13 dead
+    assert store.generation.split()[:2] == ["gen-1", "13"]
+
+    store.delete(ids=["a9"])                              # 4 of 13 dead: rewritten with the 9 live rows
+    assert store.generation.split()[:2] == ["gen-2", "9"]
+    assert sorted(os.listdir(tmp_path / "vs")) == ["CURRENT", "LOCK", "gen-2"]
+    assert store.live.all() and store.count() == 9
+    assert store.get(ids)["ids"] == ids[:9]
+
+def test_a_version_1_store_is_read_and_upgraded(tmp_path):
+    gen = tmp_path / "vs" / "gen-3"
+    gen.mkdir(parents=True)
+    ids, vectors, metas = rows("a", 6, 0)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(gen / "vectors.npy", vectors.astype(np.float16))
+    (gen / "meta.json").write_text(json.dumps({"version": 1, "dtype": "float16", "dim": DIM,
+                                               "ids": ids, "metadatas": metas}))
+    (tmp_path / "vs" / "CURRENT").write_text("gen-3")
+
+    store = NumpyVectorStore(str(tmp_path / "vs"))
+    queries = np.random.default_rng(9).normal(size=(2, DIM))
+    live = {i: (v, m) for i, v, m in zip(ids, vectors, metas)}
+    assert store.count() == 6
+    assert answers(store, queries) == answers(rebuilt(tmp_path / "v2", "float16", live), queries)
+
+    ids, vectors, metas = rows("b", 2, 1)
+    store.upsert(ids, vectors, metas)
+    live.update({i: (v, m) for i, v, m in zip(ids, vectors, metas)})
+    assert store.generation.split()[:2] == ["gen-4", "8"]
+    assert not gen.exists()
+    assert answers(store, queries) == answers(rebuilt(tmp_path / "fresh", "float16", live), queries)
+
+def _upsert(store_dir: str, prefix: str):
+    store = NumpyVectorStore(store_dir, max_dead=1.0)
+    for part in range(4):
+        ids, vectors, metas = rows(f"{prefix}{part}-", 10, part)
+        store.upsert(ids, vectors, metas)
+
+def test_concurrent_processes_never_lose_a_row(tmp_path):
+    store_dir = str(tmp_path / "vs")
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_upsert, args=(store_dir, p)) for p in "abcde"]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+    assert [p.exitcode for p in procs] == [0] * len(procs)
+    store = NumpyVectorStore(store_dir)
+    assert store.count() == 200
+    assert store.live.all() and len(store.ids) == 200
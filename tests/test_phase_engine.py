@@ -0,0 +1,75 @@
+import openpyxl
+import pytest
+
+from core.phase_engine import PhaseEngine, TABS, WORKBOOK_ORDER
+from conftest import alarm, add_file, parameter
+
+def stored(db):
+    add_file(db, "f1", [alarm("1", category_type="Unplanned Downtime"), alarm("2", category_type="Waste")])
+    db.save_parameters([parameter("Speed", target=1.0, product_desc="Bottle"), parameter("Mode"),
+                        parameter("Pressure", product_desc="Bottle")])
+
+@pytest.fixture
+def counted(sqlite_db, monkeypatch):
+    """The SQLite db, counting the cursors opened per collection."""
+    stored(sqlite_db)
+    calls = {"alarms": 0, "parameters": 0}
+    for kind in calls:
+        original = getattr(sqlite_db, f"iter_{kind}")
+
+        def iterate(*args, kind=kind, original=original, **kwargs):
+            calls[kind] += 1
+            return original(*args, **kwargs)
+        monkeypatch.setattr(sqlite_db, f"iter_{kind}", iterate)
+    return sqlite_db, calls
+
+def test_every_template_tab_has_its_phase():
+    phases = {name: spec.phase for name, spec in TABS.items()}
+    assert sorted(phases) == sorted(WORKBOOK_ORDER)
+    assert {n for n, p in phases.items() if p == 1} == {"Machine Details", "OEE", "Downtime Configuration",
+                                                         "Parameter Specifications"}
+    assert {n for n, p in phases.items() if p == 2} == {"Data Types", "Machine Parameters", "Product Configuration",
+                                                         "Waste Configuration"}
+    assert {n for n, p in phases.items() if p == 3} == {"User Configuration", "Crew Schedule", "Checklist-type",
+                                                         "Checklist-configuration", "Checklist-Detail"}
+
+def test_one_cursor_per_collection_and_source_file(counted):
+    db, calls = counted
+    rows = {}
+    for tab, row in PhaseEngine("Filler_01", "", db=db).rows([1, 2, 3]):
+        rows.setdefault(tab, []).append(row)
+    assert calls == {"alarms": 1, "parameters": 1}
+    assert [r["Fault Code *"] for r in rows["Downtime Configuration"]] == ["0001"]
+    assert [r["Fault Code *"] for r in rows["Waste Configuration"]] == ["0002"]
+    assert [r["Parameter Desc *"] for r in rows["Parameter Specifications"]] == ["Speed", "Mode", "Pressure"]
+    assert [r["Data Type *"] for r in rows["Machine Parameters"]] == ["Float", "String", "String"]
+    assert [r["Product Desc *"] for r in rows["Product Configuration"]] == ["Bottle"]
+
+def test_collections_no_tab_needs_are_not_read(counted):
+    db, calls = counted
+    rows = list(PhaseEngine("Filler_01", "", db=db).rows([3]))
+    assert rows == [] and calls == {"alarms": 0, "parameters": 0}
+
+def test_export_writes_every_tab_from_one_pass(counted, tmp_path, monkeypatch):
+    import core.spreadsheet_generator as spreadsheet_generator
+    import service.export_cache as export_cache
+    from service.extraction_agent import ExtractionAgent
+    monkeypatch.setattr(spreadsheet_generator, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_cache, "OUTPUT_DIR", str(tmp_path))
+    db, calls = counted
+    path = ExtractionAgent(db).generate_excel("Filler_01", "", [], [])
+    assert calls == {"alarms": 1, "parameters": 1}
+
+    wb = openpyxl.load_workbook(path)
+    assert wb.sheetnames == WORKBOOK_ORDER
+    assert wb["Downtime Configuration"]["G2"].value == "0001"
+    assert wb["Downtime Configuration"]["G2"].number_format == "@"
+    assert wb["Waste Configuration"].max_row == 2
+    assert wb["Product Configuration"].max_row == 2
+    assert [c.value for c in wb["Checklist-type"][1]] == ["Checklist Type*"]
+
+def test_records_passed_in_without_a_db():
+    pe = PhaseEngine("Filler_01", "", [alarm("7", category_type="Waste")], [parameter("Speed")])
+    tabs = [tab for tab, _ in pe.rows([1, 2])]
+    assert tabs == ["Data Types"] * 5 + ["Machine Details", "OEE", "Waste Configuration", "Machine Parameters",
+                                         "Parameter Specifications"]
@@ -0,0 +1,44 @@
+import threading
+
+from config import SEARCH_WORKERS
+from search.query_service import HybridSearchService, rrf_fuse
+
+class FakeBM25:
+    def search_hits(self, query, top_k=10, machine=None):
+        return [{"machine": "M1", "alarm_id": "1"}, {"machine": "M1", "alarm_id": "2"}]
+
+class FakeVector:
+    def search(self, query, top_k=10, machine=None):
+        return [{"machine": "M1", "alarm_id": "2"}]
+
+def test_rrf_prefers_hits_in_both_lists():
+    hits = rrf_fuse({"bm25": [("M1", "1"), ("M1", "2")], "vector": [("M1", "2")]}, top_k=2, k=60)
+    assert [h["alarm_id"] for h in hits] == ["2", "1"]
+
+def test_vector_index_is_opened_inside_the_worker():
+    opened_in = []
+
+    def open_vector():
+        opened_in.append(threading.current_thread().name)
+        return FakeVector()
+
+    res = HybridSearchService(FakeBM25(), vector_factory=open_vector, timeout=5).search("q", top_k=2)
+    assert opened_in and opened_in[0].startswith("search-vector")
+    assert res["timed_out"] == [] and [h["alarm_id"] for h in res["hits"]] == ["2", "1"]
+
+def test_stuck_vector_backend_never_starves_bm25():
+    release = threading.Event()
+
+    def stuck():
+        release.wait(10)
+        return FakeVector()
+
+    try:
+        # More stuck queries than there are worker threads
+        for _ in range(SEARCH_WORKERS + 2):
+            res = HybridSearchService(FakeBM25(), vector_factory=stuck, timeout=0.2).search("q", top_k=2)
+            assert res["timed_out"] == ["vector"]
+            assert [h["alarm_id"] for h in res["hits"]] == ["1", "2"]
+            assert "bm25" in res["timings_ms"]
+    finally:
+        release.set()
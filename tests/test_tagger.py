@@ -0,0 +1,129 @@
+import random
+import re
+
+import pytest
+
+from core.tagger import Tagger, alarm_components, get_tagger
+from extractors.llm_extractor import LLMClassifier
+
+# The classifiers' keyword lists and the graph's component pattern as they were before core.tagger
+REASON_WORDS = {
+    "Electrical": ["electric", "voltage", "current", "drive", "inverter", "short circuit", "wire", "contactor",
+                   "spark", "arc", "encoder", "fuse", "relay", "power supply", "amp"],
+    "Sensor/Instrumentation": ["sensor", "encoder", "limit switch", "photocell", "vision", "camera", "probe",
+                               "detector"],
+    "Software/Control": ["program", "software", "plc", "timeout", "hmi", "network", "communication loss", "watchdog"],
+    "Mechanical": ["jam", "wear", "broken", "loose", "fracture", "belt", "bearing", "pneumatic", "hydraulic", "valve",
+                   "pump", "gear", "seal", "lubrication", "friction"],
+}
+LLM_WORDS = {
+    "Electrical": ["electric", "voltage", "inverter", "drive", "contactor", "fuse", "relay", "arc", "wiring",
+                   "short circuit", "power supply", "amp"],
+    "Sensor/Instrumentation": ["sensor", "encoder", "limit switch", "photocell", "camera", "probe", "detector",
+                               "vision"],
+    "Software/Control": ["plc", "software", "program", "hmi", "timeout", "communication", "watchdog", "network", "bus",
+                         "fieldbus"],
+    "Mechanical": ["jam", "belt", "bearing", "hydraulic", "valve", "pump", "gear", "seal", "lubrication", "broken",
+                   "wear", "fracture", "pneumatic"],
+}
+LLM_PLANNED = ["maintenance", "cleaning", "changeover", "scheduled", "cip", "lubrication round", "planned", "preventive"]
+LLM_CONFIDENCE = {"Electrical": 0.75, "Sensor/Instrumentation": 0.70, "Software/Control": 0.70, "Mechanical": 0.75}
+COMPONENTS = ["inverter", "motor", "servo", "sensor", "encoder", "valve", "pump", "bearing", "seal", "gear", "belt",
+              "conveyor", "drive", "plc", "hmi", "camera"]
+COMPONENT_PATTERN = re.compile(r"\b(" + "|".join(COMPONENTS) + r")\b", re.IGNORECASE)
+
+def old_reason(text: str) -> str:
+    text = text.lower()
+    return next((r2 for r2, words in REASON_WORDS.items() if any(w in text for w in words)), "Mechanical")
+
+def old_llm(text: str) -> tuple:
+    text = text.lower()
+    r2 = next((r2 for r2, words in LLM_WORDS.items() if any(w in text for w in words)), None)
+    category = "Planned Downtime" if any(w in text for w in LLM_PLANNED) else "Unplanned Downtime"
+    return (r2 or "Mechanical", LLM_CONFIDENCE.get(r2, 0.50), category)
+
+def old_components(cause: str) -> list:
+    return sorted({c.lower() for c in COMPONENT_PATTERN.findall(cause)})
+
+# Every old keyword, the compounds substring matching caught, and words no list has
+TERMS = sorted({w for lists in (REASON_WORDS, LLM_WORDS) for words in lists.values() for w in words} |
+               set(LLM_PLANNED) | set(COMPONENTS) |
+               {"overcurrent", "overvoltage", "undervoltage", "ampere", "electrical", "jammed", "communication loss"})
+FILLER = ["fault", "alarm", "door", "open", "high", "temperature", "check", "reset", "axis", "Motor", "VALVE"]
+
+def alarms(n: int = 400, seed: int = 3) -> list:
+    rnd = random.Random(seed)
+    phrase = lambda: " ".join(rnd.choice(TERMS + FILLER * 3) for _ in range(rnd.randint(0, 3)))
+    # Numbered descriptions, since the classifiers cache by description
+    return [{"alarm_id": str(i), "description": f"{phrase().capitalize()} #{i}", "cause": phrase()} for i in range(n)]
+
+def text(a: dict) -> str:
+    return f"{a['description']} {a['cause']}"
+
+@pytest.fixture
+def reason_classifier():
+    pytest.importorskip("ollama")
+    pytest.importorskip("groq")
+    from extractors.local_llm_extractor import ReasonClassifier
+    return ReasonClassifier()
+
+@pytest.fixture
+def llm_classifier(monkeypatch):
+    classifier = LLMClassifier()
+    monkeypatch.setattr(classifier, "_try_llm", lambda description, cause: None)
+    return classifier
+
+@pytest.mark.parametrize("description, cause, reason, llm", [
+    ("Encoder fault", "", "Electrical", "Sensor/Instrumentation"),
+    ("Fieldbus communication error", "", "Mechanical", "Software/Control"),
+    ("Bus error", "", "Mechanical", "Software/Control"),
+    ("Communication loss", "PLC", "Software/Control", "Software/Control"),
+    ("Overcurrent", "", "Electrical", "Mechanical"),
+    ("Wire break", "", "Electrical", "Mechanical"),
+    ("Spark detected", "", "Electrical", "Mechanical"),
+    ("Jammed bottle", "conveyor", "Mechanical", "Mechanical"),
+])
+def test_named_cases_keep_their_old_category(reason_classifier, llm_classifier, description, cause, reason, llm):
+    assert reason_classifier._heuristic_classify(description, cause)["reason_level_2"] == reason
+    assert llm_classifier.classify_reason(description, cause)["reason_level_2"] == llm
+
+def test_reason_classifier_matches_its_old_keyword_lists(reason_classifier):
+    records = alarms()
+    tags = get_tagger().tag_many([text(a) for a in records])
+    for a, t in zip(records, tags):
+        expected = old_reason(text(a))
+        assert reason_classifier._heuristic_classify(a["description"], a["cause"])["reason_level_2"] == expected
+        assert reason_classifier._heuristic_classify(a["description"], a["cause"], t)["reason_level_2"] == expected
+
+def test_llm_classifier_matches_its_old_keyword_lists(llm_classifier):
+    records = alarms()
+    tags = get_tagger().tag_many([text(a) for a in records])
+    for a, t in zip(records, tags):
+        for result in (llm_classifier._heuristic(a["description"], a["cause"]),
+                       llm_classifier._heuristic(a["description"], a["cause"], t)):
+            assert (result["reason_level_2"], result["confidence"], result["category_type"]) == old_llm(text(a))
+
+def test_components_come_from_the_cause_only():
+    records = alarms()
+    assert [sorted(c) for c in alarm_components(records)] == [old_components(a["cause"]) for a in records]
+    # A stored field is used as is
+    assert alarm_components([{"cause": "motor", "components": ["pump"]}]) == [["pump"]]
+
+def test_extractor_tags_components_from_the_cause(llm_classifier, monkeypatch):
+    pytest.importorskip("ollama")
+    pytest.importorskip("groq")
+    from extractors.local_llm_extractor import LocalLLMExtractor
+    records = alarms(60)
+    extractor = LocalLLMExtractor(classifier=llm_classifier)
+    monkeypatch.setattr(extractor, "_extract_with_regex", lambda chunk: [dict(a) for a in records])
+    extracted = extractor.extract_alarms("Alarm 1\nmanual text")
+    assert [sorted(a["components"]) for a in extracted] == [old_components(a["cause"]) for a in records]
+    assert [a["reason_level_2"] for a in extracted] == [old_llm(text(a))[0] for a in records]
+
+def test_word_anchored_matching():
+    tagger = Tagger({"g": {"amp": ["amp"], "plan": ["planned"], "el": ["electric*"], "lub": ["lubrication round"],
+                           "l": ["lubrication"]}})
+    assert tagger.tag("clamp unplanned") == {"g": []}
+    assert tagger.tag("Amps electrical")["g"] == ["amp", "el"]
+    assert tagger.tag("lubrication round")["g"] == ["lub", "l"]
+    assert tagger.tag_many(["amp", "", None, "planned"]) == [{"g": ["amp"]}, {"g": []}, {"g": []}, {"g": ["plan"]}]
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import search.vector_index as vector_index
+from search import model_registry
+
+class FakeModel:
+    """Deterministic encoder that records what it was asked to embed."""
+    def __init__(self, runtime=None):
+        self.encoded = []
+        if runtime:
+            self.runtime = runtime
+
+    def encode(self, texts, batch_size=64):
+        if isinstance(texts, str):      # a single query, as SentenceTransformer.encode takes it
+            return self.encode([texts])[0]
+        self.encoded.extend(texts)
+        return np.array([[len(t), sum(map(ord, t)) % 97, 1.0] for t in texts], dtype=np.float32)
+
+@pytest.fixture
+def open_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "EMBEDDING_CACHE_PATH", str(tmp_path / "cache.db"))
+
+    def open_index(model, name="model-a"):
+        monkeypatch.setattr(vector_index, "EMBEDDING_MODEL", name)
+        monkeypatch.setattr(model_registry, "get_embedding_model", lambda n, runtime=None: model)
+        return vector_index.VectorAlarmIndex(str(tmp_path / "vectors"), backend="numpy")
+    return open_index
+
+ALARMS = [{"alarm_id": str(i), "machine": "M1", "description": f"alarm {i}", "cause": "c"} for i in range(5)]
+
+def test_unchanged_rows_are_skipped(open_index):
+    index = open_index(FakeModel())
+    assert index.add_alarms(ALARMS) == {"indexed": 5, "skipped": 0}
+    assert open_index(FakeModel()).add_alarms(ALARMS) == {"indexed": 0, "skipped": 5}
+
+@pytest.mark.parametrize("changed", [{"name": "model-b"}, {"runtime": "onnx"}])
+def test_rows_from_another_model_or_runtime_are_reembedded(open_index, changed):
+    open_index(FakeModel()).add_alarms(ALARMS)
+
+    index = open_index(FakeModel(changed.get("runtime")), changed.get("name", "model-a"))
+    assert index.add_alarms(ALARMS) == {"indexed": 5, "skipped": 0}
+    meta = index.collection.get(ids=["x_M1_0"])["metadatas"][0]
+    assert meta["embedding_model"] == changed.get("name", "model-a")
+    assert meta["embedding_runtime"] == changed.get("runtime", "torch")
+
+def test_add_alarms_writes_one_generation_on_the_numpy_store(open_index):
+    index = open_index(FakeModel())
+    many = [{"alarm_id": str(i), "machine": "M1", "description": f"alarm {i}", "cause": ""}
+            for i in range(2 * vector_index._UPSERT_BATCH + 5)]
+    index.add_alarms(many)
+    assert index.collection.generation.split()[:2] == ["gen-1", str(len(many))]
+    assert index.count() == len(many)
+
+def test_delete_drops_the_rows_of_one_source_file(open_index):
+    index = open_index(FakeModel())
+    index.add_alarms([dict(a, source_md5="f1" if i < 3 else "f2") for i, a in enumerate(ALARMS)])
+    index.delete("f1")
+    assert index.count() == 2
+    assert index.collection.get(ids=[f"f{1 + (i >= 3)}_M1_{i}" for i in range(5)])["ids"] == ["f2_M1_3", "f2_M1_4"]
+    hits = index.collection.query([[1.0, 0.0, 0.0]], n_results=5)["metadatas"][0]
+    assert sorted(h["alarm_id"] for h in hits) == ["3", "4"]
+    index.delete("missing")
+    assert index.count() == 2
+
+def test_deleting_a_manual_keeps_the_alarms_another_manual_holds(open_index):
+    index = open_index(FakeModel())
+    index.add_alarms([dict(a, source_md5="f1") for a in ALARMS])
+    index.add_alarms([dict(a, source_md5="f2") for a in ALARMS[:2]])
+    assert index.count() == 7
+    index.delete("f1")
+    assert index.collection.get(ids=["f2_M1_0", "f2_M1_1"])["ids"] == ["f2_M1_0", "f2_M1_1"]
+    assert index.count() == 2
+
+def test_search_returns_an_alarm_once_across_manuals(open_index, monkeypatch):
+    monkeypatch.setattr(model_registry, "_query_cache", OrderedDict())
+    index = open_index(FakeModel())
+    for md5 in ("f1", "f2", "f3"):
+        index.add_alarms([dict(a, source_md5=md5) for a in ALARMS])
+    hits = index.search("alarm 3", top_k=4)
+    assert len(hits) == 4
+    assert len({(h["machine"], h["alarm_id"]) for h in hits}) == 4
+
+def test_rows_stored_without_the_source_file_are_replaced(open_index):
+    index = open_index(FakeModel())
+    index.collection.upsert(ids=["M1_0", "M1_1"], embeddings=[[1.0, 0.0, 0.0]] * 2,
+                            metadatas=[{"alarm_id": "0", "machine": "M1"}, {"alarm_id": "1", "machine": "M1"}])
+    assert index.add_alarms([dict(a, source_md5="f1") for a in ALARMS[:1]]) == {"indexed": 1, "skipped": 0}
+    assert index.collection.get(ids=["M1_0", "M1_1", "f1_M1_0"])["ids"] == ["M1_1", "f1_M1_0"]
+
+def test_query_embeddings_are_cached_per_runtime_and_copied(monkeypatch):
+    monkeypatch.setattr(model_registry, "_query_cache", OrderedDict())
+    models = {"torch": FakeModel(), "onnx": FakeModel("onnx")}
+    models["onnx"].encode = lambda text, batch_size=64: np.array([0.0, 0.0, 1.0])
+    monkeypatch.setattr(model_registry, "get_embedding_model", lambda name, runtime: models[runtime])
+
+    torch = model_registry.encode_query("motor fault", "model-a", "torch")
+    torch.append(99.0)                      # a caller mutating its result
+    assert model_registry.encode_query("motor fault", "model-a", "torch") == torch[:-1]
+    assert model_registry.encode_query("motor fault", "model-a", "onnx") == [0.0, 0.0, 1.0]
+    assert models["torch"].encoded == ["motor fault"]